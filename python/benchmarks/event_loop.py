@@ -0,0 +1,132 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""Compare agent throughput and latency with each event loop.
+
+Run from the python directory:  python benchmarks/event_loop.py
+
+For each event loop, an agent is started, and a client and server
+session are connected through it.  Throughput is measured by sending
+batches of messages and collecting them at the other end; latency by
+sending one message at a time and waiting for it to arrive."""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import simplefix
+
+from fixtool import FixToolProxy, start_agent
+
+
+def make_order(seq: int) -> bytes:
+    """Return a typical NewOrderSingle."""
+    msg = simplefix.FixMessage()
+    msg.append_pair(8, "FIX.4.4")
+    msg.append_pair(35, "D")
+    msg.append_pair(34, seq)
+    msg.append_pair(49, "TESTBUY1")
+    msg.append_pair(56, "TESTSELL1")
+    msg.append_utc_timestamp(52)
+    msg.append_pair(11, seq)
+    msg.append_pair(21, 2)
+    msg.append_pair(54, 1)
+    msg.append_pair(55, "MSFT")
+    msg.append_pair(38, 100)
+    return msg.encode()
+
+
+def percentile(samples: list, fraction: float) -> float:
+    """Return the given fraction's percentile of sorted samples."""
+    index = min(len(samples) - 1, int(len(samples) * fraction))
+    return samples[index]
+
+
+def measure(event_loop: str, count: int, batch: int):
+    """Run the benchmark with an agent using the specified event loop.
+
+    :param event_loop: "asyncio" or "uvloop".
+    :param count: Number of messages for each measurement.
+    :param batch: Messages per send request, for throughput.
+    :returns: Tuple of messages/second, and p50 and p99 round trip
+    latency in microseconds; or None if the agent failed to start."""
+    port = start_agent(event_loop=event_loop)
+    if port is None:
+        return None
+
+    proxy = FixToolProxy("localhost", port)
+    server = proxy.create_server("s1")
+    server_port = server.listen(0)
+    client = proxy.create_client("c1")
+    client.connect("localhost", server_port)
+    session = server.accept("cs1")
+
+    messages = [make_order(i) for i in range(count)]
+
+    start = time.perf_counter()
+    received = 0
+    for i in range(0, count, batch):
+        client.send_many(messages[i:i + batch])
+        received += len(session.receive_many())
+    while received < count:
+        received += len(session.receive_many())
+    rate = count / (time.perf_counter() - start)
+
+    latencies = []
+    for message in messages:
+        start = time.perf_counter()
+        client.send(message)
+        session.receive(timeout=5)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+
+    proxy.shutdown()
+    return rate, percentile(latencies, 0.5), percentile(latencies, 0.99)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=10000,
+                        help="Messages for each measurement")
+    parser.add_argument("-b", "--batch", type=int, default=100,
+                        help="Messages per send request, for throughput")
+    args = parser.parse_args()
+
+    print("%-8s %12s %10s %10s" % ("loop", "msgs/sec", "p50 (us)",
+                                   "p99 (us)"))
+    for event_loop in ("asyncio", "uvloop"):
+        result = measure(event_loop, args.count, args.batch)
+        if result is None:
+            print("%-8s not available" % event_loop)
+            continue
+        print("%-8s %12.0f %10.1f %10.1f" % ((event_loop,) + result))
+    return
+
+
+if __name__ == "__main__":
+    main()
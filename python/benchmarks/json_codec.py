@@ -0,0 +1,96 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""Compare control message encoding speed with each JSON library.
+
+Run from the python directory:  python benchmarks/json_codec.py"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fixtool import jsoncodec
+from fixtool.message import *
+
+
+def sample_messages() -> list:
+    """Return typical control messages, with FIX payloads."""
+    order = (b"8=FIX.4.4\x019=148\x0135=D\x0134=1080\x0149=TESTBUY1\x01"
+             b"52=20180920-18:14:19.508\x0156=TESTSELL1\x0111=636730640278"
+             b"898634\x0115=USD\x0121=2\x0154=1\x0155=MSFT\x0160=20180920-"
+             b"18:14:19.492\x0110=092\x01")
+    return [ClientSendMessage("c1", order),
+            SessionGotManyMessage("cs1", True, '', [order] * 20),
+            ServerAcceptedMessage("s1", True, '', "cs1"),
+            ClientReceiveCountResponse("c1", True, '', 42)]
+
+
+def measure(codec: str, count: int) -> tuple:
+    """Time encoding and decoding the sample messages.
+
+    :param codec: Control message encoding.
+    :param count: Number of repetitions.
+    :returns: Tuple of microseconds per encode and per decode."""
+    messages = sample_messages()
+    buffers = [encode_message(m, codec, 1) for m in messages]
+
+    def encode():
+        for message in messages:
+            encode_message(message, codec, 1)
+        return
+
+    def decode():
+        for buf in buffers:
+            message_from_dict(decode_message(buf))
+        return
+
+    scale = 1e6 / (count * len(messages))
+    encode_time = min(timeit.repeat(encode, number=count, repeat=3))
+    decode_time = min(timeit.repeat(decode, number=count, repeat=3))
+    return encode_time * scale, decode_time * scale
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--count", type=int, default=20000,
+                        help="Repetitions of the sample messages")
+    args = parser.parse_args()
+
+    print("%-8s %-8s %12s %12s" % ("library", "codec",
+                                    "encode (us)", "decode (us)"))
+    for name in jsoncodec.available():
+        jsoncodec.use(name)
+        for codec in (CODEC_JSON, CODEC_BINARY):
+            encode_time, decode_time = measure(codec, args.count)
+            print("%-8s %-8s %12.2f %12.2f" % (name, codec,
+                                                encode_time, decode_time))
+    return
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""Measure the cost of draining an agent's received message queue.
+
+Run from the python directory:  python benchmarks/receive_queue.py
+
+A client's queue is filled to each depth, then emptied one message at
+a time with get_message(), as a receive request would, and in batches
+with get_messages().  The time per message should not grow with the
+depth of the queue."""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fixtool.agent import Client
+
+
+MESSAGE = (b"8=FIX.4.2\x019=35\x0135=0\x0134=1\x01"
+           b"52=20180920-18:14:19.508\x0110=127\x01")
+
+
+def drain(depth: int, batch: int) -> float:
+    """Time emptying a queue of the given depth.
+
+    :param depth: Number of queued messages.
+    :param batch: Messages per get_messages() call, or zero to use
+    get_message().
+    :returns: Nanoseconds per message."""
+    client = Client("c1")
+    for _ in range(depth):
+        client.queue_message(MESSAGE)
+
+    start = time.perf_counter()
+    if batch:
+        while client.get_messages(batch):
+            pass
+    else:
+        while client.get_message() is not None:
+            pass
+    elapsed = time.perf_counter() - start
+
+    assert client.receive_queue_length() == 0
+    return elapsed * 1e9 / depth
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-d", "--depths", type=str,
+                        default="1000,10000,100000,1000000",
+                        help="Comma-separated queue depths")
+    parser.add_argument("-b", "--batch", type=int, default=100,
+                        help="Messages per get_messages() call")
+    args = parser.parse_args()
+
+    print("%10s %16s %16s" % ("depth", "single (ns/msg)",
+                              "batch (ns/msg)"))
+    for depth in [int(d) for d in args.depths.split(",")]:
+        print("%10d %16.1f %16.1f" % (depth, drain(depth, 0),
+                                      drain(depth, args.batch)))
+    return
+
+
+if __name__ == "__main__":
+    main()
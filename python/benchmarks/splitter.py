@@ -0,0 +1,128 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""Compare FIX message splitting with simplefix's parser.
+
+Run from the python directory:  python benchmarks/splitter.py
+
+A stream of messages is fed to each in 64KiB reads, as the agent would
+receive it, and all the messages collected.  simplefix parses every
+field, and the agent would then have had to encode() each message
+again to queue it; the splitter only finds the boundaries."""
+
+import argparse
+import os
+import sys
+import time
+
+import simplefix
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fixtool.splitter import FixSplitter
+
+
+READ_SIZE = 65536
+
+
+def make_message(size: int) -> bytes:
+    """Return an order message of roughly the given size."""
+    message = simplefix.FixMessage()
+    message.append_pair(8, "FIX.4.4")
+    message.append_pair(35, "D")
+    message.append_pair(34, 1080)
+    message.append_pair(49, "TESTBUY1")
+    message.append_pair(56, "TESTSELL1")
+    message.append_pair(11, "636730640278898634")
+    message.append_pair(55, "MSFT")
+    message.append_pair(54, 1)
+    message.append_pair(38, 100)
+    padding = size - len(message.encode())
+    if padding > 4:
+        message.append_pair(58, "x" * (padding - 4))
+    return message.encode()
+
+
+def run_splitter(reads: list, validate: bool) -> int:
+    splitter = FixSplitter(validate)
+    count = 0
+    for read in reads:
+        count += len(splitter.feed(read))
+    return count
+
+
+def run_simplefix(reads: list, encode: bool) -> int:
+    parser = simplefix.FixParser()
+    count = 0
+    for read in reads:
+        parser.append_buffer(read)
+        message = parser.get_message()
+        while message is not None:
+            if encode:
+                message.encode()
+            count += 1
+            message = parser.get_message()
+    return count
+
+
+def measure(function, reads: list, flag: bool, expected: int) -> float:
+    """Return the best time per message, in microseconds."""
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        count = function(reads, flag)
+        elapsed = time.perf_counter() - start
+        assert count == expected
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1e6 / expected
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--bytes", type=int, default=10000000,
+                        help="Stream size for each message size")
+    args = parser.parse_args()
+
+    print("%8s %12s %12s %12s %12s" % ("size", "split", "split+sum",
+                                       "simplefix", "+encode"))
+    for size in (100, 10000):
+        message = make_message(size)
+        count = max(args.bytes // len(message), 1)
+        stream = message * count
+        reads = [stream[i:i + READ_SIZE]
+                 for i in range(0, len(stream), READ_SIZE)]
+
+        print("%8d %12.2f %12.2f %12.2f %12.2f" % (
+            len(message),
+            measure(run_splitter, reads, False, count),
+            measure(run_splitter, reads, True, count),
+            measure(run_simplefix, reads, False, count),
+            measure(run_simplefix, reads, True, count)))
+    print("(microseconds per message)")
+    return
+
+
+if __name__ == "__main__":
+    main()
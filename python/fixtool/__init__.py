@@ -27,15 +27,27 @@
 
 import logging
 import os
+import shlex
 import stat
+from .asyncproxy import AsyncFixToolProxy
+from .message import CODEC_BINARY, CODEC_JSON, QUEUE_PAUSE, QUEUE_DROP_OLDEST, \
+    QUEUE_DROP_NEWEST, QUEUE_SPILL
 from .proxy import FixToolProxy
 from .version import VERSION
 
 
-def spawn_agent():
-    """Create a new agent, and associated proxy.
+def start_agent(socket_path: str = None, event_loop: str = None,
+                workers: int = 0):
+    """Start a new agent process.
 
-    :returns: Reference to proxy, or None on error."""
+    :param socket_path: If set, the agent accepts control sessions on this
+    Unix domain socket path rather than a loopback TCP port.
+    :param event_loop: Agent's event loop implementation, "asyncio" or
+    "uvloop"; by default, uvloop is used if it's installed.
+    :param workers: If set, the agent shares its clients and servers
+    between this many worker processes.
+    :returns: Agent's control port number (or socket path), or None
+    on error."""
 
     # Spawned agents are spawned from the calling process, and usually
     # dedicated to it.  It's possible to contact a spawned agent from
@@ -75,7 +87,15 @@ def spawn_agent():
 
     logging.info("Using agent: %s", fixtool_agent)
 
-    agent = os.popen(fixtool_agent + ' start')
+    command = fixtool_agent + ' start'
+    if socket_path:
+        command += ' --unix ' + shlex.quote(socket_path)
+    if event_loop:
+        command += ' --loop ' + shlex.quote(event_loop)
+    if workers:
+        command += ' --workers %d' % workers
+
+    agent = os.popen(command)
     status = agent.readline()
     agent.close()  # Just the parent; the forked agent is still running
 
@@ -85,21 +105,79 @@ def spawn_agent():
         logging.error("Failed to start agent: %s", status)
         return None
 
+    if socket_path:
+        return status[3:].strip()
+
     try:
         port = int(status[3:])
     except ValueError:
         logging.error("Unable to read port number from agent output")
         return None
 
-    agent_proxy = FixToolProxy("localhost", port)
+    return port
+
+
+def spawn_agent(codec: str = CODEC_BINARY, path: str = None):
+    """Create a new agent, and associated proxy.
+
+    :param codec: Preferred control message encoding.
+    :param path: Optional Unix domain socket path for control sessions.
+    :returns: Reference to proxy, or None on error."""
+
+    address = start_agent(path)
+    if address is None:
+        return None
+
+    if path:
+        return FixToolProxy(None, None, codec, path=address)
+
+    agent_proxy = FixToolProxy("localhost", address, codec)
     return agent_proxy
 
 
-def connect_agent(host: str, port: int):
+def connect_agent(host: str = None, port: int = None,
+                  codec: str = CODEC_BINARY, path: str = None):
     """Create a proxy, and connect it to an existing agent.
 
     :param host: String host name or IP address for the agent.
-    :param port: Integer TCP port number for the agent."""
+    :param port: Integer TCP port number for the agent.
+    :param codec: Preferred control message encoding.
+    :param path: Unix domain socket path for the agent, instead of
+    host and port."""
+
+    agent_proxy = FixToolProxy(host, port, codec, path=path)
+    return agent_proxy
+
+
+async def spawn_agent_async(codec: str = CODEC_BINARY, path: str = None):
+    """Create a new agent, and associated asynchronous proxy.
+
+    :param codec: Preferred control message encoding.
+    :param path: Optional Unix domain socket path for control sessions.
+    :returns: Reference to connected proxy, or None on error."""
+
+    address = start_agent(path)
+    if address is None:
+        return None
+
+    if path:
+        agent_proxy = AsyncFixToolProxy(None, None, codec, path=address)
+    else:
+        agent_proxy = AsyncFixToolProxy("localhost", address, codec)
+    await agent_proxy.connect()
+    return agent_proxy
+
+
+async def connect_agent_async(host: str = None, port: int = None,
+                              codec: str = CODEC_BINARY, path: str = None):
+    """Create an asynchronous proxy, and connect it to an existing agent.
+
+    :param host: String host name or IP address for the agent.
+    :param port: Integer TCP port number for the agent.
+    :param codec: Preferred control message encoding.
+    :param path: Unix domain socket path for the agent, instead of
+    host and port."""
 
-    agent_proxy = FixToolProxy(host, port)
+    agent_proxy = AsyncFixToolProxy(host, port, codec, path=path)
+    await agent_proxy.connect()
     return agent_proxy
@@ -27,24 +27,53 @@
 
 import argparse
 import asyncio
-import base64
-import json
+import collections
 import logging
 import os
+import shutil
 import signal
 import socket
+import stat
 import struct
 import sys
 import tempfile
 import time
+import zlib
 
-import simplefix
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
 # pylint: disable=unused-wildcard-import
+from fixtool.filter import MessageFilter, MessageMatch
+from fixtool.framing import FrameDecoder, encode_frame
 from fixtool.message import *
-from fixtool.proxy import FixToolProxy
+from fixtool.proxy import FixToolProxy, unix_socket_address
+from fixtool.session import FixSession
+from fixtool.shmring import DEFAULT_SIZE as DEFAULT_RING_SIZE, RingBuffer
+from fixtool.splitter import FixSplitter
 from fixtool.version import VERSION
 
+# Write buffer limits for FIX connections.  Above the high water mark,
+# send requests aren't confirmed until it drops below the low mark.
+WRITE_BUFFER_HIGH = 256 * 1024
+WRITE_BUFFER_LOW = 64 * 1024
+
+# Write buffer limit for control sessions.  Above it, received messages
+# aren't forwarded to subscribers until the buffer has drained.
+CONTROL_BUFFER_HIGH = 1024 * 1024
+
+# Largest write attempted by a SocketWriter, and the most FIX message
+# bytes forwarded to a subscriber in one message.
+WRITE_CHUNK = 256 * 1024
+
+# Length prefix of messages in a receive queue's spill file.
+SPILL_HEADER = struct.Struct(">L")
+
+# Event loop implementations, for --loop.
+EVENT_LOOPS = ("asyncio", "uvloop")
+
 # Log level names, from argv.
 LOGLEVELS = {
     "DEBUG": logging.DEBUG,
@@ -55,77 +84,467 @@ LOGLEVELS = {
 }
 
 
-class Client:
-    """Simulated FIX client."""
+class ReceiveWaiter:
+    """Control request parked until a FIX message is received."""
+
+    def __init__(self, peer, control, callback, timeout: float,
+                 match=None):
+        """Constructor.
+
+        :param peer: Client or ServerSession whose queue is watched.
+        :param control: Control session that made the request.
+        :param callback: Called with the received message when one is
+        queued, or None if the timeout expires first.
+        :param timeout: Maximum time to wait, in seconds.
+        :param match: Optional MessageMatch.  Messages that don't match
+        are discarded, and counted, while waiting for one that does."""
+        self._peer = peer
+        self._control = control
+        self._callback = callback
+        self._match = match
+        self._skipped = 0
+        self._timer = asyncio.get_event_loop().call_later(timeout,
+                                                          self.expire)
+        return
+
+    def is_abandoned(self) -> bool:
+        """Return True if the requesting control session has gone."""
+        return self._control.is_closed()
+
+    def accepts(self, message) -> bool:
+        """Return True if the message completes the wait.
+
+        :param message: Received message."""
+        if self._match is None or self._match.accepts(message):
+            return True
+
+        self._skipped += 1
+        return False
+
+    def skipped(self) -> int:
+        """Return the number of messages discarded as not matching."""
+        return self._skipped
+
+    def fire(self, message):
+        """Complete the wait, cancelling the timeout.
+
+        :param message: Received message, or None."""
+        self._timer.cancel()
+        self._callback(message)
+        return
+
+    def expire(self):
+        """Complete the wait on timeout."""
+        self._peer.remove_waiter(self)
+        self._callback(None)
+        return
+
+
+class ReceiveQueue:
+    """Queue of received FIX messages, with an optional size limit.
+
+    Messages are held in memory, up to the limits set by set_limit().
+    What happens after that depends on the policy: the peer can be
+    asked to stop reading from its socket until the queue is drained
+    (the messages already read are still queued), the oldest or newest
+    message can be discarded, or further messages can be written to a
+    temporary file, and read back as the in-memory queue empties."""
+
+    def __init__(self, peer):
+        """Constructor.
+
+        :param peer: Client or ServerSession that owns the queue.  Its
+        pause_receiving() and resume_receiving() methods are called by
+        the QUEUE_PAUSE policy."""
+        self._peer = peer
+        self._messages = collections.deque()
+        self._bytes = 0
+
+        self._max_count = 0
+        self._max_bytes = 0
+        self._policy = QUEUE_PAUSE
+        self._paused = False
+
+        # Spilled messages are length-prefixed, and read from the front
+        # of the file while they're appended to its end.
+        self._spill = None
+        self._spill_count = 0
+        self._spill_bytes = 0
+        self._spill_offset = 0
+
+        self._received = 0
+        self._dropped = 0
+        self._spilled = 0
+        return
+
+    def __len__(self):
+        return len(self._messages) + self._spill_count
+
+    def set_limit(self, max_count: int, max_bytes: int, policy: str):
+        """Set the queue's limits.
+
+        :param max_count: Maximum number of messages, or zero for no limit.
+        :param max_bytes: Maximum total size of messages, or zero for no
+        limit.
+        :param policy: One of QUEUE_POLICIES, applied once either limit is
+        reached."""
+        if policy not in QUEUE_POLICIES:
+            raise ValueError("Unknown queue policy: %s" % policy)
+
+        self._max_count = max_count
+        self._max_bytes = max_bytes
+        self._policy = policy
+        self.check_paused()
+        return
+
+    def is_full(self) -> bool:
+        """Return True if the in-memory queue has reached a limit."""
+        return bool((self._max_count and
+                     len(self._messages) >= self._max_count) or
+                    (self._max_bytes and self._bytes >= self._max_bytes))
+
+    def has_room(self, length: int) -> bool:
+        """Return True if a message fits in the in-memory queue.
+
+        :param length: Size of the message, in bytes."""
+        return bool((not self._max_count or
+                     len(self._messages) < self._max_count) and
+                    (not self._max_bytes or
+                     self._bytes + length <= self._max_bytes))
+
+    def is_paused(self) -> bool:
+        """Return True if the peer has been asked to stop reading."""
+        return self._paused
+
+    def append(self, message: bytes):
+        """Add a message to the end of the queue, applying the policy.
+
+        :param message: Byte array of received FIX message."""
+        self._received += 1
+
+        length = len(message)
+        if self._spill_count or (self._policy == QUEUE_SPILL and
+                                 not self.has_room(length)):
+            self.spill(message)
+            return
+
+        if not self.has_room(length):
+            if self._policy == QUEUE_DROP_NEWEST:
+                self._dropped += 1
+                return
+
+            if self._policy == QUEUE_DROP_OLDEST:
+                while self._messages and not self.has_room(length):
+                    self._bytes -= len(self._messages.popleft())
+                    self._dropped += 1
+
+        self._messages.append(message)
+        self._bytes += len(message)
+        self.check_paused()
+        return
+
+    def popleft(self) -> bytes:
+        """Remove and return the oldest message."""
+        message = self._messages.popleft()
+        self._bytes -= len(message)
+
+        if self._spill_count:
+            self.unspill()
+        self.check_paused()
+        return message
+
+    def take(self, max_count: int = 0, max_bytes: int = 0) -> list:
+        """Remove and return messages from the front of the queue.
+
+        :param max_count: Maximum number of messages, or zero for no limit.
+        :param max_bytes: Maximum total size of the messages, or zero for
+        no limit.  The first queued message is always returned, even if
+        it is larger than this."""
+        messages = []
+        total = 0
+        while self._messages:
+            if max_count and len(messages) >= max_count:
+                break
+
+            total += len(self._messages[0])
+            if max_bytes and messages and total > max_bytes:
+                break
+            messages.append(self.popleft())
+        return messages
+
+    def clear(self):
+        """Discard all queued messages."""
+        self._messages.clear()
+        self._bytes = 0
+
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._spill_count = 0
+        self._spill_bytes = 0
+        self._spill_offset = 0
+
+        self.check_paused()
+        return
+
+    def spill(self, message: bytes):
+        """(Internal) Append a message to the spill file.
+
+        :param message: Byte array of received FIX message."""
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix="fixtool-spill-")
+
+        self._spill.seek(0, os.SEEK_END)
+        self._spill.write(SPILL_HEADER.pack(len(message)))
+        self._spill.write(message)
+        self._spill_count += 1
+        self._spill_bytes += len(message)
+        self._spilled += 1
+        return
+
+    def unspill(self):
+        """(Internal) Move spilled messages back to memory, while there's
+        space, or at least one if the in-memory queue is empty."""
+        while self._spill_count:
+            self._spill.seek(self._spill_offset)
+            length, = SPILL_HEADER.unpack(
+                self._spill.read(SPILL_HEADER.size))
+            if self._messages and not self.has_room(length):
+                break
+
+            message = self._spill.read(length)
+            self._spill_offset += SPILL_HEADER.size + length
+            self._spill_count -= 1
+            self._spill_bytes -= length
+
+            self._messages.append(message)
+            self._bytes += length
+
+        if not self._spill_count:
+            # Reuse the file from the start, rather than letting it grow.
+            self._spill.seek(0)
+            self._spill.truncate()
+            self._spill_offset = 0
+        return
+
+    def check_paused(self):
+        """(Internal) Pause or resume the peer's reading, if required."""
+        paused = self._policy == QUEUE_PAUSE and self.is_full()
+        if paused != self._paused:
+            self._paused = paused
+            if paused:
+                self._peer.pause_receiving()
+            else:
+                self._peer.resume_receiving()
+        return
+
+    def stats(self) -> dict:
+        """Return the queue's limits and counters."""
+        return {"queued": len(self),
+                "queued_bytes": self._bytes + self._spill_bytes,
+                "received": self._received,
+                "dropped": self._dropped,
+                "spilled": self._spilled,
+                "on_disk": self._spill_count,
+                "paused": self._paused,
+                "max_count": self._max_count,
+                "max_bytes": self._max_bytes,
+                "policy": self._policy}
+
+
+class Client(asyncio.Protocol):
+    """Simulated FIX client.
+
+    Once connected, the client is the protocol for an asyncio transport,
+    which buffers outgoing messages, so a server that's slow to read
+    doesn't block the agent."""
 
     def __init__(self, name: str):
         """Constructor."""
         self._name = name
-        self._comp_id = b''
-        self._auto_heartbeat = True
-        self._auto_sequence = True
         self._raw = False
-        self._next_send_sequence = 0
-        self._last_seen_sequence = 0
         self._host = None
         self._port = None
         self._is_connected = False
 
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._socket.setblocking(True)
-        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-
-        self._parser = simplefix.FixParser()
-        self._queue = []
+        self._socket = None
+        self._connect_task = None
+        self._transport = None
+        self._write_paused = False
+        self._writable_callbacks = []
+
+        self._splitter = FixSplitter()
+        self._session = FixSession(name, self.send_message)
+        self._filter = None
+        self._filtered = 0
+        self._queue = ReceiveQueue(self)
+        self._waiters = collections.deque()
+        self._subscribers = []
+        self._ring = None
         return
 
     def destroy(self):
         """Destroy the client instance."""
-        if self._is_connected:
-            self.disconnect()
-
+        self.disconnect()
+        self.close_ring()
         return
 
-    def connect(self, host: str, port: int):
-        """Attempt connection to a FIX server.
+    def connect(self, host: str, port: int, timeout: float, callback):
+        """Start connecting to a FIX server.
 
         :param host: Server's host name or IP address.
-        :param port: Server's TCP port number."""
+        :param port: Server's TCP port number.
+        :param timeout: Maximum time to wait for the connection to be
+        established, in seconds, or None to wait indefinitely.
+        :param callback: Called with None once connected, or an error
+        string if the connection failed.
+
+        The connection is made by the event loop, so other sessions
+        continue meanwhile."""
         self._host = host
         self._port = port
-        self._socket.connect((self._host, self._port))
-        self._is_connected = True
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setblocking(False)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-        asyncio.get_event_loop().add_reader(self._socket, self.readable)
+        self._connect_task = asyncio.ensure_future(
+            self.open_connection(timeout, callback))
+        return
+
+    async def open_connection(self, timeout: float, callback):
+        """(Internal) Connect the socket, and start the transport.
+
+        :param timeout: Maximum time to wait, in seconds, or None.
+        :param callback: Called with None, or an error string."""
+        loop = asyncio.get_event_loop()
+        address = (self._host, self._port)
+        try:
+            await asyncio.wait_for(loop.sock_connect(self._socket, address),
+                                   timeout)
+            await loop.create_connection(lambda: self, sock=self._socket)
+
+        except asyncio.CancelledError:
+            self._socket.close()
+            callback("Connection to %s:%s cancelled" % address)
+            raise
+
+        except asyncio.TimeoutError:
+            self._socket.close()
+            self._connect_task = None
+            callback("Timed out connecting to %s:%s" % address)
+            return
+
+        except OSError as e:
+            self._socket.close()
+            self._connect_task = None
+            callback("Failed to connect to %s:%s: %s" % (address + (e,)))
+            return
+
+        self._connect_task = None
+        callback(None)
         return
 
     def is_connected(self):
         """Returns True if this client is connected to a server."""
         return self._is_connected
 
+    def is_connecting(self):
+        """Returns True if this client is waiting to connect."""
+        return self._connect_task is not None
+
     def disconnect(self):
-        """Close the active server connection for this client."""
-        asyncio.get_event_loop().remove_reader(self._socket)
-        self._socket.close()
+        """Close the active server connection for this client.
+
+        Messages already sent are written before the socket is closed.
+        A connection attempt in progress is abandoned."""
+        if self._connect_task is not None:
+            self._connect_task.cancel()
+            self._connect_task = None
+
+        if not self._is_connected:
+            return
+
         self._is_connected = False
+        self._session.disconnected()
+        self._transport.close()
+
+        self.wake_waiters()
+        self.wake_writers()
         return
 
-    def readable(self):
-        """Handle received data on the client's server connection.
+    def connection_made(self, transport):
+        """Start using the connected transport.
 
-        This method actually parses the message content, so it must
-        be well-formed FIX, so that it can detect the end of the
-        message.  This is perhaps not ideal, but ..."""
-        buf = self._socket.recv(65536)
-        if not buf:
-            self.disconnect()
-            return
+        :param transport: asyncio transport for the server connection."""
+        self._transport = transport
+        self._is_connected = True
+        self._splitter.reset()
+        transport.set_write_buffer_limits(WRITE_BUFFER_HIGH,
+                                          WRITE_BUFFER_LOW)
+        if self._queue.is_paused():
+            transport.pause_reading()
+        self._session.connected()
+        return
+
+    def connection_lost(self, exc):
+        """Handle closure of the server connection.
+
+        :param exc: Exception, or None if closed normally."""
+        if exc is not None:
+            logging.info("Client %s connection lost: %s", self._name, exc)
+
+        self._session.disconnected()
+        self._transport = None
+        if self._is_connected:
+            self._is_connected = False
+            self.wake_waiters()
+            self.wake_writers()
+        return
+
+    def pause_writing(self):
+        """Stop confirming sends, until the server catches up."""
+        logging.debug("Client %s write buffer full", self._name)
+        self._write_paused = True
+        return
+
+    def resume_writing(self):
+        """Confirm any sends that were held back."""
+        self._write_paused = False
+        self.wake_writers()
+        return
+
+    def pause_receiving(self):
+        """Stop reading from the server, while the receive queue is full."""
+        logging.debug("Client %s receive queue full", self._name)
+        if self._transport is not None:
+            self._transport.pause_reading()
+        return
 
-        self._parser.append_buffer(buf)
-        message = self._parser.get_message()
-        while message is not None:
-            self._queue.append(message.encode())
-            message = self._parser.get_message()
+    def resume_receiving(self):
+        """Resume reading from the server."""
+        if self._transport is not None:
+            self._transport.resume_reading()
+        return
+
+    def data_received(self, data: bytes):
+        """Handle received data on the client's server connection.
+
+        Messages are found using their BodyLength field, and queued
+        exactly as received, without being parsed.  The session layer,
+        if enabled, sees each message first.  If there's a receive
+        filter, messages it rejects are counted, not queued.
+
+        :param data: Bytes read from the connection."""
+        for message in self._splitter.feed(data):
+            self._session.received(message)
+            if self._filter is not None and not self._filter.accepts(message):
+                self._filtered += 1
+                continue
+            self.queue_message(message)
+
+        if self._subscribers:
+            self.push_messages()
+        self.notify_waiters()
         return
 
     def receive_queue_length(self) -> int:
@@ -136,7 +555,215 @@ class Client:
         """Return the first message from the received message queue."""
         if self.receive_queue_length() < 1:
             return None
-        return self._queue.pop(0)
+        return self._queue.popleft()
+
+    def get_messages(self, max_count: int = 0, max_bytes: int = 0) -> list:
+        """Return messages from the front of the received message queue.
+
+        :param max_count: Maximum number of messages, or zero for no limit.
+        :param max_bytes: Maximum total size of the messages, or zero for
+        no limit.  The first queued message is always returned, even if
+        it is larger than this."""
+        return self._queue.take(max_count, max_bytes)
+
+    def set_queue_limit(self, max_count: int, max_bytes: int, policy: str):
+        """Limit the size of the received message queue.
+
+        :param max_count: Maximum number of messages, or zero for no limit.
+        :param max_bytes: Maximum total size of messages, or zero for no
+        limit.
+        :param policy: One of QUEUE_POLICIES.
+
+        Raises ValueError if the policy is unknown."""
+        self._queue.set_limit(max_count, max_bytes, policy)
+        return
+
+    def set_receive_filter(self, include: list, exclude: list):
+        """Set rules for which received messages are queued.
+
+        :param include: List of rules, any of which a message must match.
+        :param exclude: List of rules, none of which a message may match.
+
+        Rules are described in fixtool.filter.  With no rules, every
+        message is queued.  Raises ValueError if a rule is malformed."""
+        message_filter = MessageFilter(include, exclude)
+        self._filter = None if message_filter.is_empty() else message_filter
+        return
+
+    def set_validate_checksum(self, validate: bool):
+        """Enable or disable checking of received CheckSum values.
+
+        :param validate: If True, discard received messages whose
+        CheckSum is wrong, counting them as malformed."""
+        self._splitter.set_validate_checksum(validate)
+        return
+
+    def set_session_layer(self, enabled: bool, heartbeat_interval: float,
+                          begin_string: str, sender_comp_id: str,
+                          target_comp_id: str, stamp: bool):
+        """Enable or disable the agent's FIX session layer.
+
+        See FixSession.configure() for the parameters."""
+        self._session.configure(enabled, heartbeat_interval, begin_string,
+                                sender_comp_id, target_comp_id, stamp)
+        return
+
+    def stats(self) -> dict:
+        """Return received message queue and session statistics."""
+        stats = self._queue.stats()
+        stats["filtered"] = self._filtered
+        stats["malformed"] = self._splitter.error_count()
+        stats["session"] = self._session.stats()
+        return stats
+
+    def queue_message(self, message: bytes):
+        """Queue a received message, or write it to the ring.
+
+        :param message: Byte array of received FIX message.
+
+        The ring is only used while the queue is empty, so everything
+        in the ring is older than anything in the queue, and a reader
+        that empties the ring before asking for queued messages sees
+        them in order.  Waiting requests and subscribers take messages
+        from the queue, so the ring isn't used while there are any."""
+        if self._ring is not None and not self._queue and \
+                not self._waiters and not self._subscribers and \
+                self._ring.write(message):
+            return
+
+        self._queue.append(message)
+        return
+
+    def open_ring(self, size: int) -> str:
+        """Write received messages to a shared memory ring.
+
+        :param size: Ring data size in bytes; zero for the default.
+        :returns: File name of the ring.
+
+        If the ring is already open, it's reused."""
+        if self._ring is None:
+            self._ring = RingBuffer.create(size or DEFAULT_RING_SIZE)
+        return self._ring.path()
+
+    def ring_has_messages(self) -> bool:
+        """Return True if the ring has messages not yet read."""
+        return self._ring is not None and not self._ring.is_empty()
+
+    def close_ring(self):
+        """Stop using the shared memory ring, and remove it."""
+        if self._ring is not None:
+            self._ring.unlink()
+            self._ring.close()
+            self._ring = None
+        return
+
+    def add_waiter(self, control, callback, timeout: float, match=None):
+        """Wait for a message to be queued.
+
+        :param control: Control session making the request.
+        :param callback: Called with the message once one is queued, or
+        None if the timeout expires first.
+        :param timeout: Maximum time to wait, in seconds.
+        :param match: Optional MessageMatch the message must satisfy.
+        :returns: The ReceiveWaiter."""
+        waiter = ReceiveWaiter(self, control, callback, timeout, match)
+        self._waiters.append(waiter)
+        return waiter
+
+    def remove_waiter(self, waiter: ReceiveWaiter):
+        """Remove an expired waiter.
+
+        :param waiter: Waiter to remove."""
+        self._waiters.remove(waiter)
+        return
+
+    def notify_waiters(self):
+        """Hand queued messages to waiting requests, in order.
+
+        A waiter with a match discards messages until one matches."""
+        while self._waiters and self._queue:
+            waiter = self._waiters[0]
+            if waiter.is_abandoned():
+                self._waiters.popleft()
+                waiter.fire(None)
+                continue
+
+            message = self._queue.popleft()
+            if waiter.accepts(message):
+                self._waiters.popleft()
+                waiter.fire(message)
+        return
+
+    def take_match(self, match) -> tuple:
+        """Remove queued messages up to the first that matches.
+
+        :param match: MessageMatch to satisfy.
+        :returns: Tuple of the matching message, or None if none was
+        queued, and the number of messages discarded."""
+        skipped = 0
+        while self.receive_queue_length() > 0:
+            message = self._queue.popleft()
+            if match.accepts(message):
+                return message, skipped
+            skipped += 1
+        return None, skipped
+
+    def wake_waiters(self):
+        """Complete all waiting requests without a message."""
+        waiters = self._waiters
+        self._waiters = collections.deque()
+        for waiter in waiters:
+            waiter.fire(None)
+        return
+
+    def subscribe(self, control):
+        """Forward received messages to a control session.
+
+        :param control: Control session to receive messages.
+
+        Any messages already queued are forwarded immediately."""
+        if control not in self._subscribers:
+            self._subscribers.append(control)
+        self.push_messages()
+        return
+
+    def unsubscribe(self, control):
+        """Stop forwarding received messages to a control session.
+
+        :param control: Control session to stop receiving messages.
+
+        Once there are no subscribers, received messages are queued."""
+        if control in self._subscribers:
+            self._subscribers.remove(control)
+        return
+
+    def push_messages(self):
+        """Forward all queued messages to subscribed control sessions.
+
+        Subscribers that have disconnected are discarded.  If none
+        remain, the messages stay queued.  They also stay queued, subject
+        to the queue's limit and policy, while any subscriber is backed
+        up, until it has drained."""
+        self._subscribers = [c for c in self._subscribers
+                             if not c.is_closed()]
+        if not self._subscribers:
+            return
+
+        while self._queue:
+            for control in self._subscribers:
+                if control.is_backed_up():
+                    control.when_drained(self.push_messages)
+                    return
+
+            push = ClientReceivedMessage(self._name,
+                                         self._queue.take(0, WRITE_CHUNK))
+            for control in self._subscribers:
+                try:
+                    control.send_message(push)
+                except OSError as e:
+                    logging.warning("Failed to forward messages from %s: %s",
+                                    self._name, str(e))
+        return
 
     def send_message(self, message: bytes):
         """Send a message to the connected server session.
@@ -145,20 +772,56 @@ class Client:
 
         The message has been received via the control protocol, where
         it was wrapped/unwrapped in BASE64, and we assume it is good.
-        We send it as-is."""
-        self._socket.sendall(message)
+        We send it as-is.  It's buffered by the transport if the socket
+        can't take it immediately."""
+        self.send_messages([message])
+        return
+
+    def send_messages(self, messages: list):
+        """Send several messages to the connected server session.
+
+        :param messages: List of byte arrays of formatted FIX messages.
+
+        The messages are concatenated and written to the socket in a
+        single call, so a batch costs one system call rather than one
+        per message."""
+        if not self._is_connected:
+            raise OSError("Client %s is not connected" % self._name)
+
+        if self._session.is_stamping():
+            messages = self._session.stamp(messages)
+        self._transport.write(b''.join(messages))
+        self._session.sent(messages)
+        return
+
+    def when_writable(self, callback):
+        """Call back once the write buffer is below its high water mark.
+
+        :param callback: Function taking no arguments.
+
+        This is called immediately, unless the transport has paused
+        writing."""
+        if not self._write_paused:
+            callback()
+            return
+
+        self._writable_callbacks.append(callback)
+        return
+
+    def wake_writers(self):
+        """Run callbacks waiting for the write buffer to drain."""
+        callbacks = self._writable_callbacks
+        self._writable_callbacks = []
+        for callback in callbacks:
+            callback()
         return
 
 
 class Server:
     def __init__(self):
         """Constructor."""
-        self._auto_heartbeat = True
-        self._auto_sequence = True
         self._raw = False
-        self._next_send_sequence = 0
-        self._last_seen_sequence = 0
-        self._pending_sessions = []
+        self._pending_sessions = collections.deque()
         self._accepted_sessions = {}
 
         self._socket = None
@@ -171,7 +834,7 @@ class Server:
 
         for session in self._pending_sessions:
             session.destroy()
-        self._pending_sessions = []
+        self._pending_sessions.clear()
 
         for session in self._accepted_sessions.values():
             session.destroy()
@@ -190,7 +853,7 @@ class Server:
         self._socket.setblocking(False)
         self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         self._socket.bind(('', port))
-        self._socket.listen(5)
+        self._socket.listen(socket.SOMAXCONN)
         actual_port = self._socket.getsockname()[1]
 
         asyncio.get_event_loop().add_reader(self._socket, self.acceptable)
@@ -204,14 +867,29 @@ class Server:
         return
 
     def acceptable(self):
-        """Handle readable event on listening socket."""
-        sock, _ = self._socket.accept()
-        session = ServerSession(self, sock)
-        self._pending_sessions.append(session)
+        """Handle readable event on listening socket.
+
+        The listening socket is non-blocking, so this accepts every
+        connection waiting in the backlog, and returns once it's empty."""
+        while self._socket is not None:
+            try:
+                sock, _ = self._socket.accept()
+            except BlockingIOError:
+                break
+
+            session = ServerSession(self, sock)
+            self._pending_sessions.append(session)
         return
 
     def pending_client_count(self):
-        """Return number of pending client sessions."""
+        """Return number of pending client sessions.
+
+        Connections sitting in the listening socket's backlog are
+        accepted first, so a client connected by this agent is counted
+        even if the event loop hasn't yet dispatched its readable
+        event."""
+        if self._socket is not None:
+            self.acceptable()
         return len(self._pending_sessions)
 
     def accept_client_session(self, name: str):
@@ -222,14 +900,18 @@ class Server:
         if self.pending_client_count() < 1:
             return None
 
-        client = self._pending_sessions.pop(0)
+        client = self._pending_sessions.popleft()
         client.set_name(name)
         self._accepted_sessions[name] = client
         return client
 
 
-class ServerSession:
-    """Server state of an active client connection."""
+class ServerSession(asyncio.Protocol):
+    """Server state of an active client connection.
+
+    The session is the protocol for an asyncio transport, which buffers
+    outgoing messages, so a client that's slow to read doesn't block
+    the agent."""
 
     def __init__(self, server: Server, sock: socket.SocketType):
         """Constructor.
@@ -239,18 +921,33 @@ class ServerSession:
         self._server = server
         self._socket = sock
         self._name = None
-        self._parser = simplefix.FixParser()
+        self._splitter = FixSplitter()
+        self._session = FixSession(None, self.send_message)
+        self._filter = None
+        self._filtered = 0
         self._is_connected = True
-        self._queue = []
-
-        asyncio.get_event_loop().add_reader(sock, self.readable)
+        self._queue = ReceiveQueue(self)
+        self._waiters = collections.deque()
+        self._subscribers = []
+        self._ring = None
+        self._transport = None
+        self._unsent = []
+        self._write_paused = False
+        self._writable_callbacks = []
+
+        # Messages sent before the transport is ready are kept until
+        # connection_made().
+        loop = asyncio.get_event_loop()
+        self._transport_task = asyncio.ensure_future(
+            loop.connect_accepted_socket(lambda: self, sock))
         return
 
     def destroy(self):
         """Destroy the active session to a client."""
         if self._is_connected:
             self.disconnect()
-        self._queue = []
+        self._queue.clear()
+        self.close_ring()
         return
 
     def set_name(self, name: str):
@@ -259,20 +956,79 @@ class ServerSession:
         :param name: User-visible name for this session, as used
         in logging, etc."""
         self._name = name
+        self._session.set_name(name)
         return
 
-    def readable(self):
-        """Handle readable event on session's socket."""
-        buf = self._socket.recv(65536)
-        if not buf:
+    def connection_made(self, transport):
+        """Start using the session's transport.
+
+        :param transport: asyncio transport for the client connection."""
+        self._transport = transport
+        transport.set_write_buffer_limits(WRITE_BUFFER_HIGH,
+                                          WRITE_BUFFER_LOW)
+        if self._queue.is_paused():
+            transport.pause_reading()
+        if self._unsent:
+            transport.writelines(self._unsent)
+            self._unsent = []
+        self._session.connected()
+        return
+
+    def connection_lost(self, exc):
+        """Handle closure of the client connection.
+
+        :param exc: Exception, or None if closed normally."""
+        if exc is not None:
+            logging.info("Session %s connection lost: %s", self._name, exc)
+
+        self._session.disconnected()
+        self._transport = None
+        self._socket = None
+        if self._is_connected:
             self._is_connected = False
-            return
+            self.wake_waiters()
+            self.wake_writers()
+        return
+
+    def pause_writing(self):
+        """Stop confirming sends, until the client catches up."""
+        logging.debug("Session %s write buffer full", self._name)
+        self._write_paused = True
+        return
+
+    def resume_writing(self):
+        """Confirm any sends that were held back."""
+        self._write_paused = False
+        self.wake_writers()
+        return
+
+    def pause_receiving(self):
+        """Stop reading from the client, while the receive queue is full."""
+        logging.debug("Session %s receive queue full", self._name)
+        if self._transport is not None:
+            self._transport.pause_reading()
+        return
+
+    def resume_receiving(self):
+        """Resume reading from the client."""
+        if self._transport is not None:
+            self._transport.resume_reading()
+        return
 
-        self._parser.append_buffer(buf)
-        msg = self._parser.get_message()
-        while msg is not None:
-            self._queue.append(msg.encode())
-            msg = self._parser.get_message()
+    def data_received(self, data: bytes):
+        """Handle received data on the session's connection.
+
+        :param data: Bytes read from the connection."""
+        for message in self._splitter.feed(data):
+            self._session.received(message)
+            if self._filter is not None and not self._filter.accepts(message):
+                self._filtered += 1
+                continue
+            self.queue_message(message)
+
+        if self._subscribers:
+            self.push_messages()
+        self.notify_waiters()
         return
 
     def is_connected(self) -> bool:
@@ -280,11 +1036,25 @@ class ServerSession:
         return self._is_connected
 
     def disconnect(self):
-        """Close this session."""
-        asyncio.get_event_loop().remove_reader(self._socket)
-        self._socket.close()
-        self._socket = None
+        """Close this session.
+
+        Messages already sent are written before the socket is closed.
+        The client may already have closed the session, in which case
+        this does nothing."""
+        if not self._is_connected:
+            return
+
         self._is_connected = False
+        self._session.disconnected()
+        if self._transport is not None:
+            self._transport.close()
+        else:
+            self._transport_task.cancel()
+            self._socket.close()
+        self._socket = None
+
+        self.wake_waiters()
+        self.wake_writers()
         return
 
     def receive_queue_length(self) -> int:
@@ -295,101 +1065,568 @@ class ServerSession:
         """Return the first message from the received message queue."""
         if self.receive_queue_length() < 1:
             return None
-        return self._queue.pop(0)
+        return self._queue.popleft()
 
-    def send_message(self, message: bytes):
-        """Send a message to the connected client.
+    def get_messages(self, max_count: int = 0, max_bytes: int = 0) -> list:
+        """Return messages from the front of the received message queue.
 
-        :param message: Byte array of formatted FIX message to send."""
-        self._socket.sendall(message)
+        :param max_count: Maximum number of messages, or zero for no limit.
+        :param max_bytes: Maximum total size of the messages, or zero for
+        no limit.  The first queued message is always returned, even if
+        it is larger than this."""
+        return self._queue.take(max_count, max_bytes)
+
+    def set_queue_limit(self, max_count: int, max_bytes: int, policy: str):
+        """Limit the size of the received message queue.
+
+        :param max_count: Maximum number of messages, or zero for no limit.
+        :param max_bytes: Maximum total size of messages, or zero for no
+        limit.
+        :param policy: One of QUEUE_POLICIES.
+
+        Raises ValueError if the policy is unknown."""
+        self._queue.set_limit(max_count, max_bytes, policy)
         return
 
+    def set_receive_filter(self, include: list, exclude: list):
+        """Set rules for which received messages are queued.
 
-class ControlSession:
-    """Control client session."""
+        :param include: List of rules, any of which a message must match.
+        :param exclude: List of rules, none of which a message may match.
 
-    def __init__(self, sock: socket.SocketType):
-        """Constructor.
+        Rules are described in fixtool.filter.  With no rules, every
+        message is queued.  Raises ValueError if a rule is malformed."""
+        message_filter = MessageFilter(include, exclude)
+        self._filter = None if message_filter.is_empty() else message_filter
+        return
 
-        :param sock: Accepted socket."""
-        self._socket = sock
-        self._buffer = b''
+    def set_validate_checksum(self, validate: bool):
+        """Enable or disable checking of received CheckSum values.
+
+        :param validate: If True, discard received messages whose
+        CheckSum is wrong, counting them as malformed."""
+        self._splitter.set_validate_checksum(validate)
         return
 
-    def append_bytes(self, buffer: bytes):
-        """Receive a buffer of bytes from this control client.
+    def set_session_layer(self, enabled: bool, heartbeat_interval: float,
+                          begin_string: str, sender_comp_id: str,
+                          target_comp_id: str, stamp: bool):
+        """Enable or disable the agent's FIX session layer.
 
-        :param buffer: Array of bytes from client."""
-        self._buffer += buffer
-        if len(self._buffer) <= 4:
-            # No payload yet
-            return None
+        See FixSession.configure() for the parameters."""
+        self._session.configure(enabled, heartbeat_interval, begin_string,
+                                sender_comp_id, target_comp_id, stamp)
+        return
 
-        payload_length = struct.unpack(b'>L', self._buffer[:4])[0]
-        if len(buffer) < 4 + payload_length:
-            # Not received full message yet
-            return None
-        self._buffer = self._buffer[4:]
+    def stats(self) -> dict:
+        """Return received message queue and session statistics."""
+        stats = self._queue.stats()
+        stats["filtered"] = self._filtered
+        stats["malformed"] = self._splitter.error_count()
+        stats["session"] = self._session.stats()
+        return stats
+
+    def queue_message(self, message: bytes):
+        """Queue a received message, or write it to the ring.
+
+        :param message: Byte array of received FIX message.
+
+        The ring is only used while the queue is empty, so everything
+        in the ring is older than anything in the queue, and a reader
+        that empties the ring before asking for queued messages sees
+        them in order.  Waiting requests and subscribers take messages
+        from the queue, so the ring isn't used while there are any."""
+        if self._ring is not None and not self._queue and \
+                not self._waiters and not self._subscribers and \
+                self._ring.write(message):
+            return
 
-        # FIXME: deal with the case where there's multiple control
-        # FIXME: messages in the buffer.
+        self._queue.append(message)
+        return
 
-        payload = self._buffer[:payload_length]
-        self._buffer = self._buffer[payload_length:]
-        return payload
+    def open_ring(self, size: int) -> str:
+        """Write received messages to a shared memory ring.
 
-    def send(self, payload: bytes):
-        """Send a buffer to the control client.
+        :param size: Ring data size in bytes; zero for the default.
+        :returns: File name of the ring.
 
-        :param payload: Array of bytes to send to client."""
+        If the ring is already open, it's reused."""
+        if self._ring is None:
+            self._ring = RingBuffer.create(size or DEFAULT_RING_SIZE)
+        return self._ring.path()
 
-        payload_length = len(payload)
-        header = struct.pack(">L", payload_length)
-        self._socket.sendall(header + payload)
+    def ring_has_messages(self) -> bool:
+        """Return True if the ring has messages not yet read."""
+        return self._ring is not None and not self._ring.is_empty()
+
+    def close_ring(self):
+        """Stop using the shared memory ring, and remove it."""
+        if self._ring is not None:
+            self._ring.unlink()
+            self._ring.close()
+            self._ring = None
         return
 
-    def close(self):
-        """Close this connection."""
-        self._socket.close()
+    def add_waiter(self, control, callback, timeout: float, match=None):
+        """Wait for a message to be queued.
+
+        :param control: Control session making the request.
+        :param callback: Called with the message once one is queued, or
+        None if the timeout expires first.
+        :param timeout: Maximum time to wait, in seconds.
+        :param match: Optional MessageMatch the message must satisfy.
+        :returns: The ReceiveWaiter."""
+        waiter = ReceiveWaiter(self, control, callback, timeout, match)
+        self._waiters.append(waiter)
+        return waiter
+
+    def remove_waiter(self, waiter: ReceiveWaiter):
+        """Remove an expired waiter.
+
+        :param waiter: Waiter to remove."""
+        self._waiters.remove(waiter)
         return
 
+    def notify_waiters(self):
+        """Hand queued messages to waiting requests, in order.
+
+        A waiter with a match discards messages until one matches."""
+        while self._waiters and self._queue:
+            waiter = self._waiters[0]
+            if waiter.is_abandoned():
+                self._waiters.popleft()
+                waiter.fire(None)
+                continue
+
+            message = self._queue.popleft()
+            if waiter.accepts(message):
+                self._waiters.popleft()
+                waiter.fire(message)
+        return
 
-class FixToolAgent(object):
-    """Main class for the simulation agent."""
+    def take_match(self, match) -> tuple:
+        """Remove queued messages up to the first that matches.
+
+        :param match: MessageMatch to satisfy.
+        :returns: Tuple of the matching message, or None if none was
+        queued, and the number of messages discarded."""
+        skipped = 0
+        while self.receive_queue_length() > 0:
+            message = self._queue.popleft()
+            if match.accepts(message):
+                return message, skipped
+            skipped += 1
+        return None, skipped
+
+    def wake_waiters(self):
+        """Complete all waiting requests without a message."""
+        waiters = self._waiters
+        self._waiters = collections.deque()
+        for waiter in waiters:
+            waiter.fire(None)
+        return
 
-    def __init__(self, port=0):
-        """Constructor.
+    def subscribe(self, control):
+        """Forward received messages to a control session.
 
-        :param port: TCP port number for accepting control sessions."""
-        self._socket = None
-        self._loop = None
+        :param control: Control session to receive messages.
 
-        self._control_sessions = {}
-        self._clients = {}
-        self._servers = {}
-        self._server_sessions = {}
+        Any messages already queued are forwarded immediately."""
+        if control not in self._subscribers:
+            self._subscribers.append(control)
+        self.push_messages()
+        return
 
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._socket.setblocking(False)
-        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        self._socket.bind(('0.0.0.0', port))
-        self._socket.listen(5)
+    def unsubscribe(self, control):
+        """Stop forwarding received messages to a control session.
 
-        self._loop = asyncio.get_event_loop()
-        self._loop.add_reader(self._socket, self.accept)
-        self._loop.add_signal_handler(signal.SIGINT, self.handle_sigint)
+        :param control: Control session to stop receiving messages.
 
-        name = self._socket.getsockname()
-        self._port = name[1]
+        Once there are no subscribers, received messages are queued."""
+        if control in self._subscribers:
+            self._subscribers.remove(control)
         return
 
-    def port(self):
-        """Get the active control sessions port number."""
-        return self._port
+    def push_messages(self):
+        """Forward all queued messages to subscribed control sessions.
 
-    def run(self):
-        """Enter mainloop."""
-        self._loop.run_forever()
+        Subscribers that have disconnected are discarded.  If none
+        remain, the messages stay queued.  They also stay queued, subject
+        to the queue's limit and policy, while any subscriber is backed
+        up, until it has drained."""
+        self._subscribers = [c for c in self._subscribers
+                             if not c.is_closed()]
+        if not self._subscribers:
+            return
+
+        while self._queue:
+            for control in self._subscribers:
+                if control.is_backed_up():
+                    control.when_drained(self.push_messages)
+                    return
+
+            push = SessionReceivedMessage(self._name,
+                                          self._queue.take(0, WRITE_CHUNK))
+            for control in self._subscribers:
+                try:
+                    control.send_message(push)
+                except OSError as e:
+                    logging.warning("Failed to forward messages from %s: %s",
+                                    self._name, str(e))
+        return
+
+    def send_message(self, message: bytes):
+        """Send a message to the connected client.
+
+        :param message: Byte array of formatted FIX message to send."""
+        self.send_messages([message])
+        return
+
+    def send_messages(self, messages: list):
+        """Send several messages to the connected client.
+
+        :param messages: List of byte arrays of formatted FIX messages.
+
+        The messages are concatenated and written to the socket in a
+        single call."""
+        if not self._is_connected:
+            raise OSError("Session %s is not connected" % self._name)
+
+        if self._session.is_stamping():
+            messages = self._session.stamp(messages)
+        buf = b''.join(messages)
+        if self._transport is None:
+            self._unsent.append(buf)
+        else:
+            self._transport.write(buf)
+        self._session.sent(messages)
+        return
+
+    def when_writable(self, callback):
+        """Call back once the write buffer is below its high water mark.
+
+        :param callback: Function taking no arguments.
+
+        This is called immediately, unless the transport has paused
+        writing."""
+        if not self._write_paused:
+            callback()
+            return
+
+        self._writable_callbacks.append(callback)
+        return
+
+    def wake_writers(self):
+        """Run callbacks waiting for the write buffer to drain."""
+        callbacks = self._writable_callbacks
+        self._writable_callbacks = []
+        for callback in callbacks:
+            callback()
+        return
+
+
+class SocketWriter:
+    """Buffered writes to a non-blocking socket.
+
+    Whatever the socket can't take immediately is kept, and written as
+    the event loop reports it writable, so a peer that's slow to read
+    never blocks the agent."""
+
+    def __init__(self, sock: socket.SocketType):
+        """Constructor.
+
+        :param sock: Connected, non-blocking socket."""
+        self._socket = sock
+        self._buffer = collections.deque()
+        self._length = 0
+        self._failed = False
+        self._drained_callbacks = []
+        return
+
+    def write(self, data: bytes):
+        """Write bytes to the socket, buffering what it can't take.
+
+        :param data: Array of bytes to write.
+
+        Once the socket has failed, data is discarded."""
+        if self._failed:
+            return
+
+        if not self._buffer:
+            try:
+                sent = self._socket.send(data)
+            except BlockingIOError:
+                sent = 0
+            except OSError as e:
+                self.fail(e)
+                return
+
+            if sent == len(data):
+                return
+            data = memoryview(data)[sent:]
+            asyncio.get_event_loop().add_writer(self._socket, self.writable)
+
+        self._buffer.append(data)
+        self._length += len(data)
+        return
+
+    def writable(self):
+        """(Internal) Write buffered data once the socket is writable."""
+        chunks = []
+        size = 0
+        while self._buffer and size < WRITE_CHUNK:
+            chunks.append(self._buffer.popleft())
+            size += len(chunks[-1])
+        data = chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+        try:
+            sent = self._socket.send(data)
+        except BlockingIOError:
+            sent = 0
+        except OSError as e:
+            self.fail(e)
+            return
+
+        self._length -= sent
+        if sent < len(data):
+            self._buffer.appendleft(memoryview(data)[sent:])
+            return
+
+        if not self._buffer:
+            asyncio.get_event_loop().remove_writer(self._socket)
+            callbacks = self._drained_callbacks
+            self._drained_callbacks = []
+            for callback in callbacks:
+                callback()
+        return
+
+    def fail(self, error: OSError):
+        """(Internal) Give up writing after a socket error.
+
+        :param error: Exception raised by the socket."""
+        logging.warning("Discarding %d unsent bytes: %s",
+                        self._length, str(error))
+        asyncio.get_event_loop().remove_writer(self._socket)
+        self._buffer.clear()
+        self._length = 0
+        self._failed = True
+        self._drained_callbacks = []
+        return
+
+    def buffered(self) -> int:
+        """Return the number of bytes waiting to be written."""
+        return self._length
+
+    def has_failed(self) -> bool:
+        """Return True if writing to the socket has failed."""
+        return self._failed
+
+    def when_drained(self, callback):
+        """Call back once all buffered data has been written.
+
+        :param callback: Function taking no arguments.
+
+        This is called immediately if nothing is buffered.  A callback
+        that's already waiting isn't added again, and callbacks are
+        dropped if the socket fails."""
+        if not self._buffer:
+            callback()
+            return
+
+        if callback not in self._drained_callbacks:
+            self._drained_callbacks.append(callback)
+        return
+
+    def flush(self, timeout: float):
+        """Write out buffered data, blocking for up to timeout seconds.
+
+        :param timeout: Maximum time to wait, in seconds.
+
+        Used just before the socket is closed, so replies sent by the
+        last requests aren't lost."""
+        if self._failed or not self._buffer:
+            return
+
+        asyncio.get_event_loop().remove_writer(self._socket)
+        try:
+            self._socket.settimeout(timeout)
+            while self._buffer:
+                self._socket.sendall(self._buffer.popleft())
+        except OSError as e:
+            self.fail(e)
+            return
+
+        self._length = 0
+        return
+
+
+class ControlSession:
+    """Control client session.
+
+    Messages to the control client are written without blocking, so
+    while it's busy sending a request, and not reading, the agent
+    carries on, buffering what it sends.  Subscribed peers stop
+    forwarding received messages while the buffer is backed up."""
+
+    def __init__(self, sock: socket.SocketType):
+        """Constructor.
+
+        :param sock: Accepted socket."""
+        self._socket = sock
+        self._socket.setblocking(False)
+        self._writer = SocketWriter(sock)
+        self._decoder = FrameDecoder()
+        self._closed = False
+        self._codec = CODEC_JSON
+        return
+
+    def append_bytes(self, buffer: bytes) -> list:
+        """Receive a buffer of bytes from this control client.
+
+        :param buffer: Array of bytes from client.
+        :returns: List of complete message payloads, which is empty if
+        the buffer didn't complete a message."""
+        self._decoder.feed(buffer)
+        return self._decoder.frames()
+
+    def send(self, payload: bytes):
+        """Send a buffer to the control client.
+
+        :param payload: Array of bytes to send to client.
+
+        A response completing a parked request can arrive after the
+        control client has disconnected, so sending on a closed session
+        quietly does nothing."""
+        if self._closed:
+            return
+
+        self._writer.write(encode_frame(payload))
+        return
+
+    def send_message(self, message, request_id=None):
+        """Encode and send a message to the control client.
+
+        :param message: Control message instance.
+        :param request_id: Identifier of the request being answered, or
+        None for an unsolicited message."""
+        self.send(encode_message(message, self._codec, request_id))
+        return
+
+    def reply(self, request: dict, response):
+        """Send the response to a request.
+
+        :param request: Decoded request message.
+        :param response: Control message instance.
+
+        If the request had an identifier, it's copied to the response,
+        so the client can match them up even if responses are sent in
+        a different order to the requests."""
+        self.send_message(response, request.get("id"))
+        return
+
+    def set_codec(self, codec: str):
+        """Set the encoding used for messages sent to the client.
+
+        :param codec: CODEC_JSON or CODEC_BINARY."""
+        self._codec = codec
+        return
+
+    def is_closed(self) -> bool:
+        """Return True if this connection has been closed, or failed."""
+        return self._closed or self._writer.has_failed()
+
+    def is_backed_up(self) -> bool:
+        """Return True if the control client is falling behind.
+
+        That is, more than CONTROL_BUFFER_HIGH bytes are waiting to be
+        written to it."""
+        return self._writer.buffered() > CONTROL_BUFFER_HIGH
+
+    def when_drained(self, callback):
+        """Call back once everything sent has been written.
+
+        :param callback: Function taking no arguments."""
+        self._writer.when_drained(callback)
+        return
+
+    def close(self):
+        """Close this connection.
+
+        Anything still buffered gets a second to be written."""
+        if not self._closed:
+            self._writer.flush(1)
+        self._socket.close()
+        self._closed = True
+        return
+
+
+class FixToolAgent(object):
+    """Main class for the simulation agent."""
+
+    def __init__(self, port=0, bind="127.0.0.1", path=None):
+        """Constructor.
+
+        :param port: TCP port number for accepting control sessions.
+        :param bind: IP address for the control sessions port.
+        :param path: If set, accept control sessions on this Unix domain
+        socket path instead of TCP.  A leading '@' selects the Linux
+        abstract namespace."""
+        self._socket = None
+        self._loop = None
+        self._port = None
+        self._path = path
+
+        self._control_sessions = {}
+        self._clients = {}
+        self._servers = {}
+        self._server_sessions = {}
+
+        # Request handlers, by message type.
+        self._handlers = {}
+        for message_type in MESSAGE_TYPES:
+            handler = getattr(self, "handle_" + message_type, None)
+            if handler is not None:
+                self._handlers[message_type] = handler
+
+        if path:
+            address = unix_socket_address(path)
+            if address[0] != '\0' and os.path.exists(address):
+                # Remove a socket left behind by a previous agent.
+                if not stat.S_ISSOCK(os.stat(address).st_mode):
+                    raise OSError("Not a socket: %s" % address)
+                os.unlink(address)
+
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.bind(address)
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._socket.bind((bind, port))
+            self._port = self._socket.getsockname()[1]
+
+        self._socket.setblocking(False)
+        self._socket.listen(5)
+
+        self._loop = asyncio.get_event_loop()
+        self._loop.add_reader(self._socket, self.accept)
+        self._loop.add_signal_handler(signal.SIGINT, self.handle_sigint)
+        return
+
+    def port(self):
+        """Get the active control sessions port number.
+
+        :returns: TCP port number, or None if using a Unix socket."""
+        return self._port
+
+    def path(self):
+        """Get the active control sessions Unix socket path.
+
+        :returns: Socket path, or None if using TCP."""
+        return self._path
+
+    def run(self):
+        """Enter mainloop."""
+        self._loop.run_forever()
         return
 
     def stop(self):
@@ -438,6 +1675,13 @@ class FixToolAgent(object):
         self._socket = None
         self._port = None
 
+        if self._path and self._path[0] != '@':
+            try:
+                os.unlink(self._path)
+            except OSError:
+                pass
+        self._path = None
+
         # Event loop.
         self._loop.remove_signal_handler(signal.SIGINT)
         self._loop.close()
@@ -459,14 +1703,24 @@ class FixToolAgent(object):
         self._loop.add_reader(sock, self.readable, sock)
         self._control_sessions[sock] = ControlSession(sock)
 
-        logging.info("Accepted control session from %s", addr[0])
+        if sock.family == socket.AF_UNIX:
+            logging.info("Accepted control session on %s", self._path)
+        else:
+            logging.info("Accepted control session from %s", addr[0])
         return
 
     def readable(self, sock):
         """Handle readable event on a control client socket."""
         logging.log(logging.DEBUG, "Control session readable")
         control_session = self._control_sessions[sock]
-        buf = sock.recv(65536)
+        try:
+            buf = sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logging.warning("Control session failed: %s", str(e))
+            buf = b""
+
         if not buf:
             self._loop.remove_reader(sock)
             del self._control_sessions[sock]
@@ -474,83 +1728,64 @@ class FixToolAgent(object):
             logging.log(logging.INFO, "Disconnected control session.")
             return
 
-        payload = control_session.append_bytes(buf)
-        while payload is not None:
-            message = json.loads(payload.decode())
-            self.handle_request(control_session, message)
-            payload = None  # FIXME: deal with multiple messages
+        for payload in control_session.append_bytes(buf):
+            try:
+                message = decode_message(payload)
+            except ValueError as e:
+                logging.error("Discarding undecodable control message: %s",
+                              str(e))
+            else:
+                self.handle_request(control_session, message)
 
         return
 
     def handle_request(self, client, message):
-        """Process a received message."""
+        """Process a received message.
+
+        Each message type is handled by the method named 'handle_'
+        followed by the type name."""
 
         message_type = message["type"]
         logging.debug("Dispatching [%s]", message_type)
 
-        if message_type == "client_create":
-            self.handle_client_create(client, message)
-
-        elif message_type == "client_destroy":
-            self.handle_client_destroy(client, message)
-
-        elif message_type == "client_connect":
-            self.handle_client_connect(client, message)
-
-        elif message_type == "client_is_connected_request":
-            self.handle_client_is_connected_request(client, message)
-
-        elif message_type == "client_send":
-            self.handle_client_send(client, message)
-
-        elif message_type == "client_receive_count_request":
-            self.handle_client_receive_count_request(client, message)
-
-        elif message_type == "client_get":
-            self.handle_client_get(client, message)
-
-        elif message_type == "server_create":
-            self.handle_server_create(client, message)
-
-        elif message_type == "server_destroy":
-            self.handle_server_destroy(client, message)
-
-        elif message_type == "server_listen":
-            self.handle_server_listen(client, message)
-
-        elif message_type == "server_unlisten":
-            self.handle_server_unlisten(client, message)
-
-        elif message_type == "server_pending_accept_request":
-            self.handle_server_pending_accept_request(client, message)
-
-        elif message_type == "server_accept":
-            self.handle_server_accept(client, message)
-
-        elif message_type == "server_is_connected_request":
-            self.handle_server_is_connected_request(client, message)
-
-        elif message_type == "server_disconnect":
-            self.handle_server_disconnect(client, message)
-
-        elif message_type == "session_send":
-            self.handle_session_send(client, message)
-
-        elif message_type == "session_receive_count_request":
-            self.handle_session_receive_count_request(client, message)
+        handler = self._handlers.get(message_type)
+        if handler is None:
+            logging.critical("Unknown message type: %s" % message_type)
+            return
 
-        elif message_type == "session_get":
-            self.handle_session_get(client, message)
+        handler(client, message)
+        return
 
-        elif message_type == "shutdown":
-            self.handle_shutdown(client, message)
+    @staticmethod
+    def send_batch(peer, payloads: list):
+        """Send a batch of messages from a control request.
+
+        :param peer: Client or ServerSession used to send the messages.
+        :param payloads: List of FIX messages.
+        :returns: Tuple of overall result, error string, and list of
+        per-message results.
+
+        Empty or missing payloads are skipped, and reported as failed;
+        the remainder are written to the peer together."""
+        results = []
+        buffers = []
+        error = ''
+        for payload in payloads:
+            if payload:
+                buffers.append(payload)
+                results.append(True)
+            else:
+                results.append(False)
+                error = "Empty payload"
 
-        elif message_type == "reset":
-            self.handle_reset(client, message)
+        try:
+            if buffers:
+                peer.send_messages(buffers)
+        except (OSError, ValueError) as e:
+            results = [False] * len(results)
+            error = str(e)
 
-        else:
-            logging.critical("Unknown message type: %s" % message_type)
-        return
+        return all(results), error, results
 
     def handle_shutdown(self, control: ControlSession, message: dict):
         """Handle a 'shutdown' request message.
@@ -571,6 +1806,26 @@ class FixToolAgent(object):
         self.reset()
         return
 
+    def handle_codec_select(self, control: ControlSession, message: dict):
+        """Handle a 'codec_select' request message.
+
+        :param control: Control session.
+        :param message: Control message."""
+        codec = message.get("codec")
+        if codec not in (CODEC_JSON, CODEC_BINARY):
+            response = CodecSelectedMessage(False,
+                                            "Unknown codec '%s'" % codec,
+                                            codec)
+            control.reply(message, response)
+            return
+
+        response = CodecSelectedMessage(True, '', codec)
+        control.reply(message, response)
+
+        control.set_codec(codec)
+        logging.info("codec_select(%s)", codec)
+        return
+
     def handle_client_create(self, control: ControlSession, message: dict):
         """Handler a 'client_create' request message.
 
@@ -581,13 +1836,13 @@ class FixToolAgent(object):
         if name in self._clients:
             response = ClientCreatedMessage(name, False,
                                             "Client %s already exists" % name)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         self._clients[name] = Client(name)
 
         response = ClientCreatedMessage(name, True, '')
-        control.send(response.to_json().encode())
+        control.reply(message, response)
         return
 
     def handle_client_destroy(self, control: ControlSession, message: dict):
@@ -599,34 +1854,70 @@ class FixToolAgent(object):
         client = self._clients.get(name)
         if client is None:
             response = ClientDestroyedMessage(name, False,
-                                              "No such client '$s'" % name)
-            control.send(response.to_json().encode())
+                                              "No such client: %s" % name)
+            control.reply(message, response)
             return
 
         client.destroy()
         del self._clients[name]
 
         response = ClientDestroyedMessage(name, True, '')
-        control.send(response.to_json().encode())
+        control.reply(message, response)
         return
 
     def handle_client_connect(self, control: ControlSession, message: dict):
         """Handle a 'client_connect' message.
 
+        The response is sent once the connection succeeds or fails, so
+        many clients can be connecting at once.
+
         :param control: Control session.
         :param message: Control message."""
         name = message.get("name")
         client = self._clients.get(name)
         if client is None:
             response = ClientConnectedMessage(name, False,
-                                              "No such client '$s'" % name)
-            control.send(response.to_json().encode())
+                                              "No such client: %s" % name)
+            control.reply(message, response)
+            return
+
+        if client.is_connected() or client.is_connecting():
+            response = ClientConnectedMessage(name, False,
+                                              "Client %s already connected"
+                                              % name)
+            control.reply(message, response)
+            return
+
+        def connected(error):
+            if error is None:
+                response = ClientConnectedMessage(name, True, '')
+            else:
+                logging.info("client_connect(%s): %s", name, error)
+                response = ClientConnectedMessage(name, False, error)
+            control.reply(message, response)
             return
 
-        client.connect(message.get("host"), message.get("port"))
+        client.connect(message.get("host"), message.get("port"),
+                       message.get("timeout"), connected)
+        return
+
+    def handle_client_disconnect(self, control: ControlSession,
+                                 message: dict):
+        """Handle a 'client_disconnect' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientDisconnectedMessage(name, False,
+                                                 "No such client: %s" % name)
+            control.reply(message, response)
+            return
 
-        response = ClientConnectedMessage(name, True, '')
-        control.send(response.to_json().encode())
+        client.disconnect()
+        response = ClientDisconnectedMessage(name, True, '')
+        control.reply(message, response)
         return
 
     def handle_client_is_connected_request(self, control: ControlSession,
@@ -641,13 +1932,13 @@ class FixToolAgent(object):
             response = ClientIsConnectedResponse(name, False,
                                                  "No such client %s" % name,
                                                  False)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         is_connected = client.is_connected()
 
         response = ClientIsConnectedResponse(name, True, '', is_connected)
-        control.send(response.to_json().encode())
+        control.reply(message, response)
         return
 
     def handle_client_send(self, control: ControlSession, message: dict):
@@ -660,15 +1951,42 @@ class FixToolAgent(object):
         if client is None:
             response = ClientSentMessage(name, False,
                                          "No such client: %s" % name)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
-        payload = message.get("payload")
-        buffer = base64.b64decode(payload)
-        client.send_message(buffer)
+        try:
+            client.send_message(message.get("payload"))
+        except (OSError, ValueError) as e:
+            response = ClientSentMessage(name, False, str(e))
+            control.reply(message, response)
+            return
 
+        # Hold the response while the client's write buffer is full, so
+        # the controller can't get too far ahead of a slow peer.
         response = ClientSentMessage(name, True, '')
-        control.send(response.to_json().encode())
+        client.when_writable(lambda: control.reply(message, response))
+        return
+
+    def handle_client_send_batch(self, control: ControlSession,
+                                 message: dict):
+        """Handle a 'client_send_batch' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientSentBatchMessage(name, False,
+                                              "No such client: %s" % name,
+                                              [])
+            control.reply(message, response)
+            return
+
+        result, error, results = self.send_batch(client,
+                                                 message.get("payloads", []))
+
+        response = ClientSentBatchMessage(name, result, error, results)
+        client.when_writable(lambda: control.reply(message, response))
         return
 
     def handle_client_receive_count_request(self,
@@ -685,14 +2003,14 @@ class FixToolAgent(object):
             response = ClientReceiveCountResponse(name, False,
                                                   "No such client: %s" % name,
                                                   0)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         count = client.receive_queue_length()
         logging.info("client_receive_count_request(%s): "
                      "%d" % (name, count))
         response = ClientReceiveCountResponse(name, True, '', count)
-        control.send(response.to_json().encode())
+        control.reply(message, response)
         return
 
     def handle_client_get(self, control: ControlSession, message: dict):
@@ -706,70 +2024,367 @@ class FixToolAgent(object):
             response = ClientGotMessage(name, False,
                                         "No such client: %s" % name,
                                         None)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         fix_message = client.get_message()
-        buffer = base64.b64encode(fix_message).decode("ascii")
-        response = ClientGotMessage(name, True, '', buffer)
-        control.send(response.to_json().encode())
+        self.send_client_got(control, message, name, fix_message)
         return
 
-    def handle_server_create(self, client: ControlSession, message: dict):
-        """Process a server_create message.
+    def handle_client_get_wait(self, control: ControlSession, message: dict):
+        """Process a 'client_get_wait' message.
 
-        :param client: Reference to the sending client.
-        :param message: """
+        If the client has no queued messages, the request is parked
+        until one arrives, or the timeout expires, without blocking
+        other control sessions.  If the client's ring has unread
+        messages, it's answered immediately without one, so the
+        controller can read them first.
+
+        :param control: Control session.
+        :param message: Control message."""
         name = message.get("name")
-        if name in self._servers:
-            response = ServerCreatedMessage(name, False,
-                                            "Server '%s' already exists" % name)
-            client.send(response.to_json().encode())
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientGotMessage(name, False,
+                                        "No such client: %s" % name,
+                                        None)
+            control.reply(message, response)
             return
 
-        # Create server.
-        server = Server()
+        timeout = message.get("timeout") or 0
+        fix_message = client.get_message()
+        if fix_message is not None or timeout <= 0 or \
+                not client.is_connected() or client.ring_has_messages():
+            self.send_client_got(control, message, name, fix_message)
+            return
 
-        # Register in table.
-        self._servers[name] = server
+        client.add_waiter(
+            control,
+            lambda m: self.send_client_got(control, message, name, m),
+            timeout)
+        return
 
-        # Send reply.
-        response = ServerCreatedMessage(name, True, '')
-        client.send(response.to_json().encode())
+    @staticmethod
+    def send_client_got(control: ControlSession, message: dict, name: str,
+                        fix_message):
+        """Send a 'client_got' response.
+
+        :param control: Control session.
+        :param message: Control message being answered.
+        :param name: Client name.
+        :param fix_message: Received FIX message, or None."""
+        response = ClientGotMessage(name, True, '', fix_message)
+        control.reply(message, response)
         return
 
-    def handle_server_destroy(self, control: ControlSession, message: dict):
-        """Handle a 'server_destroy' request.
+    def handle_client_wait_for(self, control: ControlSession, message: dict):
+        """Handle 'client_wait_for' request.
+
+        Queued messages are discarded until one matches.  If none does,
+        the request is parked, like 'client_get_wait', until a matching
+        message arrives or the timeout expires.  If the client's ring
+        has unread messages, it's answered immediately, so the
+        controller can check them first.
 
         :param control: Control session.
         :param message: Control message."""
         name = message.get("name")
-        server = self._servers.get(name)
-        if server is None:
-            response = ServerDestroyedMessage(name, False,
-                                              "No such server '$s'" % name)
-            control.send(response.to_json().encode())
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientWaitedMessage(name, False,
+                                           "No such client: %s" % name, None)
+            control.reply(message, response)
             return
 
-        server.destroy()
-        del self._servers[name]
+        try:
+            match = MessageMatch(message.get("match"))
+        except ValueError as e:
+            response = ClientWaitedMessage(name, False, str(e), None)
+            control.reply(message, response)
+            return
 
-        response = ServerDestroyedMessage(name, True, '')
-        control.send(response.to_json().encode())
+        timeout = message.get("timeout") or 0
+        fix_message, skipped = client.take_match(match)
+        if fix_message is not None or timeout <= 0 or \
+                not client.is_connected() or \
+                client.ring_has_messages():
+            response = ClientWaitedMessage(name, True, '', fix_message,
+                                           skipped)
+            control.reply(message, response)
+            return
+
+        def reply(received):
+            response = ClientWaitedMessage(name, True, '', received,
+                                           skipped + waiter.skipped())
+            control.reply(message, response)
+            return
+
+        waiter = client.add_waiter(control, reply, timeout, match)
         return
 
-    def handle_server_listen(self, control: ControlSession, message: dict):
-        """Handle a 'server_listen' message.
+    def handle_client_get_many(self, control: ControlSession,
+                               message: dict):
+        """Process a 'client_get_many' message.
 
         :param control: Control session.
         :param message: Control message."""
-        name = message["name"]
-        server = self._servers.get(name)
-        if server is None:
+        name = message.get("name")
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientGotManyMessage(name, False,
+                                            "No such client: %s" % name,
+                                            [])
+            control.reply(message, response)
+            return
+
+        fix_messages = client.get_messages(message.get("max_count", 0),
+                                           message.get("max_bytes", 0))
+        response = ClientGotManyMessage(name, True, '', fix_messages)
+        control.reply(message, response)
+        return
+
+    def handle_client_subscribe(self, control: ControlSession,
+                                message: dict):
+        """Process a 'client_subscribe' message.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientSubscribedMessage(name, False,
+                                               "No such client: %s" % name)
+            control.reply(message, response)
+            return
+
+        response = ClientSubscribedMessage(name, True, '')
+        control.reply(message, response)
+
+        client.subscribe(control)
+        return
+
+    def handle_client_unsubscribe(self, control: ControlSession,
+                                  message: dict):
+        """Process a 'client_unsubscribe' message.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientUnsubscribedMessage(name, False,
+                                                 "No such client: %s" % name)
+            control.reply(message, response)
+            return
+
+        client.unsubscribe(control)
+
+        response = ClientUnsubscribedMessage(name, True, '')
+        control.reply(message, response)
+        return
+
+    def handle_client_ring_open(self, control: ControlSession,
+                                message: dict):
+        """Process a 'client_ring_open' message.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientRingOpenedMessage(name, False,
+                                               "No such client: %s" % name,
+                                               None)
+            control.reply(message, response)
+            return
+
+        try:
+            path = client.open_ring(message.get("size") or 0)
+        except (OSError, ValueError) as e:
+            logging.warning("client_ring_open(%s): %s", name, str(e))
+            response = ClientRingOpenedMessage(name, False, str(e), None)
+            control.reply(message, response)
+            return
+
+        response = ClientRingOpenedMessage(name, True, '', path)
+        control.reply(message, response)
+        return
+
+    def handle_client_set_queue_limit(self, control: ControlSession,
+                                      message: dict):
+        """Handle 'client_set_queue_limit' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientQueueLimitSetMessage(name, False,
+                                                  "No such client: %s" % name)
+            control.reply(message, response)
+            return
+
+        try:
+            client.set_queue_limit(message.get("max_count") or 0,
+                                   message.get("max_bytes") or 0,
+                                   message.get("policy") or QUEUE_PAUSE)
+        except ValueError as e:
+            logging.warning("client_set_queue_limit(%s): %s", name, str(e))
+            response = ClientQueueLimitSetMessage(name, False, str(e))
+            control.reply(message, response)
+            return
+
+        response = ClientQueueLimitSetMessage(name, True, '')
+        control.reply(message, response)
+        return
+
+    def handle_client_stats_request(self, control: ControlSession,
+                                    message: dict):
+        """Handle 'client_stats_request' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientStatsResponse(name, False,
+                                           "No such client: %s" % name, None)
+            control.reply(message, response)
+            return
+
+        response = ClientStatsResponse(name, True, '', client.stats())
+        control.reply(message, response)
+        return
+
+    def handle_client_set_receive_filter(self, control: ControlSession,
+                                         message: dict):
+        """Handle 'client_set_receive_filter' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientReceiveFilterSetMessage(name, False,
+                                                     "No such client: "
+                                                     "%s" % name)
+            control.reply(message, response)
+            return
+
+        try:
+            client.set_receive_filter(message.get("include"),
+                                      message.get("exclude"))
+        except ValueError as e:
+            logging.warning("client_set_receive_filter(%s): %s", name, str(e))
+            response = ClientReceiveFilterSetMessage(name, False, str(e))
+            control.reply(message, response)
+            return
+
+        response = ClientReceiveFilterSetMessage(name, True, '')
+        control.reply(message, response)
+        return
+
+    def handle_client_set_validate_checksum(self, control: ControlSession,
+                                            message: dict):
+        """Handle 'client_set_validate_checksum' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientValidateChecksumSetMessage(name, False,
+                                                        "No such client: "
+                                                        "%s" % name)
+            control.reply(message, response)
+            return
+
+        client.set_validate_checksum(bool(message.get("validate")))
+        response = ClientValidateChecksumSetMessage(name, True, '')
+        control.reply(message, response)
+        return
+
+    def handle_client_set_session_layer(self, control: ControlSession,
+                                        message: dict):
+        """Handle 'client_set_session_layer' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        client = self._clients.get(name)
+        if client is None:
+            response = ClientSessionLayerSetMessage(name, False,
+                                                    "No such client: "
+                                                    "%s" % name)
+            control.reply(message, response)
+            return
+
+        enabled = bool(message.get("enabled"))
+        interval = message.get("heartbeat_interval") or 0
+        client.set_session_layer(enabled, interval,
+                                 message.get("begin_string"),
+                                 message.get("sender_comp_id"),
+                                 message.get("target_comp_id"),
+                                 bool(message.get("stamp")))
+        response = ClientSessionLayerSetMessage(name, True, '')
+        control.reply(message, response)
+        return
+
+    def handle_server_create(self, client: ControlSession, message: dict):
+        """Process a server_create message.
+
+        :param client: Reference to the sending client.
+        :param message: """
+        name = message.get("name")
+        if name in self._servers:
+            response = ServerCreatedMessage(name, False,
+                                            "Server '%s' already exists" % name)
+            client.reply(message, response)
+            return
+
+        # Create server.
+        server = Server()
+
+        # Register in table.
+        self._servers[name] = server
+
+        # Send reply.
+        response = ServerCreatedMessage(name, True, '')
+        client.reply(message, response)
+        return
+
+    def handle_server_destroy(self, control: ControlSession, message: dict):
+        """Handle a 'server_destroy' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server = self._servers.get(name)
+        if server is None:
+            response = ServerDestroyedMessage(name, False,
+                                              "No such server '$s'" % name)
+            control.reply(message, response)
+            return
+
+        server.destroy()
+        del self._servers[name]
+
+        response = ServerDestroyedMessage(name, True, '')
+        control.reply(message, response)
+        return
+
+    def handle_server_listen(self, control: ControlSession, message: dict):
+        """Handle a 'server_listen' message.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message["name"]
+        server = self._servers.get(name)
+        if server is None:
             logging.warning("server_listen(%s): no such server." % name)
             response = ServerListenedMessage(name, False,
                                              "No such server '%s'" % name)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         port = message.get("port")
@@ -778,13 +2393,13 @@ class FixToolAgent(object):
                             % (name, str(port)))
             response = ServerListenedMessage(name, False,
                                              "Bad or missing port")
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         actual_port = server.listen(port)
 
         response = ServerListenedMessage(name, True, '', actual_port)
-        control.send(response.to_json().encode())
+        control.reply(message, response)
         return
 
     def handle_server_unlisten(self, control: ControlSession, message: dict):
@@ -797,13 +2412,13 @@ class FixToolAgent(object):
         if server is None:
             response = ServerUnlistenedMessage(name, False,
                                                "No such server '%s'" % name)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         server.unlisten()
 
         response = ServerUnlistenedMessage(name, True, '')
-        control.send(response.to_json().encode())
+        control.reply(message, response)
         return
 
     def handle_server_pending_accept_request(self,
@@ -818,12 +2433,12 @@ class FixToolAgent(object):
         if server is None:
             response = ServerPendingAcceptCountResponse(
                 name, False, "No such server '%s'" % name, 0)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         count = server.pending_client_count()
         response = ServerPendingAcceptCountResponse(name, True, '', count)
-        control.send(response.to_json().encode())
+        control.reply(message, response)
         return
 
     def handle_server_accept(self, control: ControlSession, message: dict):
@@ -839,7 +2454,7 @@ class FixToolAgent(object):
         if server is None:
             response = ServerAcceptedMessage(
                 name, False, "No such server '%s'" % name, '')
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         logging.debug("GOT server [%s]" % name)
@@ -847,7 +2462,7 @@ class FixToolAgent(object):
         session = server.accept_client_session(session_name)
         self._server_sessions[session_name] = session
         response = ServerAcceptedMessage(name, True, '', session_name)
-        control.send(response.to_json().encode())
+        control.reply(message, response)
         logging.debug("SENT response")
         return
 
@@ -863,13 +2478,13 @@ class FixToolAgent(object):
             response = ServerIsConnectedResponse(name, False,
                                                  "No such session %s" % name,
                                                  False)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         is_connected = server_session.is_connected()
 
         response = ServerIsConnectedResponse(name, True, '', is_connected)
-        control.send(response.to_json().encode())
+        control.reply(message, response)
         return
 
     def handle_server_disconnect(self, control: ControlSession, message: dict):
@@ -882,13 +2497,13 @@ class FixToolAgent(object):
         if server_session is None:
             response = ServerDisconnectedMessage(name, False,
                                                  "No such session %s" % name)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         server_session.disconnect()
 
         response = ServerDisconnectedMessage(name, True, '')
-        control.send(response.to_json().encode())
+        control.reply(message, response)
         logging.debug("Server session [%s] disconnected." % name)
         return
 
@@ -902,14 +2517,42 @@ class FixToolAgent(object):
         if server_session is None:
             response = SessionSentMessage(name, False,
                                           "No such session %s" % name)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
-        buffer = base64.b64decode(message.get("payload"))
-        server_session.send_message(buffer)
+        try:
+            server_session.send_message(message.get("payload"))
+        except (OSError, ValueError) as e:
+            response = SessionSentMessage(name, False, str(e))
+            control.reply(message, response)
+            return
 
+        # Hold the response while the session's write buffer is full, so
+        # the controller can't get too far ahead of a slow peer.
         response = SessionSentMessage(name, True, '')
-        control.send(response.to_json().encode())
+        server_session.when_writable(lambda: control.reply(message, response))
+        return
+
+    def handle_session_send_batch(self, control: ControlSession,
+                                  message: dict):
+        """Handle 'session_send_batch' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionSentBatchMessage(name, False,
+                                               "No such session %s" % name,
+                                               [])
+            control.reply(message, response)
+            return
+
+        result, error, results = self.send_batch(server_session,
+                                                 message.get("payloads", []))
+
+        response = SessionSentBatchMessage(name, result, error, results)
+        server_session.when_writable(lambda: control.reply(message, response))
         return
 
     def handle_session_receive_count_request(self,
@@ -927,14 +2570,14 @@ class FixToolAgent(object):
             response = SessionReceiveCountResponse(name, False,
                                                    "No such session: "
                                                    "%s" % name, 0)
-            control.send(response.to_json().encode())
+            control.reply(message, response)
             return
 
         count = server_session.receive_queue_length()
         logging.debug("session_receive_count_request(%s): "
                       "%d" % (name, count))
         response = SessionReceiveCountResponse(name, True, '', count)
-        control.send(response.to_json().encode())
+        control.reply(message, response)
         return
 
     def handle_session_get(self, control: ControlSession, message: dict):
@@ -947,16 +2590,740 @@ class FixToolAgent(object):
         if server_session is None:
             response = SessionGotMessage(name, False,
                                          "No such session %s" % name,
-                                         b'')
-            control.send(response.to_json().encode())
+                                         None)
+            control.reply(message, response)
+            return
+
+        fix_message = server_session.get_message()
+        self.send_session_got(control, message, name, fix_message)
+        return
+
+    def handle_session_get_wait(self, control: ControlSession,
+                                message: dict):
+        """Handle 'session_get_wait' request.
+
+        If the session has no queued messages, the request is parked
+        until one arrives, or the timeout expires.  If the session's
+        ring has unread messages, it's answered immediately without
+        one, so the controller can read them first.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionGotMessage(name, False,
+                                         "No such session %s" % name,
+                                         None)
+            control.reply(message, response)
             return
 
+        timeout = message.get("timeout") or 0
         fix_message = server_session.get_message()
-        payload = base64.b64encode(fix_message).decode("ascii")
-        response = SessionGotMessage(name, True, '', payload)
-        control.send(response.to_json().encode())
+        if fix_message is not None or timeout <= 0 or \
+                not server_session.is_connected() or \
+                server_session.ring_has_messages():
+            self.send_session_got(control, message, name, fix_message)
+            return
+
+        server_session.add_waiter(
+            control,
+            lambda m: self.send_session_got(control, message, name, m),
+            timeout)
+        return
+
+    @staticmethod
+    def send_session_got(control: ControlSession, message: dict, name: str,
+                         fix_message):
+        """Send a 'session_got' response.
+
+        :param control: Control session.
+        :param message: Control message being answered.
+        :param name: Session name.
+        :param fix_message: Received FIX message, or None."""
+        response = SessionGotMessage(name, True, '', fix_message)
+        control.reply(message, response)
+        return
+
+    def handle_session_wait_for(self, control: ControlSession, message: dict):
+        """Handle 'session_wait_for' request.
+
+        Queued messages are discarded until one matches.  If none does,
+        the request is parked, like 'session_get_wait', until a matching
+        message arrives or the timeout expires.  If the session's ring
+        has unread messages, it's answered immediately, so the
+        controller can check them first.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionWaitedMessage(name, False,
+                                            "No such session: %s" % name, None)
+            control.reply(message, response)
+            return
+
+        try:
+            match = MessageMatch(message.get("match"))
+        except ValueError as e:
+            response = SessionWaitedMessage(name, False, str(e), None)
+            control.reply(message, response)
+            return
+
+        timeout = message.get("timeout") or 0
+        fix_message, skipped = server_session.take_match(match)
+        if fix_message is not None or timeout <= 0 or \
+                not server_session.is_connected() or \
+                server_session.ring_has_messages():
+            response = SessionWaitedMessage(name, True, '', fix_message,
+                                            skipped)
+            control.reply(message, response)
+            return
+
+        def reply(received):
+            response = SessionWaitedMessage(name, True, '', received,
+                                            skipped + waiter.skipped())
+            control.reply(message, response)
+            return
+
+        waiter = server_session.add_waiter(control, reply, timeout, match)
+        return
+
+    def handle_session_get_many(self, control: ControlSession,
+                                message: dict):
+        """Handle 'session_get_many' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionGotManyMessage(name, False,
+                                             "No such session %s" % name,
+                                             [])
+            control.reply(message, response)
+            return
+
+        fix_messages = server_session.get_messages(
+            message.get("max_count", 0), message.get("max_bytes", 0))
+        response = SessionGotManyMessage(name, True, '', fix_messages)
+        control.reply(message, response)
+        return
+
+    def handle_session_subscribe(self, control: ControlSession,
+                                 message: dict):
+        """Handle 'session_subscribe' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionSubscribedMessage(name, False,
+                                                "No such session %s" % name)
+            control.reply(message, response)
+            return
+
+        response = SessionSubscribedMessage(name, True, '')
+        control.reply(message, response)
+
+        server_session.subscribe(control)
         return
 
+    def handle_session_unsubscribe(self, control: ControlSession,
+                                   message: dict):
+        """Handle 'session_unsubscribe' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionUnsubscribedMessage(name, False,
+                                                  "No such session %s" % name)
+            control.reply(message, response)
+            return
+
+        server_session.unsubscribe(control)
+
+        response = SessionUnsubscribedMessage(name, True, '')
+        control.reply(message, response)
+        return
+
+    def handle_session_ring_open(self, control: ControlSession,
+                                 message: dict):
+        """Handle 'session_ring_open' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionRingOpenedMessage(name, False,
+                                                "No such session %s" % name,
+                                                None)
+            control.reply(message, response)
+            return
+
+        try:
+            path = server_session.open_ring(message.get("size") or 0)
+        except (OSError, ValueError) as e:
+            logging.warning("session_ring_open(%s): %s", name, str(e))
+            response = SessionRingOpenedMessage(name, False, str(e), None)
+            control.reply(message, response)
+            return
+
+        response = SessionRingOpenedMessage(name, True, '', path)
+        control.reply(message, response)
+        return
+
+    def handle_session_set_queue_limit(self, control: ControlSession,
+                                       message: dict):
+        """Handle 'session_set_queue_limit' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionQueueLimitSetMessage(name, False,
+                                                   "No such session: "
+                                                   "%s" % name)
+            control.reply(message, response)
+            return
+
+        max_count = message.get("max_count") or 0
+        max_bytes = message.get("max_bytes") or 0
+        policy = message.get("policy") or QUEUE_PAUSE
+        try:
+            server_session.set_queue_limit(max_count, max_bytes, policy)
+        except ValueError as e:
+            logging.warning("session_set_queue_limit(%s): %s", name, str(e))
+            response = SessionQueueLimitSetMessage(name, False, str(e))
+            control.reply(message, response)
+            return
+
+        response = SessionQueueLimitSetMessage(name, True, '')
+        control.reply(message, response)
+        return
+
+    def handle_session_stats_request(self, control: ControlSession,
+                                     message: dict):
+        """Handle 'session_stats_request' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionStatsResponse(name, False,
+                                            "No such session: %s" % name, None)
+            control.reply(message, response)
+            return
+
+        stats = server_session.stats()
+        response = SessionStatsResponse(name, True, '', stats)
+        control.reply(message, response)
+        return
+
+    def handle_session_set_receive_filter(self, control: ControlSession,
+                                          message: dict):
+        """Handle 'session_set_receive_filter' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionReceiveFilterSetMessage(name, False,
+                                                      "No such session: "
+                                                      "%s" % name)
+            control.reply(message, response)
+            return
+
+        try:
+            server_session.set_receive_filter(message.get("include"),
+                                              message.get("exclude"))
+        except ValueError as e:
+            logging.warning("session_set_receive_filter(%s): %s", name, str(e))
+            response = SessionReceiveFilterSetMessage(name, False, str(e))
+            control.reply(message, response)
+            return
+
+        response = SessionReceiveFilterSetMessage(name, True, '')
+        control.reply(message, response)
+        return
+
+    def handle_session_set_validate_checksum(self, control: ControlSession,
+                                             message: dict):
+        """Handle 'session_set_validate_checksum' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionValidateChecksumSetMessage(
+                name, False, "No such session: %s" % name)
+            control.reply(message, response)
+            return
+
+        server_session.set_validate_checksum(bool(message.get("validate")))
+        response = SessionValidateChecksumSetMessage(name, True, '')
+        control.reply(message, response)
+        return
+
+    def handle_session_set_session_layer(self, control: ControlSession,
+                                         message: dict):
+        """Handle 'session_set_session_layer' request.
+
+        :param control: Control session.
+        :param message: Control message."""
+        name = message.get("name")
+        server_session = self._server_sessions.get(name)
+        if server_session is None:
+            response = SessionSessionLayerSetMessage(name, False,
+                                                     "No such session: "
+                                                     "%s" % name)
+            control.reply(message, response)
+            return
+
+        enabled = bool(message.get("enabled"))
+        interval = message.get("heartbeat_interval") or 0
+        server_session.set_session_layer(enabled, interval,
+                                         message.get("begin_string"),
+                                         message.get("sender_comp_id"),
+                                         message.get("target_comp_id"),
+                                         bool(message.get("stamp")))
+        response = SessionSessionLayerSetMessage(name, True, '')
+        control.reply(message, response)
+        return
+
+
+# Requests sent to every worker agent.
+BROADCAST_TYPES = ("codec_select", "reset", "shutdown")
+
+# Response to a broadcast request.  Every worker sends one, but only
+# the first is passed on.
+BROADCAST_REPLY = "codec_selected"
+
+# Requests naming a server session, rather than a client or server.
+SESSION_TYPES = ("server_is_connected_request", "server_disconnect")
+
+
+def run_worker(path: str, lifeline: socket.socket, event_loop: str):
+    """Run a worker agent, in a forked process.
+
+    :param path: Unix socket path for the worker's control sessions.
+    :param lifeline: Socket connected to the front agent.  The worker
+    reports that it's ready on this socket, and exits when it closes.
+    :param event_loop: Event loop implementation, or None."""
+    try:
+        loop = new_event_loop(event_loop)
+        agent = FixToolAgent(path=path)
+        loop.add_reader(lifeline, agent.stop)
+        lifeline.sendall(b"OK")
+
+        try:
+            agent.run()
+        finally:
+            agent.shutdown()
+    except Exception as e:
+        logging.exception("Worker %s failed: %s", path, e)
+    finally:
+        os._exit(0)
+
+
+class Worker(object):
+    """Worker agent process, owned by a sharded agent."""
+
+    def __init__(self, path: str, event_loop: str, siblings: list):
+        """Start the worker process.
+
+        :param path: Unix socket path for the worker's control sessions.
+        :param event_loop: Event loop implementation, or None.
+        :param siblings: Workers already started.  The new process must
+        not hold their lifelines open.
+
+        Returns once the worker is accepting control sessions."""
+        self._path = path
+
+        self._lifeline, child = socket.socketpair()
+        self._pid = os.fork()
+        if self._pid == 0:
+            self._lifeline.close()
+            for sibling in siblings:
+                sibling.close_lifeline()
+            run_worker(path, child, event_loop)
+
+        child.close()
+        if self._lifeline.recv(2) != b"OK":
+            self.stop()
+            raise OSError("Worker agent failed to start: %s" % path)
+        logging.info("Started worker %d on %s", self._pid, path)
+        return
+
+    def path(self) -> str:
+        """Return the worker's control socket path."""
+        return self._path
+
+    def close_lifeline(self):
+        """Close the lifeline socket, so the worker process exits."""
+        if self._lifeline is not None:
+            self._lifeline.close()
+            self._lifeline = None
+        return
+
+    def stop(self):
+        """Stop the worker process, and wait for it to exit."""
+        if self._pid is not None:
+            self.close_lifeline()
+            os.waitpid(self._pid, 0)
+            self._pid = None
+        return
+
+
+class WorkerLink(object):
+    """Connection from a front control session to one worker agent."""
+
+    def __init__(self, session, path: str):
+        """Constructor.
+
+        :param session: FrontSession that owns this link.
+        :param path: Worker's control socket path."""
+        self._session = session
+        self._decoder = FrameDecoder()
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._socket.setblocking(False)
+        self._writer = SocketWriter(self._socket)
+
+        # Number of broadcast replies received from this worker.
+        self._replies = 0
+
+        asyncio.get_event_loop().add_reader(self._socket, self.readable)
+        return
+
+    def send(self, frame: bytes):
+        """Send a framed request to the worker.
+
+        :param frame: Request, with its frame header.
+
+        What the worker isn't ready to read is buffered."""
+        self._writer.write(frame)
+        return
+
+    def count_reply(self) -> int:
+        """Count a broadcast reply received from the worker.
+
+        :returns: Number of broadcast replies so far, including this
+        one.  The worker answers broadcasts in order, so this is also
+        the number of the broadcast it answers."""
+        self._replies += 1
+        return self._replies
+
+    def replies(self) -> int:
+        """Return the number of broadcast replies received."""
+        return self._replies
+
+    def readable(self):
+        """Relay responses from the worker to the control client.
+
+        If the control client is falling behind, reading stops until
+        it has caught up, so the worker buffers instead."""
+        try:
+            buf = self._socket.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logging.warning("Worker agent connection failed: %s", str(e))
+            buf = b""
+
+        if not buf:
+            logging.warning("Worker agent closed control session")
+            self._session.close()
+            return
+
+        self._decoder.feed(buf)
+        for payload in self._decoder.frames():
+            self._session.forward_response(self, payload)
+
+        if self._session.is_backed_up():
+            asyncio.get_event_loop().remove_reader(self._socket)
+            self._session.when_drained(self.resume_reading)
+        return
+
+    def resume_reading(self):
+        """(Internal) Resume reading once the control client drains."""
+        if self._socket is not None:
+            asyncio.get_event_loop().add_reader(self._socket, self.readable)
+        return
+
+    def close(self):
+        """Close the connection to the worker.
+
+        Requests still buffered get a second to be written."""
+        if self._socket is not None:
+            asyncio.get_event_loop().remove_reader(self._socket)
+            self._writer.flush(1)
+            self._socket.close()
+            self._socket = None
+        return
+
+
+class FrontSession(object):
+    """Control client session of a sharded agent.
+
+    Requests are passed, still encoded, to the worker owning the named
+    client or server, over this session's own connection to each
+    worker.  Responses and forwarded messages are passed back the same
+    way, so a worker sees an ordinary control session."""
+
+    def __init__(self, agent, sock: socket.SocketType, paths: list):
+        """Constructor.
+
+        :param agent: ShardedAgent that accepted this session.
+        :param sock: Accepted socket.
+        :param paths: Control socket paths of the workers."""
+        self._agent = agent
+        self._socket = sock
+        self._socket.setblocking(False)
+        self._writer = SocketWriter(sock)
+        self._decoder = FrameDecoder()
+        self._closed = False
+        self._links = [WorkerLink(self, path) for path in paths]
+
+        # Number of broadcast requests that get a reply, and of those
+        # whose first reply has been passed on.
+        self._broadcasts = 0
+        self._answered = 0
+        return
+
+    def append_bytes(self, buffer: bytes) -> list:
+        """Receive a buffer of bytes from this control client.
+
+        :param buffer: Array of bytes from client.
+        :returns: List of complete message payloads."""
+        self._decoder.feed(buffer)
+        return self._decoder.frames()
+
+    def forward_request(self, payload: bytes):
+        """Pass a request to the worker(s) that should handle it.
+
+        :param payload: Encoded request."""
+        header = decode_header(payload)
+        message_type = header.get("type")
+        frame = encode_frame(payload)
+
+        if message_type not in BROADCAST_TYPES:
+            index = self._agent.route(message_type, header)
+            self._links[index].send(frame)
+            return
+
+        if message_type == "codec_select":
+            self._broadcasts += 1
+
+        for link in self._links:
+            link.send(frame)
+
+        if message_type == "shutdown":
+            self._agent.stop()
+        return
+
+    def forward_response(self, link: WorkerLink, payload: bytes):
+        """Pass a message from a worker to the control client.
+
+        :param link: Connection to the worker that sent the message.
+        :param payload: Encoded message.
+
+        Of the replies to a broadcast, only the first to arrive is
+        passed on.  They're matched up by counting, since the request
+        needn't have had an identifier.  What the control client isn't
+        ready to read is buffered."""
+        if link.replies() < self._broadcasts and \
+                decode_header(payload).get("type") == BROADCAST_REPLY:
+            broadcast = link.count_reply()
+            if broadcast <= self._answered:
+                return
+            self._answered = broadcast
+
+        if not self._closed:
+            self._writer.write(encode_frame(payload))
+        return
+
+    def is_backed_up(self) -> bool:
+        """Return True if the control client is falling behind."""
+        return self._writer.buffered() > CONTROL_BUFFER_HIGH
+
+    def when_drained(self, callback):
+        """Call back once everything sent has been written.
+
+        :param callback: Function taking no arguments."""
+        self._writer.when_drained(callback)
+        return
+
+    def is_closed(self) -> bool:
+        """Return True if this connection has been closed, or failed."""
+        return self._closed or self._writer.has_failed()
+
+    def close(self):
+        """Close this connection, and those to the workers."""
+        if self._closed:
+            return
+
+        for link in self._links:
+            link.close()
+        self._agent.remove_session(self._socket)
+        self._writer.flush(1)
+        self._socket.close()
+        self._closed = True
+        return
+
+
+class ShardedAgent(FixToolAgent):
+    """Agent that shares its clients and servers between processes.
+
+    The sharded agent accepts control sessions, and passes each request
+    to one of several worker agents, chosen by a hash of the client or
+    server name.  Server sessions belong to the worker that owns their
+    server.  Each worker has its own event loop, in its own process, so
+    the load is spread across CPU cores."""
+
+    def __init__(self, workers: int, port=0, bind="127.0.0.1", path=None,
+                 event_loop: str = None):
+        """Constructor.
+
+        :param workers: Number of worker processes.
+        :param port: TCP port number for accepting control sessions.
+        :param bind: IP address for the control sessions port.
+        :param path: If set, accept control sessions on this Unix domain
+        socket path instead of TCP.
+        :param event_loop: Workers' event loop implementation, or None."""
+        self._directory = tempfile.mkdtemp(prefix="fixtool-")
+        self._workers = []
+        self._session_workers = {}
+
+        try:
+            for i in range(workers):
+                worker_path = os.path.join(self._directory, "worker-%d" % i)
+                self._workers.append(Worker(worker_path, event_loop,
+                                            self._workers))
+
+            super().__init__(port, bind, path)
+        except OSError:
+            self.stop_workers()
+            raise
+        return
+
+    def accept(self):
+        """Accept a new control client connection."""
+        sock, addr = self._socket.accept()
+        paths = [worker.path() for worker in self._workers]
+        self._control_sessions[sock] = FrontSession(self, sock, paths)
+        self._loop.add_reader(sock, self.readable, sock)
+
+        logging.info("Accepted sharded control session")
+        return
+
+    def readable(self, sock):
+        """Handle readable event on a control client socket."""
+        session = self._control_sessions[sock]
+        try:
+            buf = sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            logging.warning("Control session failed: %s", str(e))
+            buf = b""
+
+        if not buf:
+            session.close()
+            logging.info("Disconnected control session.")
+            return
+
+        for payload in session.append_bytes(buf):
+            session.forward_request(payload)
+        return
+
+    def remove_session(self, sock):
+        """(Internal) Forget a closed control session.
+
+        :param sock: The session's socket."""
+        if self._control_sessions.pop(sock, None) is not None:
+            self._loop.remove_reader(sock)
+        return
+
+    def route(self, message_type: str, header: dict) -> int:
+        """Choose the worker to handle a request.
+
+        :param message_type: Type of request.
+        :param header: Request fields, other than FIX payloads.
+        :returns: Index of the worker."""
+        name = header.get("name")
+
+        if message_type == "server_accept":
+            index = self.shard(name)
+            self._session_workers[header.get("session_name")] = index
+            return index
+
+        if message_type.startswith("session_") or \
+                message_type in SESSION_TYPES:
+            index = self._session_workers.get(name)
+            if index is not None:
+                return index
+
+        return self.shard(name)
+
+    def shard(self, name: str) -> int:
+        """Return the index of the worker owning a client or server.
+
+        :param name: Client or server name."""
+        if not name:
+            return 0
+        return zlib.crc32(name.encode()) % len(self._workers)
+
+    def shutdown(self):
+        """Clean up for exit, stopping the workers."""
+        for session in list(self._control_sessions.values()):
+            session.close()
+
+        super().shutdown()
+        self.stop_workers()
+        return
+
+    def stop_workers(self):
+        """Stop the worker processes, and remove their directory."""
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+
+        shutil.rmtree(self._directory, ignore_errors=True)
+        return
+
+
+def new_event_loop(name: str = None):
+    """Create and install the agent's event loop.
+
+    :param name: "asyncio", "uvloop", or None to use uvloop if it's
+    installed.
+    :returns: The new event loop.
+
+    Raises ImportError if uvloop is requested but not installed."""
+    if name is None:
+        name = "uvloop" if uvloop is not None else "asyncio"
+
+    if name == "uvloop":
+        if uvloop is None:
+            raise ImportError("uvloop is not installed")
+        loop = uvloop.new_event_loop()
+    else:
+        loop = asyncio.SelectorEventLoop()
+
+    asyncio.set_event_loop(loop)
+    logging.info("Using %s event loop", name)
+    return loop
+
 
 def main():
     """Main function for agent."""
@@ -975,6 +3342,20 @@ def main():
     parser.add_argument("-p", "--port", type=int,
                         default=0,
                         help="TCP port number for control sessions")
+    parser.add_argument("-b", "--bind", type=str,
+                        default="127.0.0.1",
+                        help="IP address for control sessions port")
+    parser.add_argument("-u", "--unix", type=str, metavar="PATH",
+                        help="Unix socket path for control sessions, "
+                             "instead of TCP ('@name' for abstract)")
+    parser.add_argument("--loop", type=str,
+                        choices=EVENT_LOOPS,
+                        help="Event loop implementation (default: uvloop "
+                             "if installed, otherwise asyncio)")
+    parser.add_argument("-w", "--workers", type=int,
+                        default=0,
+                        help="Share clients and servers between this many "
+                             "worker processes (default: no workers)")
     parser.add_argument("action", type=str,
                         choices=("start", "stop", "reset"),
                         help="Action to perform")
@@ -1002,12 +3383,28 @@ def main():
                 os._exit(0)
 
         try:
-            agent = FixToolAgent(args.port)
+            new_event_loop(args.loop)
+        except ImportError as e:
+            print("ERROR " + str(e))
+            sys.exit(1)
+
+        try:
+            if args.workers:
+                agent = ShardedAgent(args.workers, args.port, args.bind,
+                                     args.unix, args.loop)
+            else:
+                agent = FixToolAgent(args.port, args.bind, args.unix)
         except OSError:
-            print("ERROR creating agent on port " + str(args.port))
+            if args.unix:
+                print("ERROR creating agent on " + args.unix)
+            else:
+                print("ERROR creating agent on port " + str(args.port))
             sys.exit(1)
 
-        print("OK " + str(agent.port()))
+        if args.unix:
+            print("OK " + agent.path())
+        else:
+            print("OK " + str(agent.port()))
         sys.stdout.flush()
 
         try:
@@ -1019,32 +3416,38 @@ def main():
         sys.exit(0)
 
     elif args.action == "stop":
-        if not args.port:
-            print("ERROR need port number for 'stop' action.")
+        if not args.port and not args.unix:
+            print("ERROR need port number or socket path for 'stop' action.")
             sys.exit(1)
 
         try:
-            proxy = FixToolProxy('localhost', args.port)
+            proxy = FixToolProxy('localhost', args.port, path=args.unix)
             proxy.shutdown()
             sys.exit(0)
 
-        except ConnectionRefusedError:
-            print("ERROR no agent running on port " + str(args.port))
+        except (ConnectionRefusedError, FileNotFoundError):
+            if args.unix:
+                print("ERROR no agent running on " + args.unix)
+            else:
+                print("ERROR no agent running on port " + str(args.port))
 
         sys.exit(1)
 
     elif args.action == "reset":
-        if not args.port:
-            print("ERROR need port number for 'reset' action.")
+        if not args.port and not args.unix:
+            print("ERROR need port number or socket path for 'reset' action.")
             sys.exit(1)
 
         try:
-            proxy = FixToolProxy('localhost', args.port)
+            proxy = FixToolProxy('localhost', args.port, path=args.unix)
             proxy.reset()
             sys.exit(0)
 
-        except ConnectionRefusedError:
-            print("ERROR no agent running on port " + str(args.port))
+        except (ConnectionRefusedError, FileNotFoundError):
+            if args.unix:
+                print("ERROR no agent running on " + args.unix)
+            else:
+                print("ERROR no agent running on port " + str(args.port))
 
         sys.exit(1)
 
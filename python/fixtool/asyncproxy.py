@@ -0,0 +1,898 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""Asynchronous Python API to fixtool simulator agent.
+
+This has the same functionality as the proxy module, but is built on
+asyncio streams, and its methods are coroutines, so an asyncio-based
+test harness can drive many clients and sessions concurrently."""
+
+import asyncio
+import collections
+import logging
+
+from fixtool.filter import MessageMatch
+from fixtool.framing import FrameDecoder, encode_frame
+from fixtool.message import *
+from fixtool.proxy import match_rules, take_match, take_messages, \
+    unix_socket_address
+
+
+class AsyncClient(object):
+    """Local asynchronous proxy for FIX client in agent."""
+
+    def __init__(self, proxy, name: str):
+        """(Internal) Constructor.
+
+        Use AsyncFixToolProxy.create_client() to create a client."""
+        self._proxy = proxy
+        self._name = name
+        self._host = None
+        self._port = None
+        self._destroyed = False
+        self._subscribed = False
+        self._pushed = collections.deque()
+        self._pushed_event = asyncio.Event()
+        return
+
+    async def destroy(self):
+        """Clean up this client, both locally and in the remote agent."""
+        assert not self._destroyed
+
+        await self._proxy.request(ClientDestroyMessage(self._name))
+
+        self._proxy.remove_client(self._name)
+        self._destroyed = True
+        return
+
+    async def connect(self, host: str, port: int, timeout: float = None):
+        """Connect the client to the specified host and port.
+
+        :param host: String host name or IP address.
+        :param port: Integer TCP port number.
+        :param timeout: Maximum time to wait for the connection, in
+        seconds, or None to wait indefinitely.
+
+        Raises RuntimeError if the connection fails or times out."""
+        assert not self._destroyed
+
+        self._host = host
+        self._port = port
+        request = ClientConnectMessage(self._name, host, port, timeout)
+        await self._proxy.request(request)
+        return
+
+    async def disconnect(self):
+        """Disconnect the client from its server peer.
+
+        A connection attempt still in progress is abandoned."""
+        assert not self._destroyed
+
+        await self._proxy.request(ClientDisconnectMessage(self._name))
+        return
+
+    async def is_connected(self) -> bool:
+        """Returns True if connected to a peer server."""
+        assert not self._destroyed
+
+        request = ClientIsConnectedRequest(self._name)
+        response = await self._proxy.request(request)
+        return response.connected
+
+    async def send(self, message: bytes):
+        """Send a FIX message to the connected server peer.
+
+        :param message: Byte array containing formatted FIX message to send."""
+        assert not self._destroyed
+
+        await self._proxy.request(ClientSendMessage(self._name, message))
+        return
+
+    async def send_many(self, messages: list) -> list:
+        """Send several FIX messages to the connected server peer.
+
+        :param messages: List of byte arrays of formatted FIX messages.
+        :returns: List of per-message boolean results."""
+        assert not self._destroyed
+
+        request = ClientSendBatchMessage(self._name, messages)
+        response = await self._proxy.request(request)
+        return response.results
+
+    async def receive_queue_length(self) -> int:
+        """Return number of messages waiting to be collected from the client."""
+        assert not self._destroyed
+
+        if self._subscribed:
+            return len(self._pushed)
+
+        request = ClientReceiveCountRequest(self._name)
+        response = await self._proxy.request(request)
+        return len(self._pushed) + response.count
+
+    async def receive(self, timeout: float = 0) -> bytes:
+        """Return a FIX message received from the connected server.
+
+        :param timeout: Maximum time to wait for a message, in seconds.
+
+        If there's still no message after the timeout, returns None."""
+        assert not self._destroyed
+
+        if self._pushed:
+            return self._pushed.popleft()
+
+        if self._subscribed:
+            return await self._proxy.await_pushed(self._pushed,
+                                                  self._pushed_event,
+                                                  timeout)
+
+        if timeout > 0:
+            request = ClientGetWaitMessage(self._name, timeout)
+        else:
+            request = ClientGetMessage(self._name)
+        response = await self._proxy.request(request)
+        return response.payload
+
+    async def receive_many(self, max_count: int = 0,
+                           max_bytes: int = 0) -> list:
+        """Return several FIX messages received from the connected server.
+
+        :param max_count: Maximum number of messages to return, or zero
+        for no limit.
+        :param max_bytes: Maximum total size of returned messages, or
+        zero for no limit.
+        :returns: List of messages, which is empty if none are queued."""
+        assert not self._destroyed
+
+        if self._pushed:
+            return take_messages(self._pushed, max_count, max_bytes)
+
+        request = ClientGetManyMessage(self._name, max_count, max_bytes)
+        response = await self._proxy.request(request)
+        return response.payloads
+
+    async def wait_for(self, match, timeout: float = 0,
+                       skipped: bool = False):
+        """Return the next received message that matches.
+
+        :param match: Rule, or list of rules, all of which the message
+        must match; see fixtool.filter.
+        :param timeout: Maximum time to wait, in seconds.
+        :param skipped: If True, return a tuple of the message and the
+        number of messages discarded before it.
+        :returns: Matching message, or None if none arrived in time."""
+        assert not self._destroyed
+
+        rules = match_rules(match)
+        local_match = MessageMatch(rules)
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        count = 0
+        while True:
+            message, discarded = take_match(self.take_pushed, local_match)
+            count += discarded
+            if message is not None or not self._subscribed:
+                break
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            self._pushed_event.clear()
+            try:
+                await asyncio.wait_for(self._pushed_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+        if message is None and not self._subscribed:
+            request = ClientWaitForMessage(self._name, rules,
+                                           max(deadline - loop.time(), 0))
+            response = await self._proxy.request(request)
+            count += response.skipped
+            message = response.payload
+
+        if skipped:
+            return message, count
+        return message
+
+    def take_pushed(self):
+        """(Internal) Return the oldest forwarded message, or None."""
+        if not self._pushed:
+            return None
+        return self._pushed.popleft()
+
+    async def subscribe(self):
+        """Have the agent forward received messages as they arrive."""
+        assert not self._destroyed
+
+        await self._proxy.request(ClientSubscribeMessage(self._name))
+        self._subscribed = True
+        return
+
+    async def unsubscribe(self):
+        """Stop forwarding received messages; queue them in the agent."""
+        assert not self._destroyed
+
+        await self._proxy.request(ClientUnsubscribeMessage(self._name))
+        self._subscribed = False
+        return
+
+    async def set_queue_limit(self, max_count: int = 0, max_bytes: int = 0,
+                              policy: str = QUEUE_PAUSE):
+        """Limit the number and size of messages queued in the agent.
+
+        :param max_count: Maximum number of messages, or zero for no limit.
+        :param max_bytes: Maximum total size of messages, or zero for no
+        limit.
+        :param policy: One of QUEUE_POLICIES."""
+        assert not self._destroyed
+
+        request = ClientSetQueueLimitMessage(self._name, max_count,
+                                             max_bytes, policy)
+        await self._proxy.request(request)
+        return
+
+    async def set_receive_filter(self, include: list = None,
+                                 exclude: list = None):
+        """Have the agent discard unwanted received messages.
+
+        :param include: List of rules, any of which a message must match
+        to be queued.
+        :param exclude: List of rules, none of which a message may match."""
+        assert not self._destroyed
+
+        request = ClientSetReceiveFilterMessage(self._name, include, exclude)
+        await self._proxy.request(request)
+        return
+
+    async def set_validate_checksum(self, validate: bool = True):
+        """Have the agent check the CheckSum of received messages.
+
+        :param validate: True to check, False to stop checking."""
+        assert not self._destroyed
+
+        request = ClientSetValidateChecksumMessage(self._name, validate)
+        await self._proxy.request(request)
+        return
+
+    async def set_session_layer(self, enabled: bool = True,
+                                heartbeat_interval: float = 0,
+                                begin_string: str = None,
+                                sender_comp_id: str = None,
+                                target_comp_id: str = None,
+                                stamp: bool = False):
+        """Have the agent run the FIX session layer for this connection.
+
+        See the proxy module's set_session_layer() for details."""
+        assert not self._destroyed
+
+        request = ClientSetSessionLayerMessage(
+            self._name, enabled, heartbeat_interval, begin_string,
+            sender_comp_id, target_comp_id, stamp)
+        await self._proxy.request(request)
+        return
+
+    async def stats(self) -> dict:
+        """Return the agent's receive queue statistics."""
+        assert not self._destroyed
+
+        response = await self._proxy.request(ClientStatsRequest(self._name))
+        return response.stats
+
+    def deliver(self, payloads: list):
+        """(Internal) Queue messages forwarded by the agent."""
+        self._pushed.extend(payloads)
+        self._pushed_event.set()
+        return
+
+
+class AsyncServer(object):
+    """Local asynchronous proxy for FIX server in agent."""
+
+    def __init__(self, proxy, name: str):
+        """(Internal) Constructor.
+
+        Use AsyncFixToolProxy.create_server() to create a server."""
+        self._proxy = proxy
+        self._name = name
+        self._clients = {}
+        self._ports = []
+        self._destroyed = False
+        return
+
+    async def destroy(self):
+        """Clean up this server, both locally and in remote agent."""
+        assert not self._destroyed
+
+        for session in list(self._clients.values()):
+            await session.destroy()
+        self._clients = {}
+
+        for port in self._ports[:]:
+            await self.stop_listening(port)
+
+        await self._proxy.request(ServerDestroyMessage(self._name))
+
+        self._proxy.remove_server(self._name)
+        self._destroyed = True
+        return
+
+    async def listen(self, port: int = 0) -> int:
+        """Listen for connections on specified port.
+
+        :param port: TCP port number on which to listen for connections.
+        :returns: Listening port number."""
+        assert not self._destroyed
+
+        request = ServerListenMessage(self._name, port)
+        response = await self._proxy.request(request)
+
+        self._ports.append(response.port)
+        return response.port
+
+    async def stop_listening(self, port: int):
+        """Stop listening for connections on specified port.
+
+        :param port: TCP port number on which to stop listening."""
+        assert not self._destroyed
+
+        await self._proxy.request(ServerUnlistenMessage(self._name, port))
+        self._ports.remove(port)
+        return
+
+    async def pending_accept_count(self) -> int:
+        """Return the number of sessions waiting to be accepted."""
+        assert not self._destroyed
+
+        request = ServerPendingAcceptCountRequest(self._name)
+        response = await self._proxy.request(request)
+        return response.count
+
+    async def accept(self, new_name: str):
+        """Accept connection from a client.
+
+        :param new_name: Name by which this session should become known."""
+        assert not self._destroyed
+
+        request = ServerAcceptMessage(self._name, new_name)
+        response = await self._proxy.request(request)
+
+        session = AsyncServerSession(self, self._proxy, response.session_name)
+        self._clients[response.session_name] = session
+        self._proxy.add_session(response.session_name, session)
+        return session
+
+
+class AsyncServerSession(object):
+    """Local asynchronous proxy for server-side session with a client."""
+
+    def __init__(self, server, proxy, name: str):
+        """(Internal) Constructor."""
+        self._server = server
+        self._proxy = proxy
+        self._name = name
+        self._connected = True
+        self._subscribed = False
+        self._pushed = collections.deque()
+        self._pushed_event = asyncio.Event()
+        return
+
+    async def destroy(self):
+        """Clean up this session, both locally and in remote agent."""
+        if self._connected:
+            await self.disconnect()
+        self._pushed.clear()
+        self._proxy.remove_session(self._name)
+        return
+
+    async def is_connected(self) -> bool:
+        """Return True if the session remains connected."""
+        request = ServerIsConnectedRequest(self._name)
+        response = await self._proxy.request(request)
+        return response.connected
+
+    async def disconnect(self):
+        """Disconnect this session from its client."""
+        await self._proxy.request(ServerDisconnectMessage(self._name))
+        self._connected = False
+        return
+
+    async def send(self, message: bytes):
+        """Send a message to the connected FIX client.
+
+        :param message: Byte array of formatted FIX message to send."""
+        assert message
+        assert self._connected
+
+        await self._proxy.request(SessionSendMessage(self._name, message))
+        return
+
+    async def send_many(self, messages: list) -> list:
+        """Send several messages to the connected FIX client.
+
+        :param messages: List of byte arrays of formatted FIX messages.
+        :returns: List of per-message boolean results."""
+        assert self._connected
+
+        request = SessionSendBatchMessage(self._name, messages)
+        response = await self._proxy.request(request)
+        return response.results
+
+    async def receive_queue_length(self) -> int:
+        """Return the number of messages queued from the connected client."""
+        assert self._connected
+
+        if self._subscribed:
+            return len(self._pushed)
+
+        request = SessionReceiveCountRequest(self._name)
+        response = await self._proxy.request(request)
+        return len(self._pushed) + response.count
+
+    async def receive(self, timeout: float = 0) -> bytes:
+        """Return a message received from the connected client.
+
+        :param timeout: Maximum time to wait for a message, in seconds.
+
+        If there's still no message after the timeout, returns None."""
+        assert self._connected
+
+        if self._pushed:
+            return self._pushed.popleft()
+
+        if self._subscribed:
+            return await self._proxy.await_pushed(self._pushed,
+                                                  self._pushed_event,
+                                                  timeout)
+
+        if timeout > 0:
+            request = SessionGetWaitMessage(self._name, timeout)
+        else:
+            request = SessionGetMessage(self._name)
+        response = await self._proxy.request(request)
+        return response.payload
+
+    async def receive_many(self, max_count: int = 0,
+                           max_bytes: int = 0) -> list:
+        """Return several messages received from the connected client.
+
+        :param max_count: Maximum number of messages to return, or zero
+        for no limit.
+        :param max_bytes: Maximum total size of returned messages, or
+        zero for no limit.
+        :returns: List of messages, which is empty if none are queued."""
+        assert self._connected
+
+        if self._pushed:
+            return take_messages(self._pushed, max_count, max_bytes)
+
+        request = SessionGetManyMessage(self._name, max_count, max_bytes)
+        response = await self._proxy.request(request)
+        return response.payloads
+
+    async def wait_for(self, match, timeout: float = 0,
+                       skipped: bool = False):
+        """Return the next received message that matches.
+
+        :param match: Rule, or list of rules, all of which the message
+        must match; see fixtool.filter.
+        :param timeout: Maximum time to wait, in seconds.
+        :param skipped: If True, return a tuple of the message and the
+        number of messages discarded before it.
+        :returns: Matching message, or None if none arrived in time."""
+        assert self._connected
+
+        rules = match_rules(match)
+        local_match = MessageMatch(rules)
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        count = 0
+        while True:
+            message, discarded = take_match(self.take_pushed, local_match)
+            count += discarded
+            if message is not None or not self._subscribed:
+                break
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+
+            self._pushed_event.clear()
+            try:
+                await asyncio.wait_for(self._pushed_event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+        if message is None and not self._subscribed:
+            request = SessionWaitForMessage(self._name, rules,
+                                            max(deadline - loop.time(), 0))
+            response = await self._proxy.request(request)
+            count += response.skipped
+            message = response.payload
+
+        if skipped:
+            return message, count
+        return message
+
+    def take_pushed(self):
+        """(Internal) Return the oldest forwarded message, or None."""
+        if not self._pushed:
+            return None
+        return self._pushed.popleft()
+
+    async def subscribe(self):
+        """Have the agent forward received messages as they arrive."""
+        assert self._connected
+
+        await self._proxy.request(SessionSubscribeMessage(self._name))
+        self._subscribed = True
+        return
+
+    async def unsubscribe(self):
+        """Stop forwarding received messages; queue them in the agent."""
+        assert self._connected
+
+        await self._proxy.request(SessionUnsubscribeMessage(self._name))
+        self._subscribed = False
+        return
+
+    async def set_queue_limit(self, max_count: int = 0, max_bytes: int = 0,
+                              policy: str = QUEUE_PAUSE):
+        """Limit the number and size of messages queued in the agent.
+
+        :param max_count: Maximum number of messages, or zero for no limit.
+        :param max_bytes: Maximum total size of messages, or zero for no
+        limit.
+        :param policy: One of QUEUE_POLICIES."""
+        assert self._connected
+
+        request = SessionSetQueueLimitMessage(self._name, max_count,
+                                              max_bytes, policy)
+        await self._proxy.request(request)
+        return
+
+    async def set_receive_filter(self, include: list = None,
+                                 exclude: list = None):
+        """Have the agent discard unwanted received messages.
+
+        :param include: List of rules, any of which a message must match
+        to be queued.
+        :param exclude: List of rules, none of which a message may match."""
+        assert self._connected
+
+        request = SessionSetReceiveFilterMessage(self._name, include, exclude)
+        await self._proxy.request(request)
+        return
+
+    async def set_validate_checksum(self, validate: bool = True):
+        """Have the agent check the CheckSum of received messages.
+
+        :param validate: True to check, False to stop checking."""
+        assert self._connected
+
+        request = SessionSetValidateChecksumMessage(self._name, validate)
+        await self._proxy.request(request)
+        return
+
+    async def set_session_layer(self, enabled: bool = True,
+                                heartbeat_interval: float = 0,
+                                begin_string: str = None,
+                                sender_comp_id: str = None,
+                                target_comp_id: str = None,
+                                stamp: bool = False):
+        """Have the agent run the FIX session layer for this connection.
+
+        See the proxy module's set_session_layer() for details."""
+        assert self._connected
+
+        request = SessionSetSessionLayerMessage(
+            self._name, enabled, heartbeat_interval, begin_string,
+            sender_comp_id, target_comp_id, stamp)
+        await self._proxy.request(request)
+        return
+
+    async def stats(self) -> dict:
+        """Return the agent's receive queue statistics."""
+        assert self._connected
+
+        response = await self._proxy.request(SessionStatsRequest(self._name))
+        return response.stats
+
+    def deliver(self, payloads: list):
+        """(Internal) Queue messages forwarded by the agent."""
+        self._pushed.extend(payloads)
+        self._pushed_event.set()
+        return
+
+
+class AsyncFixToolProxy(object):
+    """Asynchronous proxy for communication with remote FIX agent.
+
+    Requests from concurrent tasks are sent as they're made, and each
+    task waits only for its own response."""
+
+    def __init__(self, host: str, port: int, codec: str = CODEC_BINARY,
+                 path: str = None):
+        """Constructor.
+
+        :param host: String host name or IP address for agent.
+        :param port: Integer TCP port number for agent.
+        :param codec: Preferred control message encoding.
+        :param path: If set, connect to the agent's Unix domain socket
+        at this path; host and port are ignored.
+
+        The proxy isn't usable until connect() has completed."""
+        self._host = host
+        self._port = port
+        self._path = path
+        self._preferred_codec = codec
+        self._codec = CODEC_JSON
+        self._clients = {}
+        self._servers = {}
+        self._sessions = {}
+
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._next_request_id = 1
+        self._pending = {}
+        self._push_waiters = set()
+        self._closed = None
+        return
+
+    async def connect(self):
+        """Connect to the agent, and negotiate the message encoding."""
+        if self._path:
+            address = unix_socket_address(self._path)
+            self._reader, self._writer = \
+                await asyncio.open_unix_connection(address)
+        else:
+            self._reader, self._writer = \
+                await asyncio.open_connection(self._host, self._port)
+        self._closed = None
+        self._read_task = asyncio.ensure_future(self.read_loop())
+
+        if self._preferred_codec != CODEC_JSON:
+            try:
+                request = CodecSelectMessage(self._preferred_codec)
+                await self.request(request)
+                self._codec = self._preferred_codec
+            except RuntimeError:
+                logging.warning("Agent refused codec '%s'; using %s",
+                                self._preferred_codec, self._codec)
+        return
+
+    async def close(self):
+        """Disconnect from the agent, leaving it running."""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+        if self._read_task is not None:
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+            self._read_task = None
+
+        self.fail_pending("Disconnected from agent")
+        self._clients = {}
+        self._servers = {}
+        self._sessions = {}
+        return
+
+    async def shutdown(self):
+        """Shutdown the associated agent."""
+        await self.send_request(ShutdownMessage())
+        await self.close()
+        return
+
+    async def reset(self):
+        """Reset the associated agent."""
+        await self.send_request(ResetMessage())
+
+        self._clients = {}
+        self._servers = {}
+        self._sessions = {}
+        return
+
+    async def create_client(self, name: str) -> AsyncClient:
+        """Create a FIX client.
+
+        :param name: Unique name for this FIX client."""
+        await self.request(ClientCreateMessage(name))
+
+        client = AsyncClient(self, name)
+        self._clients[name] = client
+        return client
+
+    async def create_server(self, name: str) -> AsyncServer:
+        """Create a FIX server.
+
+        :param name: Unique name for this FIX server."""
+        await self.request(ServerCreateMessage(name))
+
+        server = AsyncServer(self, name)
+        self._servers[name] = server
+        return server
+
+    def write_request(self, message) -> int:
+        """(Internal) Queue message for sending to agent.
+
+        :returns: Identifier of the request, used to match its response."""
+        request_id = self._next_request_id
+        self._next_request_id += 1
+
+        payload = encode_message(message, self._codec, request_id)
+        self._writer.write(encode_frame(payload))
+        return request_id
+
+    async def send_request(self, message):
+        """(Internal) Send message to agent, without awaiting a response."""
+        self.write_request(message)
+        await self._writer.drain()
+        return
+
+    async def request(self, message):
+        """(Internal) Send request to agent, and wait for its response.
+
+        :param message: Control message to send.
+        :returns: Response message.
+
+        Raises RuntimeError if the request failed, and ConnectionError
+        if the agent disconnected."""
+        if self._closed is not None:
+            raise ConnectionError(self._closed)
+
+        request_id = self.write_request(message)
+        future = asyncio.get_event_loop().create_future()
+        self._pending[request_id] = future
+        try:
+            await self._writer.drain()
+            response = await future
+        finally:
+            self._pending.pop(request_id, None)
+
+        if not response.result:
+            raise RuntimeError(response.message)
+        return response
+
+    async def read_loop(self):
+        """(Internal) Read and dispatch messages from the agent."""
+        decoder = FrameDecoder()
+        try:
+            while True:
+                buf = await self._reader.read(65536)
+                if not buf:
+                    raise ConnectionError("Agent disconnected")
+                decoder.feed(buf)
+
+                for payload in decoder.frames():
+                    d = decode_message(payload)
+                    message = message_from_dict(d)
+                    if message is None:
+                        logging.critical("Unknown message type: %s",
+                                         d.get("type"))
+                        continue
+
+                    if self.deliver_push(message):
+                        continue
+
+                    future = self._pending.get(message.id)
+                    if future is not None and not future.done():
+                        future.set_result(message)
+
+        except ConnectionError as e:
+            self.fail_pending(str(e))
+
+        except asyncio.CancelledError:
+            raise
+
+        except Exception as e:
+            logging.exception("Failed reading from agent")
+            self.fail_pending("Failed reading from agent: %s" % str(e))
+        return
+
+    def fail_pending(self, error: str):
+        """(Internal) Fail everything waiting on the agent connection.
+
+        :param error: Description of the failure.
+
+        Pending requests raise ConnectionError, as do any made later,
+        and tasks waiting for forwarded messages are woken."""
+        self._closed = error
+        pending = list(self._pending.values())
+        self._pending = {}
+        for future in pending:
+            if not future.done():
+                future.set_exception(ConnectionError(error))
+
+        for event in self._push_waiters:
+            event.set()
+        return
+
+    async def await_pushed(self, queue: collections.deque,
+                           event: asyncio.Event, timeout: float):
+        """(Internal) Wait for a forwarded message to arrive on a queue.
+
+        :param queue: Local queue of a subscribed client or session.
+        :param event: Event set when messages are added to the queue.
+        :param timeout: Maximum time to wait, in seconds.
+        :returns: First message from queue, or None on timeout.
+
+        Raises ConnectionError if the queue is empty and the agent
+        connection has failed."""
+        event.clear()
+        if not queue and timeout > 0 and self._closed is None:
+            self._push_waiters.add(event)
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            finally:
+                self._push_waiters.discard(event)
+
+        if not queue:
+            if self._closed is not None:
+                raise ConnectionError(self._closed)
+            return None
+        return queue.popleft()
+
+    def deliver_push(self, message) -> bool:
+        """(Internal) Deliver a message forwarded by the agent.
+
+        :param message: Message from the agent.
+        :returns: True if this was a forwarded message."""
+        if message.type == "client_received":
+            target = self._clients.get(message.name)
+        elif message.type == "session_received":
+            target = self._sessions.get(message.name)
+        else:
+            return False
+
+        if target is not None:
+            target.deliver(message.payloads)
+        return True
+
+    def remove_client(self, name):
+        """(Internal) Remove named client from clients table."""
+        del self._clients[name]
+        return
+
+    def remove_server(self, name):
+        """(Internal) Remove named server from servers table."""
+        del self._servers[name]
+        return
+
+    def add_session(self, name, session):
+        """(Internal) Add server session to sessions table."""
+        self._sessions[name] = session
+        return
+
+    def remove_session(self, name):
+        """(Internal) Remove named server session from sessions table."""
+        self._sessions.pop(name, None)
+        return
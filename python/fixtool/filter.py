@@ -0,0 +1,149 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""Match received FIX messages against simple rules.
+
+A rule is a dictionary, so it can be sent in a control message:
+
+* {"msg_type": "0"} matches messages with that MsgType (35) value
+* {"tag": 55, "value": "MSFT"} matches a field with exactly that value
+* {"tag": 58, "regex": "^Reject"} matches a field whose value contains
+  a match for the regular expression
+
+A message matches a rule if any occurrence of the tag does."""
+
+import re
+
+from fixtool.view import FixMessageView
+
+
+class Rule(object):
+    """Compiled message matching rule."""
+
+    __slots__ = ("_tag", "_value", "_regex")
+
+    def __init__(self, rule: dict):
+        """Constructor.
+
+        :param rule: Rule, as described above.
+
+        Raises ValueError if the rule is malformed."""
+        if not isinstance(rule, dict):
+            raise ValueError("Rule must be a dictionary: %r" % (rule,))
+
+        self._value = None
+        self._regex = None
+
+        if "msg_type" in rule:
+            self._tag = 35
+            self._value = str(rule["msg_type"]).encode()
+            return
+
+        try:
+            self._tag = int(rule["tag"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Rule needs 'msg_type' or 'tag': %r" % (rule,))
+
+        if "value" in rule:
+            self._value = str(rule["value"]).encode()
+        elif "regex" in rule:
+            try:
+                self._regex = re.compile(str(rule["regex"]).encode())
+            except re.error as e:
+                raise ValueError("Bad regex in rule: %s" % e)
+        else:
+            raise ValueError("Rule needs 'value' or 'regex': %r" % (rule,))
+        return
+
+    def matches(self, view: FixMessageView) -> bool:
+        """Return True if the message matches this rule.
+
+        :param view: View of the message."""
+        count = view.count(self._tag)
+        for nth in range(1, count + 1):
+            value = view.get(self._tag, nth)
+            if self._regex is not None:
+                if self._regex.search(value):
+                    return True
+            elif value == self._value:
+                return True
+        return False
+
+
+class MessageFilter(object):
+    """Include and exclude rules for received messages.
+
+    A message is accepted if it matches any include rule (or there are
+    none), and doesn't match any exclude rule."""
+
+    def __init__(self, include: list = None, exclude: list = None):
+        """Constructor.
+
+        :param include: List of rules, any of which a message must match.
+        :param exclude: List of rules, none of which a message may match.
+
+        Raises ValueError if a rule is malformed."""
+        self._include = [Rule(rule) for rule in include or ()]
+        self._exclude = [Rule(rule) for rule in exclude or ()]
+        return
+
+    def is_empty(self) -> bool:
+        """Return True if the filter has no rules."""
+        return not self._include and not self._exclude
+
+    def accepts(self, message) -> bool:
+        """Return True if a message passes the filter.
+
+        :param message: Encoded FIX message, as bytes or a memoryview."""
+        view = FixMessageView(message)
+        if self._include and \
+                not any(rule.matches(view) for rule in self._include):
+            return False
+        return not any(rule.matches(view) for rule in self._exclude)
+
+
+class MessageMatch(object):
+    """Conjunction of rules, such as a test step waits for.
+
+    A message matches if it matches every rule; for example, an
+    ExecutionReport for a given order that's filled is
+    [{"msg_type": "8"}, {"tag": 11, "value": order_id},
+    {"tag": 39, "value": "2"}]."""
+
+    def __init__(self, rules: list):
+        """Constructor.
+
+        :param rules: List of rules.
+
+        Raises ValueError if a rule is malformed."""
+        self._rules = [Rule(rule) for rule in rules or ()]
+        return
+
+    def accepts(self, message) -> bool:
+        """Return True if a message matches every rule.
+
+        :param message: Encoded FIX message, as bytes or a memoryview."""
+        view = FixMessageView(message)
+        return all(rule.matches(view) for rule in self._rules)
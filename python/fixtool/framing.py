@@ -0,0 +1,111 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""Control session message framing.
+
+Each control message is sent as a 4 byte big-endian length, followed
+by that many bytes of payload.  A stream read can return any number
+of frames, including partial ones at either end."""
+
+import struct
+
+
+FRAME_HEADER = struct.Struct(">L")
+
+
+def encode_frame(payload: bytes) -> bytes:
+    """Prefix a payload with its frame header.
+
+    :param payload: Encoded control message.
+    :returns: Byte array ready to send."""
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+class FrameDecoder(object):
+    """Split a byte stream into frame payloads.
+
+    Received data is appended to a single buffer, and complete frames
+    are sliced out from a moving offset, so data is copied once when
+    it's received and once more when its frame is returned.  Consumed
+    space is reclaimed once it's at least half of the buffer, which
+    keeps the cost linear however the data is split across reads."""
+
+    def __init__(self):
+        """Constructor."""
+        self._buffer = bytearray()
+        self._offset = 0
+        return
+
+    def feed(self, data: bytes):
+        """Append received data.
+
+        :param data: Bytes read from the stream."""
+        if self._offset and self._offset * 2 >= len(self._buffer):
+            del self._buffer[:self._offset]
+            self._offset = 0
+
+        self._buffer += data
+        return
+
+    def next_frame(self):
+        """Remove and return the next complete frame's payload.
+
+        :returns: Payload bytes, or None if no complete frame is
+        buffered."""
+        available = len(self._buffer) - self._offset
+        if available < FRAME_HEADER.size:
+            return None
+
+        length = FRAME_HEADER.unpack_from(self._buffer, self._offset)[0]
+        if available < FRAME_HEADER.size + length:
+            return None
+
+        start = self._offset + FRAME_HEADER.size
+        end = start + length
+        with memoryview(self._buffer) as view:
+            payload = bytes(view[start:end])
+
+        if end == len(self._buffer):
+            self._buffer.clear()
+            self._offset = 0
+        else:
+            self._offset = end
+        return payload
+
+    def frames(self) -> list:
+        """Remove and return all complete frames' payloads.
+
+        :returns: List of payload bytes, which is empty if no complete
+        frame is buffered."""
+        payloads = []
+        payload = self.next_frame()
+        while payload is not None:
+            payloads.append(payload)
+            payload = self.next_frame()
+        return payloads
+
+    def pending(self) -> int:
+        """Return the number of buffered bytes not yet returned."""
+        return len(self._buffer) - self._offset
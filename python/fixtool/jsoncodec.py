@@ -0,0 +1,110 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""JSON encoding for control messages.
+
+The fastest available JSON library is used: orjson, then ujson, and
+finally the standard library's json module.  They all produce the same
+JSON for control messages, so the agent and proxies needn't agree on
+which one they use."""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+# Supported library names, in order of preference.
+LIBRARIES = ("orjson", "ujson", "json")
+
+# Name of the library in use.
+library = None
+
+# Encode an object as UTF-8 JSON bytes.
+dumps = None
+
+# Decode UTF-8 JSON bytes (or a memoryview of them) to an object.
+loads = None
+
+
+def _ujson_dumps(obj) -> bytes:
+    return ujson.dumps(obj, ensure_ascii=False).encode()
+
+
+def _ujson_loads(buf):
+    return ujson.loads(bytes(buf))
+
+
+def _json_dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(',', ':')).encode()
+
+
+def _json_loads(buf):
+    return json.loads(bytes(buf))
+
+
+def available() -> list:
+    """Return the names of the installed JSON libraries."""
+    names = []
+    if orjson is not None:
+        names.append("orjson")
+    if ujson is not None:
+        names.append("ujson")
+    names.append("json")
+    return names
+
+
+def use(name: str = None):
+    """Select the JSON library.
+
+    :param name: One of LIBRARIES, or None for the fastest installed.
+
+    Raises ValueError if the library isn't installed."""
+    global library, dumps, loads
+
+    if name is None:
+        name = available()[0]
+    if name not in available():
+        raise ValueError("JSON library not available: %s" % name)
+
+    if name == "orjson":
+        dumps, loads = orjson.dumps, orjson.loads
+    elif name == "ujson":
+        dumps, loads = _ujson_dumps, _ujson_loads
+    else:
+        dumps, loads = _json_dumps, _json_loads
+
+    library = name
+    return
+
+
+use()
@@ -24,9 +24,28 @@
 ##################################################################
 
 import base64
-import json
-
-__all__ = ["ShutdownMessage",
+import inspect
+import struct
+
+from fixtool import jsoncodec
+
+__all__ = ["CODEC_JSON",
+           "CODEC_BINARY",
+           "QUEUE_PAUSE",
+           "QUEUE_DROP_OLDEST",
+           "QUEUE_DROP_NEWEST",
+           "QUEUE_SPILL",
+           "QUEUE_POLICIES",
+           "MESSAGE_TYPES",
+           "encode_message",
+           "decode_message",
+           "decode_header",
+           "message_type",
+           "message_from_dict",
+           "ControlMessage",
+           "CodecSelectMessage",
+           "CodecSelectedMessage",
+           "ShutdownMessage",
            "ResetMessage",
            "ClientCreateMessage",
            "ClientCreatedMessage",
@@ -34,14 +53,40 @@ __all__ = ["ShutdownMessage",
            "ClientDestroyedMessage",
            "ClientConnectMessage",
            "ClientConnectedMessage",
+           "ClientDisconnectMessage",
+           "ClientDisconnectedMessage",
            "ClientIsConnectedRequest",
            "ClientIsConnectedResponse",
            "ClientSendMessage",
            "ClientSentMessage",
+           "ClientSendBatchMessage",
+           "ClientSentBatchMessage",
            "ClientReceiveCountRequest",
            "ClientReceiveCountResponse",
            "ClientGetMessage",
            "ClientGotMessage",
+           "ClientGetManyMessage",
+           "ClientGotManyMessage",
+           "ClientGetWaitMessage",
+           "ClientSubscribeMessage",
+           "ClientSubscribedMessage",
+           "ClientUnsubscribeMessage",
+           "ClientUnsubscribedMessage",
+           "ClientReceivedMessage",
+           "ClientRingOpenMessage",
+           "ClientRingOpenedMessage",
+           "ClientSetQueueLimitMessage",
+           "ClientQueueLimitSetMessage",
+           "ClientStatsRequest",
+           "ClientStatsResponse",
+           "ClientSetReceiveFilterMessage",
+           "ClientReceiveFilterSetMessage",
+           "ClientSetValidateChecksumMessage",
+           "ClientValidateChecksumSetMessage",
+           "ClientWaitForMessage",
+           "ClientWaitedMessage",
+           "ClientSetSessionLayerMessage",
+           "ClientSessionLayerSetMessage",
            "ServerCreateMessage",
            "ServerCreatedMessage",
            "ServerListenMessage",
@@ -60,772 +105,1206 @@ __all__ = ["ShutdownMessage",
            "ServerDestroyedMessage",
            "SessionSendMessage",
            "SessionSentMessage",
+           "SessionSendBatchMessage",
+           "SessionSentBatchMessage",
            "SessionReceiveCountRequest",
            "SessionReceiveCountResponse",
            "SessionGetMessage",
-           "SessionGotMessage"]
+           "SessionGotMessage",
+           "SessionGetManyMessage",
+           "SessionGotManyMessage",
+           "SessionGetWaitMessage",
+           "SessionSubscribeMessage",
+           "SessionSubscribedMessage",
+           "SessionUnsubscribeMessage",
+           "SessionUnsubscribedMessage",
+           "SessionReceivedMessage",
+           "SessionRingOpenMessage",
+           "SessionRingOpenedMessage",
+           "SessionSetQueueLimitMessage",
+           "SessionQueueLimitSetMessage",
+           "SessionStatsRequest",
+           "SessionStatsResponse",
+           "SessionSetReceiveFilterMessage",
+           "SessionReceiveFilterSetMessage",
+           "SessionSetValidateChecksumMessage",
+           "SessionValidateChecksumSetMessage",
+           "SessionWaitForMessage",
+           "SessionWaitedMessage",
+           "SessionSetSessionLayerMessage",
+           "SessionSessionLayerSetMessage"]
+
+
+# Control message encodings.
+CODEC_JSON = "json"
+CODEC_BINARY = "binary"
+
+# First byte of a binary-encoded message.  A JSON-encoded message
+# always starts with '{', so the two can be told apart.
+BINARY_MARKER = 0
+
+# Receive queue overflow policies.  When a queue reaches its limit, the
+# agent stops reading from the socket (so TCP flow control slows the
+# peer), discards the oldest queued message, discards the new message,
+# or queues further messages in a temporary file.
+QUEUE_PAUSE = "pause"
+QUEUE_DROP_OLDEST = "drop_oldest"
+QUEUE_DROP_NEWEST = "drop_newest"
+QUEUE_SPILL = "spill"
+
+QUEUE_POLICIES = (QUEUE_PAUSE, QUEUE_DROP_OLDEST, QUEUE_DROP_NEWEST,
+                  QUEUE_SPILL)
+
+
+def encode_message(message, codec: str = CODEC_JSON,
+                   request_id: int = None) -> bytes:
+    """Encode a control message, ready for framing.
+
+    :param message: Control message instance.
+    :param codec: CODEC_JSON or CODEC_BINARY.
+    :param request_id: Optional identifier, added as the 'id' field.
+
+    A binary-encoded message is a marker byte, a 4 byte big-endian
+    header length, a JSON header, and then the raw FIX payloads.  The
+    header has the message's fields, with the 'payload' or 'payloads'
+    field replaced by the byte length(s) of the FIX message(s) that
+    follow it, so they're neither BASE64-encoded nor escaped."""
+    header = message.to_dict()
+    if request_id is not None:
+        header["id"] = request_id
+
+    payload = header.get("payload")
+    payloads = header.get("payloads")
+
+    if codec != CODEC_BINARY:
+        if payload is not None:
+            header["payload"] = base64.b64encode(payload).decode()
+        if payloads is not None:
+            header["payloads"] = [base64.b64encode(p).decode()
+                                  for p in payloads]
+        return jsoncodec.dumps(header)
+
+    chunks = []
+    if payload is not None:
+        header["payload"] = len(payload)
+        chunks.append(payload)
+
+    if payloads is not None:
+        header["payloads"] = [len(p) for p in payloads]
+        chunks.extend(payloads)
+
+    header_buf = jsoncodec.dumps(header)
+    prefix = struct.pack(">BL", BINARY_MARKER, len(header_buf))
+    return b''.join([prefix, header_buf] + chunks)
+
+
+def decode_message(buf: bytes) -> dict:
+    """Decode a control message, in either encoding, to a dictionary.
+
+    :param buf: Encoded message, without its framing header.
+
+    FIX payloads in the returned dictionary are always byte arrays."""
+    if buf[0] != BINARY_MARKER:
+        d = jsoncodec.loads(buf)
+        payload = d.get("payload")
+        if payload is not None:
+            d["payload"] = base64.b64decode(payload)
+
+        payloads = d.get("payloads")
+        if payloads is not None:
+            d["payloads"] = [base64.b64decode(p) for p in payloads]
+        return d
+
+    _, header_length = struct.unpack_from(">BL", buf)
+    offset = 5 + header_length
+    d = jsoncodec.loads(buf[5:offset])
+
+    length = d.get("payload")
+    if length is not None:
+        d["payload"] = bytes(buf[offset:offset + length])
+        offset += length
 
+    lengths = d.get("payloads")
+    if lengths is not None:
+        payloads = []
+        for length in lengths:
+            payloads.append(bytes(buf[offset:offset + length]))
+            offset += length
+        d["payloads"] = payloads
+    return d
 
-class ShutdownMessage:
-    """Request agent shutdown."""
 
-    def __init__(self):
-        """Constructor."""
-        self.type = "shutdown"
-        return
+def decode_header(buf: bytes) -> dict:
+    """Decode a control message's fields, other than its FIX payloads.
+
+    :param buf: Encoded message, without its framing header.
+
+    This is cheaper than decode_message() for binary-encoded messages,
+    and for JSON messages, leaves the payloads BASE64-encoded."""
+    if buf[0] != BINARY_MARKER:
+        return jsoncodec.loads(buf)
+
+    _, header_length = struct.unpack_from(">BL", buf)
+    return jsoncodec.loads(buf[5:5 + header_length])
+
+
+# Control message classes, by their 'type' field.
+MESSAGE_TYPES = {}
+
+
+def message_type(name: str):
+    """Class decorator, registering a control message class.
+
+    :param name: Value of the message's 'type' field.
+
+    The message's fields are its constructor's parameters, which must
+    be saved as attributes with the same names.  A field missing from
+    a received message gets the parameter's default value, or None."""
+    def register(cls):
+        parameters = list(inspect.signature(cls.__init__).parameters.values())
+        cls.type = name
+        cls.fields = tuple(p.name for p in parameters[1:])
+        cls.defaults = tuple(None if p.default is p.empty else p.default
+                             for p in parameters[1:])
+
+        assert name not in MESSAGE_TYPES, name
+        MESSAGE_TYPES[name] = cls
+        return cls
+
+    return register
+
+
+def message_from_dict(d: dict):
+    """Create a message instance from a decoded message.
+
+    :param d: Dictionary from decode_message().
+    :returns: Message instance, or None if the type isn't registered.
+
+    The message's request identifier, if any, is kept as its 'id'."""
+    cls = MESSAGE_TYPES.get(d.get("type"))
+    if cls is None:
+        return None
+
+    message = cls.from_dict(d)
+    message.id = d.get("id")
+    return message
+
+
+class ControlMessage(object):
+    """Base class for control messages.
+
+    Subclasses are registered using the message_type decorator, which
+    records their fields for the methods here."""
+
+    type = None
+    fields = ()
+    defaults = ()
+
+    def to_dict(self) -> dict:
+        """Return the message's fields, as a dictionary."""
+        d = {"type": self.type}
+        for field in self.fields:
+            d[field] = getattr(self, field)
+        return d
 
-    def to_json(self):
+    def to_json(self) -> str:
         """Encode as JSON."""
-        return json.dumps({"type": self.type})
+        return encode_message(self, CODEC_JSON).decode()
 
-    @staticmethod
-    def from_dict(d):
+    @classmethod
+    def from_dict(cls, d: dict):
         """Create from dictionary.
 
         :param d: Dictionary from which to create message."""
-        assert d.get("type") == "shutdown"
-        return ShutdownMessage()
+        return cls(*[d.get(field, default)
+                     for field, default in zip(cls.fields, cls.defaults)])
 
 
-class ResetMessage:
-    """Request agent reset."""
+@message_type("codec_select")
+class CodecSelectMessage(ControlMessage):
+    """Request change of encoding for subsequent control messages."""
+
+    def __init__(self, codec: str):
+        """Constructor.
+
+        :param codec: CODEC_JSON or CODEC_BINARY."""
+        self.codec = codec
+        return
+
+
+@message_type("codec_selected")
+class CodecSelectedMessage(ControlMessage):
+    """Acknowledge change of encoding for control messages.
+
+    This response is sent using the previous encoding; the new one is
+    used from the next message."""
+
+    def __init__(self, result: bool, message: str, codec: str):
+        """Constructor."""
+        self.result = result
+        self.message = message
+        self.codec = codec
+        return
+
+
+@message_type("shutdown")
+class ShutdownMessage(ControlMessage):
+    """Request agent shutdown."""
 
     def __init__(self):
         """Constructor."""
-        self.type = "reset"
         return
 
-    def to_json(self):
-        """Encode as JSON."""
-        return json.dumps({"type": self.type})
 
-    @staticmethod
-    def from_dict(d):
-        """Create from dictionary.
+@message_type("reset")
+class ResetMessage(ControlMessage):
+    """Request agent reset."""
 
-        :param d: Dictionary from which to create message."""
-        assert d.get("type") == "reset"
-        return ResetMessage()
+    def __init__(self):
+        """Constructor."""
+        return
 
 
-class ClientCreateMessage:
+@message_type("client_create")
+class ClientCreateMessage(ControlMessage):
     def __init__(self, name: str):
-        self.type = "client_create"
         self.name = name
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        """Create from dictionary.
+@message_type("client_created")
+class ClientCreatedMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
+        self.name = name
+        self.result = result
+        self.message = message
+        return
 
-        :param d: Dictionary from which to create message."""
-        return ClientCreateMessage(d.get("name"))
 
+@message_type("client_destroy")
+class ClientDestroyMessage(ControlMessage):
+    def __init__(self, name: str):
+        self.name = name
+        return
 
-class ClientCreatedMessage:
+
+@message_type("client_destroyed")
+class ClientDestroyedMessage(ControlMessage):
     def __init__(self, name: str, result: bool, message: str):
-        self.type = "client_created"
         self.name = name
         self.result = result
         self.message = message
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientCreatedMessage(d.get("name"),
-                                    d.get("result"),
-                                    d.get("message"))
+@message_type("client_connect")
+class ClientConnectMessage(ControlMessage):
+    def __init__(self, name: str, host: str, port: int,
+                 timeout: float = None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        return
 
 
-class ClientDestroyMessage:
-    def __init__(self, name: str):
-        self.type = "client_destroy"
+@message_type("client_connected")
+class ClientConnectedMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
         self.name = name
+        self.result = result
+        self.message = message
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientDestroyMessage(d.get("name"))
+@message_type("client_disconnect")
+class ClientDisconnectMessage(ControlMessage):
+    """Close client's connection, or abandon its connection attempt.
+
+    An abandoned attempt's 'client_connected' response reports that it
+    was cancelled."""
 
+    def __init__(self, name: str):
+        self.name = name
+        return
 
-class ClientDestroyedMessage:
+
+@message_type("client_disconnected")
+class ClientDisconnectedMessage(ControlMessage):
     def __init__(self, name: str, result: bool, message: str):
-        self.type = "client_destroyed"
         self.name = name
         self.result = result
         self.message = message
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientDestroyedMessage(d.get("name"),
-                                      d.get("result"),
-                                      d.get("message"))
+@message_type("client_is_connected_request")
+class ClientIsConnectedRequest(ControlMessage):
+    def __init__(self, name: str):
+        self.name = name
+        return
 
 
-class ClientConnectMessage:
-    def __init__(self, name: str, host: str, port: int):
-        self.type = "client_connect"
+@message_type("client_is_connected_response")
+class ClientIsConnectedResponse(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str, connected: bool):
         self.name = name
-        self.host = host
-        self.port = port
+        self.result = result
+        self.message = message
+        self.connected = connected
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "host": self.host,
-                           "port": self.port})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientConnectMessage(d.get("name"),
-                                    d.get("host"),
-                                    d.get("port"))
+@message_type("client_send")
+class ClientSendMessage(ControlMessage):
+    """Request message be sent from client to server."""
+
+    def __init__(self, name: str, payload: bytes):
+        self.name = name
+        self.payload = payload
+        return
 
 
-class ClientConnectedMessage:
+@message_type("client_sent")
+class ClientSentMessage(ControlMessage):
+    """Acknowledge message was sent from client to server."""
+
     def __init__(self, name: str, result: bool, message: str):
-        self.type = "client_created"
         self.name = name
         self.result = result
         self.message = message
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message})
-
-    @staticmethod
-    def from_dict(d):
-        return ClientCreatedMessage(d.get("name"),
-                                    d.get("result"),
-                                    d.get("message"))
 
+@message_type("client_send_batch")
+class ClientSendBatchMessage(ControlMessage):
+    """Request several messages be sent from client to server."""
 
-class ClientIsConnectedRequest:
-    def __init__(self, name: str):
-        self.type = "client_is_connected_request"
+    def __init__(self, name: str, payloads: list):
         self.name = name
+        self.payloads = payloads
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientIsConnectedRequest(d.get("name"))
+@message_type("client_sent_batch")
+class ClientSentBatchMessage(ControlMessage):
+    """Acknowledge batch of messages sent from client to server.
 
+    The 'results' list has a boolean status for each message in the
+    batch, in the order they were requested."""
 
-class ClientIsConnectedResponse:
-    def __init__(self, name: str, result: bool, message: str, connected: bool):
-        self.type = "client_is_connected_response"
+    def __init__(self, name: str, result: bool, message: str,
+                 results: list):
         self.name = name
         self.result = result
         self.message = message
-        self.connected = connected
+        self.results = results
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message,
-                           "connected": self.connected})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientIsConnectedResponse(d.get("name"),
-                                         d.get("result"),
-                                         d.get("message"),
-                                         d.get("connected"))
+@message_type("client_receive_count_request")
+class ClientReceiveCountRequest(ControlMessage):
+    """Request count of client's received messages."""
+
+    def __init__(self, name: str):
+        self.name = name
+        return
+
 
+@message_type("client_receive_count_response")
+class ClientReceiveCountResponse(ControlMessage):
+    """Return count of client's received messages."""
+
+    def __init__(self, name: str, result: bool, message: str, count: int):
+        self.name = name
+        self.result = result
+        self.message = message
+        self.count = count
+        return
 
-class ClientSendMessage:
-    """Request message be sent from client to server."""
 
-    def __init__(self, name: str, payload: str):
-        self.type = "client_send"
+@message_type("client_get")
+class ClientGetMessage(ControlMessage):
+    def __init__(self, name: str):
+        self.name = name
+        return
+
+
+@message_type("client_got")
+class ClientGotMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str,
+                 payload: bytes):
         self.name = name
+        self.result = result
+        self.message = message
         self.payload = payload
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "payload": self.payload})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientSendMessage(d.get("name"),
-                                 d.get("payload"))
+@message_type("client_get_wait")
+class ClientGetWaitMessage(ControlMessage):
+    """Request message received by client, waiting if none is queued.
 
+    The timeout is in seconds, and the response is a 'client_got'
+    message, with a null payload if the timeout expired."""
 
-class ClientSentMessage:
-    """Acknowledge message was sent from client to server."""
+    def __init__(self, name: str, timeout: float):
+        self.name = name
+        self.timeout = timeout
+        return
 
-    def __init__(self, name: str, result: bool, message: str):
-        self.type = "client_sent"
+
+@message_type("client_get_many")
+class ClientGetManyMessage(ControlMessage):
+    """Request several messages received by client.
+
+    A limit of zero means no limit."""
+
+    def __init__(self, name: str, max_count: int = 0,
+                 max_bytes: int = 0):
+        self.name = name
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        return
+
+
+@message_type("client_got_many")
+class ClientGotManyMessage(ControlMessage):
+    """Deliver messages received by client to controller."""
+
+    def __init__(self, name: str, result: bool, message: str,
+                 payloads: list):
         self.name = name
         self.result = result
         self.message = message
+        self.payloads = payloads
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientSentMessage(d.get("name"),
-                                 d.get("result"),
-                                 d.get("message"))
+@message_type("client_subscribe")
+class ClientSubscribeMessage(ControlMessage):
+    """Request messages received by client be forwarded to controller."""
 
+    def __init__(self, name: str):
+        self.name = name
+        return
 
-class ClientReceiveCountRequest:
-    """Request count of client's received messages."""
 
-    def __init__(self, name: str):
-        self.type = "client_receive_count_request"
+@message_type("client_subscribed")
+class ClientSubscribedMessage(ControlMessage):
+    """Acknowledge subscription to messages received by client."""
+
+    def __init__(self, name: str, result: bool, message: str):
         self.name = name
+        self.result = result
+        self.message = message
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientReceiveCountRequest(d.get("name"))
+@message_type("client_unsubscribe")
+class ClientUnsubscribeMessage(ControlMessage):
+    """Request messages received by client be queued again."""
 
+    def __init__(self, name: str):
+        self.name = name
+        return
 
-class ClientReceiveCountResponse:
-    """Return count of client's received messages."""
 
-    def __init__(self, name: str, result: bool, message: str, count: int):
-        self.type = "client_receive_count_response"
+@message_type("client_unsubscribed")
+class ClientUnsubscribedMessage(ControlMessage):
+    """Acknowledge end of subscription to messages received by client."""
+
+    def __init__(self, name: str, result: bool, message: str):
         self.name = name
         self.result = result
         self.message = message
-        self.count = count
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message,
-                           "count": self.count})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientReceiveCountResponse(d.get("name"),
-                                          d.get("result"),
-                                          d.get("message"),
-                                          d.get("count"))
+@message_type("client_received")
+class ClientReceivedMessage(ControlMessage):
+    """Forward messages received by client to subscribed controller.
 
+    This message is sent by the agent without a matching request."""
 
-class ClientGetMessage:
-    def __init__(self, name: str):
-        self.type = "client_get"
+    def __init__(self, name: str, payloads: list):
         self.name = name
+        self.payloads = payloads
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientGetMessage(d.get("name"))
+@message_type("client_ring_open")
+class ClientRingOpenMessage(ControlMessage):
+    """Request a shared memory ring for messages received by client.
 
+    Messages are written to the ring by the agent, and read directly
+    by a controller on the same host."""
 
-class ClientGotMessage:
-    def __init__(self, name: str, result: bool, message: str,
-                 payload):
-        self.type = "client_got"
+    def __init__(self, name: str, size: int = 0):
+        self.name = name
+        self.size = size
+        return
+
+
+@message_type("client_ring_opened")
+class ClientRingOpenedMessage(ControlMessage):
+    """Report the path of a client's shared memory ring."""
+
+    def __init__(self, name: str, result: bool, message: str, path: str):
         self.name = name
         self.result = result
         self.message = message
-        self.payload = payload
+        self.path = path
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message,
-                           "payload": self.payload})
 
-    @staticmethod
-    def from_dict(d):
-        return ClientGotMessage(d.get("name"),
-                                d.get("result"),
-                                d.get("message"),
-                                d.get("payload"))
+@message_type("client_set_queue_limit")
+class ClientSetQueueLimitMessage(ControlMessage):
+    """Limit the size of client's received message queue.
+
+    A limit of zero means no limit.  The policy is one of
+    QUEUE_POLICIES, and applies once either limit is reached."""
+
+    def __init__(self, name: str, max_count: int = 0, max_bytes: int = 0,
+                 policy: str = QUEUE_PAUSE):
+        self.name = name
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.policy = policy
+        return
+
+
+@message_type("client_queue_limit_set")
+class ClientQueueLimitSetMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
+        self.name = name
+        self.result = result
+        self.message = message
+        return
+
 
+@message_type("client_stats_request")
+class ClientStatsRequest(ControlMessage):
+    """Request client's receive queue statistics."""
 
-class ServerCreateMessage:
     def __init__(self, name: str):
-        self.type = "server_create"
         self.name = name
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerCreateMessage(d.get("name"))
+@message_type("client_stats_response")
+class ClientStatsResponse(ControlMessage):
+    """Return client's receive queue statistics, as a dictionary."""
+
+    def __init__(self, name: str, result: bool, message: str, stats: dict):
+        self.name = name
+        self.result = result
+        self.message = message
+        self.stats = stats
+        return
+
 
+@message_type("client_set_receive_filter")
+class ClientSetReceiveFilterMessage(ControlMessage):
+    """Set rules for which messages received by client are queued.
 
-class ServerCreatedMessage:
+    Rules are described in fixtool.filter.  Messages that don't pass
+    are counted, but discarded.  With no rules, all are queued."""
+
+    def __init__(self, name: str, include: list = None,
+                 exclude: list = None):
+        self.name = name
+        self.include = include
+        self.exclude = exclude
+        return
+
+
+@message_type("client_receive_filter_set")
+class ClientReceiveFilterSetMessage(ControlMessage):
     def __init__(self, name: str, result: bool, message: str):
-        self.type = "server_created"
         self.name = name
         self.result = result
         self.message = message
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerCreatedMessage(d.get("name"),
-                                    d.get("result"),
-                                    d.get("message"))
+@message_type("client_set_validate_checksum")
+class ClientSetValidateChecksumMessage(ControlMessage):
+    """Enable or disable checking of CheckSums received by client.
 
+    Messages with a wrong CheckSum value are discarded, and counted as
+    malformed.  By default, they're queued like any other."""
 
-class ServerListenMessage:
-    def __init__(self, name: str, port: int):
-        self.type = "server_listen"
+    def __init__(self, name: str, validate: bool = True):
         self.name = name
-        self.port = port
+        self.validate = validate
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "port": self.port})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerListenMessage(d.get("name"),
-                                   d.get("port"))
+@message_type("client_validate_checksum_set")
+class ClientValidateChecksumSetMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
+        self.name = name
+        self.result = result
+        self.message = message
+        return
 
 
-class ServerListenedMessage:
-    def __init__(self, name: str, result: bool, message: str, port: int):
-        self.type = "server_listened"
+@message_type("client_wait_for")
+class ClientWaitForMessage(ControlMessage):
+    """Request the next message received by client that matches.
+
+    The match is a list of rules (see fixtool.filter), all of which
+    the message must match.  Queued messages that don't are discarded,
+    and the agent waits up to the timeout, in seconds, for one that
+    does.  The response is a 'client_waited' message."""
+
+    def __init__(self, name: str, match: list, timeout: float = 0):
+        self.name = name
+        self.match = match
+        self.timeout = timeout
+        return
+
+
+@message_type("client_waited")
+class ClientWaitedMessage(ControlMessage):
+    """Return the matching message, if any, and the count discarded."""
+
+    def __init__(self, name: str, result: bool, message: str,
+                 payload: bytes, skipped: int = 0):
         self.name = name
         self.result = result
         self.message = message
-        self.port = port
+        self.payload = payload
+        self.skipped = skipped
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message,
-                           "port": self.port})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerListenedMessage(d.get("name"),
-                                     d.get("result"),
-                                     d.get("message"),
-                                     d.get("port"))
+@message_type("client_set_session_layer")
+class ClientSetSessionLayerMessage(ControlMessage):
+    """Enable or disable the agent's FIX session layer for client.
 
+    While enabled, the agent sends Heartbeats, answers TestRequests,
+    and tracks sequence numbers itself.  A zero heartbeat interval
+    means use the HeartBtInt from a Logon; unset header values are
+    learned from received messages.  With "stamp" set, the agent also
+    fills in the header and trailer of each message sent."""
 
-class ServerUnlistenMessage:
-    def __init__(self, name: str, port: int):
-        self.type = "server_unlisten"
+    def __init__(self, name: str, enabled: bool = True,
+                 heartbeat_interval: float = 0, begin_string: str = None,
+                 sender_comp_id: str = None, target_comp_id: str = None,
+                 stamp: bool = False):
         self.name = name
-        self.port = port
+        self.enabled = enabled
+        self.heartbeat_interval = heartbeat_interval
+        self.begin_string = begin_string
+        self.sender_comp_id = sender_comp_id
+        self.target_comp_id = target_comp_id
+        self.stamp = stamp
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "port": self.port})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerUnlistenMessage(d.get("name"),
-                                     d.get("port"))
+@message_type("client_session_layer_set")
+class ClientSessionLayerSetMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
+        self.name = name
+        self.result = result
+        self.message = message
+        return
 
 
-class ServerUnlistenedMessage:
+@message_type("server_create")
+class ServerCreateMessage(ControlMessage):
+    def __init__(self, name: str):
+        self.name = name
+        return
+
+
+@message_type("server_created")
+class ServerCreatedMessage(ControlMessage):
     def __init__(self, name: str, result: bool, message: str):
-        self.type = "server_unlistened"
         self.name = name
         self.result = result
         self.message = message
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerUnlistenedMessage(d.get("name"),
-                                       d.get("result"),
-                                       d.get("message"))
+@message_type("server_listen")
+class ServerListenMessage(ControlMessage):
+    def __init__(self, name: str, port: int):
+        self.name = name
+        self.port = port
+        return
 
 
-class ServerPendingAcceptCountRequest:
-    def __init__(self, name: str):
-        self.type = "server_pending_accept_request"
+@message_type("server_listened")
+class ServerListenedMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str, port: int):
         self.name = name
+        self.result = result
+        self.message = message
+        self.port = port
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerPendingAcceptCountRequest(d.get("name"))
+@message_type("server_unlisten")
+class ServerUnlistenMessage(ControlMessage):
+    def __init__(self, name: str, port: int):
+        self.name = name
+        self.port = port
+        return
 
 
-class ServerPendingAcceptCountResponse:
-    def __init__(self, name: str, result: bool, message: str, count: int):
-        self.type = "server_pending_accept_response"
+@message_type("server_unlistened")
+class ServerUnlistenedMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
         self.name = name
         self.result = result
         self.message = message
-        self.count = count
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message,
-                           "count": self.count})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerPendingAcceptCountResponse(d.get("name"),
-                                                d.get("result"),
-                                                d.get("message"),
-                                                d.get("count"))
+@message_type("server_pending_accept_request")
+class ServerPendingAcceptCountRequest(ControlMessage):
+    def __init__(self, name: str):
+        self.name = name
+        return
 
 
-class ServerAcceptMessage:
-    def __init__(self, name: str, session_name: str):
-        self.type = "server_accept"
+@message_type("server_pending_accept_response")
+class ServerPendingAcceptCountResponse(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str, count: int):
         self.name = name
-        self.session_name = session_name
+        self.result = result
+        self.message = message
+        self.count = count
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "session_name": self.session_name})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerAcceptMessage(d.get("name"),
-                                   d.get("session_name"))
+@message_type("server_accept")
+class ServerAcceptMessage(ControlMessage):
+    def __init__(self, name: str, session_name: str):
+        self.name = name
+        self.session_name = session_name
+        return
 
 
-class ServerAcceptedMessage:
+@message_type("server_accepted")
+class ServerAcceptedMessage(ControlMessage):
     def __init__(self, name: str, result: bool, message: str,
                  session_name: str):
-        self.type = "server_accepted"
         self.name = name
         self.result = result
         self.message = message
         self.session_name = session_name
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message,
-                           "session_name": self.session_name})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerAcceptedMessage(d.get("name"),
-                                     d.get("result"),
-                                     d.get("message"),
-                                     d.get("session_name"))
+@message_type("server_is_connected_request")
+class ServerIsConnectedRequest(ControlMessage):
+    def __init__(self, name: str):
+        self.name = name
+        return
 
 
-class ServerIsConnectedRequest:
+@message_type("server_is_connected_response")
+class ServerIsConnectedResponse(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str, connected: bool):
+        self.name = name
+        self.result = result
+        self.message = message
+        self.connected = connected
+        return
+
+
+@message_type("server_disconnect")
+class ServerDisconnectMessage(ControlMessage):
     def __init__(self, name: str):
-        self.type = "server_is_connected_request"
         self.name = name
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerIsConnectedRequest(d.get("name"))
+@message_type("server_disconnected")
+class ServerDisconnectedMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
+        self.name = name
+        self.result = result
+        self.message = message
+        return
 
 
-class ServerIsConnectedResponse:
-    def __init__(self, name: str, result: bool, message: str, connected: bool):
-        self.type = "server_is_connected_response"
+@message_type("server_destroy")
+class ServerDestroyMessage(ControlMessage):
+    def __init__(self, name: str):
+        self.name = name
+        return
+
+
+@message_type("server_destroyed")
+class ServerDestroyedMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
         self.name = name
         self.result = result
         self.message = message
-        self.connected = connected
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message,
-                           "connected": self.connected})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerIsConnectedResponse(d.get("name"),
-                                         d.get("result"),
-                                         d.get("message"),
-                                         d.get("connected"))
+@message_type("session_send")
+class SessionSendMessage(ControlMessage):
+    """Request message be sent from server to client."""
+
+    def __init__(self, name: str, payload: bytes):
+        self.name = name
+        self.payload = payload
+        return
+
+
+@message_type("session_sent")
+class SessionSentMessage(ControlMessage):
+    """Acknowledge message was sent from server to client."""
+
+    def __init__(self, name: str, result: bool, message: str):
+        self.name = name
+        self.result = result
+        self.message = message
+        return
+
+
+@message_type("session_send_batch")
+class SessionSendBatchMessage(ControlMessage):
+    """Request several messages be sent from server to client."""
+
+    def __init__(self, name: str, payloads: list):
+        self.name = name
+        self.payloads = payloads
+        return
 
 
-class ServerDisconnectMessage:
+@message_type("session_sent_batch")
+class SessionSentBatchMessage(ControlMessage):
+    """Acknowledge batch of messages sent from server to client.
+
+    The 'results' list has a boolean status for each message in the
+    batch, in the order they were requested."""
+
+    def __init__(self, name: str, result: bool, message: str,
+                 results: list):
+        self.name = name
+        self.result = result
+        self.message = message
+        self.results = results
+        return
+
+
+@message_type("session_receive_count_request")
+class SessionReceiveCountRequest(ControlMessage):
+    """Request count of server's received messages."""
+
     def __init__(self, name: str):
-        self.type = "server_disconnect"
         self.name = name
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerDisconnectMessage(d.get("name"))
+@message_type("session_receive_count_response")
+class SessionReceiveCountResponse(ControlMessage):
+    """Return count of server's received messages."""
 
+    def __init__(self, name: str, result: bool, message: str, count: int):
+        self.name = name
+        self.result = result
+        self.message = message
+        self.count = count
+        return
 
-class ServerDisconnectedMessage:
-    def __init__(self, name: str, result: bool, message: str):
-        self.type = "server_disconnected"
+
+@message_type("session_get")
+class SessionGetMessage(ControlMessage):
+    """Request message received by server."""
+
+    def __init__(self, name: str):
+        self.name = name
+        return
+
+
+@message_type("session_got")
+class SessionGotMessage(ControlMessage):
+    """Deliver message received by server to controller."""
+
+    def __init__(self, name: str, result: bool, message: str, payload: bytes):
         self.name = name
         self.result = result
         self.message = message
+        self.payload = payload
+        return
+
+
+@message_type("session_get_wait")
+class SessionGetWaitMessage(ControlMessage):
+    """Request message received by server, waiting if none is queued.
+
+    The timeout is in seconds, and the response is a 'session_got'
+    message, with a null payload if the timeout expired."""
+
+    def __init__(self, name: str, timeout: float):
+        self.name = name
+        self.timeout = timeout
+        return
+
+
+@message_type("session_get_many")
+class SessionGetManyMessage(ControlMessage):
+    """Request several messages received by server.
+
+    A limit of zero means no limit."""
+
+    def __init__(self, name: str, max_count: int = 0,
+                 max_bytes: int = 0):
+        self.name = name
+        self.max_count = max_count
+        self.max_bytes = max_bytes
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerDisconnectedMessage(d.get("name"),
-                                         d.get("result"),
-                                         d.get("message"))
+@message_type("session_got_many")
+class SessionGotManyMessage(ControlMessage):
+    """Deliver messages received by server to controller."""
 
+    def __init__(self, name: str, result: bool, message: str,
+                 payloads: list):
+        self.name = name
+        self.result = result
+        self.message = message
+        self.payloads = payloads
+        return
+
+
+@message_type("session_subscribe")
+class SessionSubscribeMessage(ControlMessage):
+    """Request messages received by server be forwarded to controller."""
 
-class ServerDestroyMessage:
     def __init__(self, name: str):
-        self.type = "server_destroy"
         self.name = name
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerDestroyMessage(d.get("name"))
+@message_type("session_subscribed")
+class SessionSubscribedMessage(ControlMessage):
+    """Acknowledge subscription to messages received by server."""
 
+    def __init__(self, name: str, result: bool, message: str):
+        self.name = name
+        self.result = result
+        self.message = message
+        return
+
+
+@message_type("session_unsubscribe")
+class SessionUnsubscribeMessage(ControlMessage):
+    """Request messages received by server be queued again."""
+
+    def __init__(self, name: str):
+        self.name = name
+        return
+
+
+@message_type("session_unsubscribed")
+class SessionUnsubscribedMessage(ControlMessage):
+    """Acknowledge end of subscription to messages received by server."""
 
-class ServerDestroyedMessage:
     def __init__(self, name: str, result: bool, message: str):
-        self.type = "server_destroyed"
         self.name = name
         self.result = result
         self.message = message
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message})
 
-    @staticmethod
-    def from_dict(d):
-        return ServerDestroyedMessage(d.get("name"),
-                                      d.get("result"),
-                                      d.get("message"))
+@message_type("session_received")
+class SessionReceivedMessage(ControlMessage):
+    """Forward messages received by server to subscribed controller.
 
+    This message is sent by the agent without a matching request."""
 
-class SessionSendMessage:
-    """Request message be sent from server to client."""
-    def __init__(self, name: str, payload: bytes):
-        self.type = "session_send"
+    def __init__(self, name: str, payloads: list):
         self.name = name
-        self.payload = payload
+        self.payloads = payloads
         return
 
-    def to_json(self):
-        payload = base64.b64encode(self.payload).decode()
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "payload": payload})
 
-    @staticmethod
-    def from_dict(d):
-        payload = base64.b64decode(d.get("payload"))
-        return SessionSendMessage(d.get("name"),
-                                  payload)
+@message_type("session_ring_open")
+class SessionRingOpenMessage(ControlMessage):
+    """Request a shared memory ring for messages received by session.
 
+    Messages are written to the ring by the agent, and read directly
+    by a controller on the same host."""
 
-class SessionSentMessage:
-    """Acknowledge message was sent from server to client."""
-    def __init__(self, name: str, result: bool, message: str):
-        self.type = "session_sent"
+    def __init__(self, name: str, size: int = 0):
+        self.name = name
+        self.size = size
+        return
+
+
+@message_type("session_ring_opened")
+class SessionRingOpenedMessage(ControlMessage):
+    """Report the path of a session's shared memory ring."""
+
+    def __init__(self, name: str, result: bool, message: str, path: str):
         self.name = name
         self.result = result
         self.message = message
+        self.path = path
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message})
 
-    @staticmethod
-    def from_dict(d):
-        return SessionSentMessage(d.get("name"),
-                                  d.get("result"),
-                                  d.get("message"))
+@message_type("session_set_queue_limit")
+class SessionSetQueueLimitMessage(ControlMessage):
+    """Limit the size of session's received message queue.
 
+    A limit of zero means no limit.  The policy is one of
+    QUEUE_POLICIES, and applies once either limit is reached."""
 
-class SessionReceiveCountRequest:
-    """Request count of server's received messages."""
+    def __init__(self, name: str, max_count: int = 0, max_bytes: int = 0,
+                 policy: str = QUEUE_PAUSE):
+        self.name = name
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.policy = policy
+        return
+
+
+@message_type("session_queue_limit_set")
+class SessionQueueLimitSetMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
+        self.name = name
+        self.result = result
+        self.message = message
+        return
+
+
+@message_type("session_stats_request")
+class SessionStatsRequest(ControlMessage):
+    """Request session's receive queue statistics."""
 
     def __init__(self, name: str):
-        self.type = "session_receive_count_request"
         self.name = name
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        return SessionReceiveCountRequest(d.get("name"))
+@message_type("session_stats_response")
+class SessionStatsResponse(ControlMessage):
+    """Return session's receive queue statistics, as a dictionary."""
 
+    def __init__(self, name: str, result: bool, message: str, stats: dict):
+        self.name = name
+        self.result = result
+        self.message = message
+        self.stats = stats
+        return
 
-class SessionReceiveCountResponse:
-    """Return count of server's received messages."""
 
-    def __init__(self, name: str, result: bool, message: str, count: int):
-        self.type = "session_receive_count_response"
+@message_type("session_set_receive_filter")
+class SessionSetReceiveFilterMessage(ControlMessage):
+    """Set rules for which messages received by session are queued.
+
+    Rules are described in fixtool.filter.  Messages that don't pass
+    are counted, but discarded.  With no rules, all are queued."""
+
+    def __init__(self, name: str, include: list = None,
+                 exclude: list = None):
+        self.name = name
+        self.include = include
+        self.exclude = exclude
+        return
+
+
+@message_type("session_receive_filter_set")
+class SessionReceiveFilterSetMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
         self.name = name
         self.result = result
         self.message = message
-        self.count = count
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message,
-                           "count": self.count})
 
-    @staticmethod
-    def from_dict(d):
-        return SessionReceiveCountResponse(d.get("name"),
-                                           d.get("result"),
-                                           d.get("message"),
-                                           d.get("count"))
+@message_type("session_set_validate_checksum")
+class SessionSetValidateChecksumMessage(ControlMessage):
+    """Enable or disable checking of CheckSums received by session.
 
+    Messages with a wrong CheckSum value are discarded, and counted as
+    malformed.  By default, they're queued like any other."""
 
-class SessionGetMessage:
-    """Request message received by server."""
+    def __init__(self, name: str, validate: bool = True):
+        self.name = name
+        self.validate = validate
+        return
 
-    def __init__(self, name: str):
-        self.type = "session_get"
+
+@message_type("session_validate_checksum_set")
+class SessionValidateChecksumSetMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
         self.name = name
+        self.result = result
+        self.message = message
         return
 
-    def to_json(self):
-        return json.dumps({"type": self.type,
-                           "name": self.name})
 
-    @staticmethod
-    def from_dict(d):
-        return SessionGetMessage(d.get("name"))
+@message_type("session_wait_for")
+class SessionWaitForMessage(ControlMessage):
+    """Request the next message received by session that matches.
 
+    The match is a list of rules (see fixtool.filter), all of which
+    the message must match.  Queued messages that don't are discarded,
+    and the agent waits up to the timeout, in seconds, for one that
+    does.  The response is a 'session_waited' message."""
 
-class SessionGotMessage:
-    """Deliver message received by server to controller."""
+    def __init__(self, name: str, match: list, timeout: float = 0):
+        self.name = name
+        self.match = match
+        self.timeout = timeout
+        return
 
-    def __init__(self, name: str, result: bool, message: str, payload: bytes):
-        self.type = "session_got"
+
+@message_type("session_waited")
+class SessionWaitedMessage(ControlMessage):
+    """Return the matching message, if any, and the count discarded."""
+
+    def __init__(self, name: str, result: bool, message: str,
+                 payload: bytes, skipped: int = 0):
         self.name = name
         self.result = result
         self.message = message
         self.payload = payload
+        self.skipped = skipped
         return
 
-    def to_json(self):
-        payload = base64.b64encode(self.payload).decode()
-        return json.dumps({"type": self.type,
-                           "name": self.name,
-                           "result": self.result,
-                           "message": self.message,
-                           "payload": payload})
-
-    @staticmethod
-    def from_dict(d):
-        payload = base64.b64decode(d.get("payload"))
-        return SessionGotMessage(d.get("name"),
-                                 d.get("result"),
-                                 d.get("message"),
-                                 payload)
+
+@message_type("session_set_session_layer")
+class SessionSetSessionLayerMessage(ControlMessage):
+    """Enable or disable the agent's FIX session layer for session.
+
+    While enabled, the agent sends Heartbeats, answers TestRequests,
+    and tracks sequence numbers itself.  A zero heartbeat interval
+    means use the HeartBtInt from a Logon; unset header values are
+    learned from received messages.  With "stamp" set, the agent also
+    fills in the header and trailer of each message sent."""
+
+    def __init__(self, name: str, enabled: bool = True,
+                 heartbeat_interval: float = 0, begin_string: str = None,
+                 sender_comp_id: str = None, target_comp_id: str = None,
+                 stamp: bool = False):
+        self.name = name
+        self.enabled = enabled
+        self.heartbeat_interval = heartbeat_interval
+        self.begin_string = begin_string
+        self.sender_comp_id = sender_comp_id
+        self.target_comp_id = target_comp_id
+        self.stamp = stamp
+        return
+
+
+@message_type("session_session_layer_set")
+class SessionSessionLayerSetMessage(ControlMessage):
+    def __init__(self, name: str, result: bool, message: str):
+        self.name = name
+        self.result = result
+        self.message = message
+        return
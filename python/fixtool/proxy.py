@@ -25,13 +25,102 @@
 
 """Python API to fixtool simulator agent."""
 
-import base64
-import json
+import collections
 import logging
+import select
 import socket
-import struct
+import time
 
+from fixtool.filter import MessageMatch
+from fixtool.framing import FrameDecoder, encode_frame
 from fixtool.message import *
+from fixtool.shmring import RingBuffer
+
+
+def take_messages(queue: collections.deque, max_count: int,
+                  max_bytes: int) -> list:
+    """(Internal) Remove messages from the front of a local queue.
+
+    :param queue: Queue of received messages.
+    :param max_count: Maximum number of messages, or zero for no limit.
+    :param max_bytes: Maximum total size of messages, or zero for no
+    limit.  The first message is always taken."""
+    messages = []
+    total = 0
+    while queue:
+        if max_count and len(messages) >= max_count:
+            break
+
+        total += len(queue[0])
+        if max_bytes and messages and total > max_bytes:
+            break
+        messages.append(queue.popleft())
+    return messages
+
+
+def match_rules(match) -> list:
+    """(Internal) Return a wait_for() match as a list of rules.
+
+    :param match: Rule dictionary, or list of them."""
+    if isinstance(match, dict):
+        return [match]
+    return list(match)
+
+
+def take_match(read, match: MessageMatch) -> tuple:
+    """(Internal) Discard locally held messages until one matches.
+
+    :param read: Function returning the next message, or None.
+    :param match: MessageMatch to satisfy.
+    :returns: Tuple of the matching message, or None if there wasn't
+    one, and the number of messages discarded."""
+    skipped = 0
+    message = read()
+    while message is not None:
+        if match.accepts(message):
+            return message, skipped
+        skipped += 1
+        message = read()
+    return None, skipped
+
+
+class PendingResponse(object):
+    """Handle for a request whose response hasn't been collected."""
+
+    def __init__(self, proxy, request_id: int, convert=None):
+        """(Internal) Constructor."""
+        self._proxy = proxy
+        self._request_id = request_id
+        self._convert = convert
+        self._response = None
+        return
+
+    def done(self) -> bool:
+        """Return True if the response has arrived."""
+        if self._response is None:
+            self._proxy.poll()
+            self._response = self._proxy.take_response(self._request_id)
+        return self._response is not None
+
+    def response(self):
+        """Wait for, and return, the response message."""
+        if self._response is None:
+            self._response = self._proxy.await_response(self._request_id)
+        return self._response
+
+    def result(self):
+        """Wait for the response, and return its result.
+
+        Raises RuntimeError if the request failed."""
+        response = self.response()
+        if response is None:
+            raise RuntimeError("Agent disconnected")
+        if not response.result:
+            raise RuntimeError(response.message)
+
+        if self._convert is None:
+            return None
+        return self._convert(response)
 
 
 class Client(object):
@@ -44,6 +133,9 @@ class Client(object):
         self._host = None
         self._port = None
         self._destroyed = False
+        self._subscribed = False
+        self._pushed = collections.deque()
+        self._ring = None
 
         msg = ClientCreateMessage(self._name)
         self._proxy.send_request(msg)
@@ -63,22 +155,28 @@ class Client(object):
         if not response.result:
             raise RuntimeError(response.message)
 
+        self.close_ring()
         self._proxy.remove_client(self._name)
         self._destroyed = True
         return
 
-    def connect(self, host: str, port: int):
+    def connect(self, host: str, port: int, timeout: float = None):
         """Connect the client to the specified host and port.
 
         :param host: String host name or IP address.
-        :param port: Integer TCP port number."""
+        :param port: Integer TCP port number.
+        :param timeout: Maximum time to wait for the connection, in
+        seconds, or None to wait indefinitely.
+
+        Raises RuntimeError if the connection fails or times out."""
 
         assert not self._destroyed
 
         self._host = host
         self._port = port
 
-        msg = ClientConnectMessage(self._name, self._host, self._port)
+        msg = ClientConnectMessage(self._name, self._host, self._port,
+                                   timeout)
         self._proxy.send_request(msg)
 
         response = self._proxy.await_response()
@@ -86,11 +184,41 @@ class Client(object):
             raise RuntimeError(response.message)
         return
 
+    def connect_async(self, host: str, port: int,
+                      timeout: float = None) -> PendingResponse:
+        """Start connecting, without waiting for the connection.
+
+        :param host: String host name or IP address.
+        :param port: Integer TCP port number.
+        :param timeout: Maximum time to wait for the connection, in
+        seconds, or None to wait indefinitely.
+        :returns: PendingResponse; its result() is None once connected.
+
+        The agent connects many clients at once, so starting them all
+        before waiting for any is much faster than calling connect()
+        for each."""
+        assert not self._destroyed
+
+        self._host = host
+        self._port = port
+
+        request = ClientConnectMessage(self._name, self._host, self._port,
+                                       timeout)
+        return self._proxy.submit(request)
+
     def disconnect(self):
-        """Disconnect the client for its server peer."""
+        """Disconnect the client from its server peer.
+
+        A connection attempt still in progress is abandoned, and its
+        connect_async() result raises RuntimeError."""
         assert not self._destroyed
 
-        self._proxy.send_request({"message": "client_disconnect"})
+        request = ClientDisconnectMessage(self._name)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
         return
 
     def is_connected(self):
@@ -112,8 +240,7 @@ class Client(object):
         :param message: Byte array containing formatted FIX message to send."""
         assert not self._destroyed
 
-        payload = base64.b64encode(message).decode("ascii")
-        request = ClientSendMessage(self._name, payload)
+        request = ClientSendMessage(self._name, message)
         self._proxy.send_request(request)
 
         response = self._proxy.await_response()
@@ -121,33 +248,391 @@ class Client(object):
             raise RuntimeError(response.message)
         return
 
+    def send_async(self, message: bytes) -> PendingResponse:
+        """Send a FIX message, without waiting for the agent to confirm.
+
+        :param message: Byte array containing formatted FIX message to send.
+        :returns: PendingResponse; its result() is None once sent."""
+        assert not self._destroyed
+
+        request = ClientSendMessage(self._name, message)
+        return self._proxy.submit(request)
+
+    def send_many(self, messages: list) -> list:
+        """Send several FIX messages to the connected server peer.
+
+        :param messages: List of byte arrays containing formatted FIX
+        messages to send.
+        :returns: List of per-message boolean results.
+
+        The whole list is sent to the agent in a single request, and
+        written to the peer together, which is much cheaper than
+        calling send() for each message."""
+        assert not self._destroyed
+
+        request = ClientSendBatchMessage(self._name, messages)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return response.results
+
     def receive_queue_length(self) -> int:
         """Return number of messages waiting to be collected from the client."""
         assert not self._destroyed
 
+        ring_count = 0
+        if self._ring is not None:
+            ring_count = self._ring.count()
+
+        if self._subscribed:
+            self._proxy.poll()
+            return ring_count + len(self._pushed)
+
         request = ClientReceiveCountRequest(self._name)
         self._proxy.send_request(request)
 
         response = self._proxy.await_response()
         if not response.result:
             raise RuntimeError(response.message)
-        return response.count
+        return ring_count + len(self._pushed) + response.count
 
-    def receive(self) -> bytes:
+    def receive(self, timeout: float = 0) -> bytes:
         """Return a FIX message received from the connected server.
 
-        If no messages are queued, returns None."""
+        :param timeout: Maximum time to wait for a message, in seconds.
+
+        If no messages are queued, the agent waits for one to arrive
+        for up to timeout seconds.  If there's still no message, returns
+        None."""
 
-        request = ClientGetMessage(self._name)
+        if self._ring is not None:
+            message = self._ring.read()
+            if message is not None:
+                return message
+
+        if self._pushed:
+            return self._pushed.popleft()
+
+        if self._subscribed:
+            return self._proxy.await_pushed(self._pushed, timeout)
+
+        if timeout > 0:
+            request = ClientGetWaitMessage(self._name, timeout)
+        else:
+            request = ClientGetMessage(self._name)
         self._proxy.send_request(request)
 
         response = self._proxy.await_response()
         if not response.result:
             raise RuntimeError(response.message)
 
-        message = base64.b64decode(response.payload)
+        # The agent doesn't wait if there are messages in the ring.
+        if response.payload is None and self._ring is not None:
+            return self._ring.read()
+        return response.payload
+
+    def receive_async(self, timeout: float = 0) -> PendingResponse:
+        """Request a received FIX message, without waiting for it.
+
+        :param timeout: Maximum time the agent waits for a message.
+        :returns: PendingResponse; its result() is the message, or None.
+
+        This asks the agent directly, so it's not useful for a
+        subscribed client."""
+        assert not self._destroyed
+
+        if timeout > 0:
+            request = ClientGetWaitMessage(self._name, timeout)
+        else:
+            request = ClientGetMessage(self._name)
+        return self._proxy.submit(request, lambda r: r.payload)
+
+    def receive_many(self, max_count: int = 0, max_bytes: int = 0) -> list:
+        """Return several FIX messages received from the connected server.
+
+        :param max_count: Maximum number of messages to return, or zero
+        for no limit.
+        :param max_bytes: Maximum total size of returned messages, or
+        zero for no limit.  At least one message is returned if any are
+        queued, regardless of its size.
+        :returns: List of messages, which is empty if none are queued."""
+        assert not self._destroyed
+
+        if self._ring is not None:
+            messages = self._ring.read_many(max_count, max_bytes)
+            if messages:
+                return messages
+
+        if self._subscribed:
+            self._proxy.poll()
+        if self._pushed:
+            return take_messages(self._pushed, max_count, max_bytes)
+
+        request = ClientGetManyMessage(self._name, max_count, max_bytes)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return response.payloads
+
+    def wait_for(self, match, timeout: float = 0, skipped: bool = False):
+        """Return the next received message that matches.
+
+        :param match: Rule, or list of rules, all of which the message
+        must match; see fixtool.filter.
+        :param timeout: Maximum time to wait for a matching message, in
+        seconds.
+        :param skipped: If True, return a tuple of the message and the
+        number of messages discarded before it.
+        :returns: Matching message, or None if none arrived in time.
+
+        Messages received from the server before the matching one are
+        discarded.  The agent does the matching, so they aren't sent to
+        this proxy (unless it's subscribed, or reading from a ring)."""
+        assert not self._destroyed
+
+        rules = match_rules(match)
+        local_match = MessageMatch(rules)
+        deadline = time.monotonic() + timeout
+        count = 0
+        while True:
+            if self._ring is not None:
+                message, discarded = take_match(self._ring.read, local_match)
+                count += discarded
+                if message is not None:
+                    break
+
+            message, discarded = take_match(self.take_pushed, local_match)
+            count += discarded
+            if message is not None:
+                break
+
+            remaining = max(deadline - time.monotonic(), 0)
+            if self._subscribed:
+                if remaining <= 0:
+                    break
+                self._proxy.poll(remaining)
+                continue
+
+            request = ClientWaitForMessage(self._name, rules, remaining)
+            self._proxy.send_request(request)
+
+            response = self._proxy.await_response()
+            if not response.result:
+                raise RuntimeError(response.message)
+
+            count += response.skipped
+            message = response.payload
+
+            # The agent doesn't wait if there are messages in the ring.
+            if message is not None or self._ring is None or \
+                    self._ring.is_empty():
+                break
+
+        if skipped:
+            return message, count
         return message
 
+    def take_pushed(self):
+        """(Internal) Return the oldest forwarded message, or None."""
+        if not self._pushed:
+            return None
+        return self._pushed.popleft()
+
+    def subscribe(self):
+        """Have the agent forward received messages as they arrive.
+
+        Once subscribed, the agent sends each received FIX message to
+        this proxy without waiting for a request, and receive() and
+        receive_many() collect them locally."""
+        assert not self._destroyed
+
+        request = ClientSubscribeMessage(self._name)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+
+        self._subscribed = True
+        return
+
+    def unsubscribe(self):
+        """Stop forwarding received messages; queue them in the agent."""
+        assert not self._destroyed
+
+        request = ClientUnsubscribeMessage(self._name)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+
+        self._subscribed = False
+        return
+
+    def open_ring(self, size: int = 0):
+        """Read received messages from shared memory.
+
+        :param size: Ring size in bytes, or zero for the agent's default.
+
+        The agent writes received messages into a shared memory ring,
+        which is read directly by receive() and receive_many(), so the
+        messages don't cross the control session.  This requires the
+        agent to be running on the same host.  While a receive() is
+        waiting, or the client is subscribed, messages are still
+        delivered via the control session."""
+        assert not self._destroyed
+
+        if self._ring is not None:
+            return
+
+        request = ClientRingOpenMessage(self._name, size)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+
+        self._ring = RingBuffer(response.path)
+        return
+
+    def set_queue_limit(self, max_count: int = 0, max_bytes: int = 0,
+                        policy: str = QUEUE_PAUSE):
+        """Limit the number and size of messages queued in the agent.
+
+        :param max_count: Maximum number of messages, or zero for no limit.
+        :param max_bytes: Maximum total size of messages, or zero for no
+        limit.
+        :param policy: What to do when the queue is full: QUEUE_PAUSE to
+        stop reading from the server (so TCP flow control applies),
+        QUEUE_DROP_OLDEST or QUEUE_DROP_NEWEST to discard a message, or
+        QUEUE_SPILL to queue further messages on disk."""
+        assert not self._destroyed
+
+        request = ClientSetQueueLimitMessage(self._name, max_count,
+                                             max_bytes, policy)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return
+
+    def set_receive_filter(self, include: list = None,
+                           exclude: list = None):
+        """Have the agent discard unwanted received messages.
+
+        :param include: List of rules, any of which a message must match
+        to be queued.
+        :param exclude: List of rules, none of which a message may match.
+
+        Rules are dictionaries, described in fixtool.filter; for example,
+        exclude=[{"msg_type": "0"}] discards heartbeats.  Discarded
+        messages are counted in stats().  Call with no rules to queue
+        everything again."""
+        assert not self._destroyed
+
+        request = ClientSetReceiveFilterMessage(self._name, include, exclude)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return
+
+    def set_validate_checksum(self, validate: bool = True):
+        """Have the agent check the CheckSum of received messages.
+
+        :param validate: True to check, False to stop checking.
+
+        Messages with a wrong CheckSum value are discarded, and counted
+        as "malformed" in stats(), like those that can't be split from
+        the byte stream.  By default, they're queued like any other, so
+        a test can see exactly what its peer sent."""
+        assert not self._destroyed
+
+        request = ClientSetValidateChecksumMessage(self._name, validate)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return
+
+    def set_session_layer(self, enabled: bool = True,
+                          heartbeat_interval: float = 0,
+                          begin_string: str = None,
+                          sender_comp_id: str = None,
+                          target_comp_id: str = None,
+                          stamp: bool = False):
+        """Have the agent run the FIX session layer for this connection.
+
+        :param enabled: True to enable, False to disable.
+        :param heartbeat_interval: Seconds between Heartbeats, or zero
+        to use the HeartBtInt (108) of a Logon message.
+        :param begin_string: BeginString for Heartbeats, or None to use
+        the peer's.
+        :param sender_comp_id: SenderCompID for Heartbeats, or None to
+        use the TargetCompID of received messages.
+        :param target_comp_id: TargetCompID for Heartbeats, or None to
+        use the SenderCompID of received messages.
+        :param stamp: True to have the agent fill in each sent message's
+        header and trailer; see below.
+
+        While enabled, the agent sends a Heartbeat whenever nothing has
+        been sent for the interval, answers each TestRequest with a
+        Heartbeat, and tracks sequence numbers; see the "session" item
+        in stats().  Received messages are still queued as usual.
+
+        With stamp set, messages passed to send() need only their body,
+        starting with the MsgType (35) field.  The agent adds the
+        BeginString, BodyLength, SenderCompID, TargetCompID, MsgSeqNum
+        and SendingTime, and the CheckSum.  Any of those already present
+        (directly after 8/9/35) are replaced, so fully encoded messages
+        can be sent too."""
+        assert not self._destroyed
+
+        request = ClientSetSessionLayerMessage(
+            self._name, enabled, heartbeat_interval, begin_string,
+            sender_comp_id, target_comp_id, stamp)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return
+
+    def stats(self) -> dict:
+        """Return the agent's receive queue statistics.
+
+        The dictionary has the queue's limits and policy, and counts of
+        messages queued, received, dropped, and spilled to disk."""
+        assert not self._destroyed
+
+        request = ClientStatsRequest(self._name)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return response.stats
+
+    def close_ring(self):
+        """(Internal) Unmap the shared memory ring, if open."""
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+        return
+
+    def deliver(self, payloads: list):
+        """(Internal) Queue messages forwarded by the agent."""
+        self._pushed.extend(payloads)
+        return
+
 
 class Server(object):
     """Local proxy for FIX server in agent."""
@@ -255,6 +740,7 @@ class Server(object):
 
         client = ServerSession(self, self._proxy, response.session_name)
         self._clients[response.session_name] = client
+        self._proxy.add_session(response.session_name, client)
         return client
 
 
@@ -267,6 +753,9 @@ class ServerSession(object):
         self._proxy = proxy
         self._name = name
         self._connected = True
+        self._subscribed = False
+        self._pushed = collections.deque()
+        self._ring = None
         return
 
     def destroy(self):
@@ -276,6 +765,9 @@ class ServerSession(object):
         any queued messages."""
         if self._connected:
             self.disconnect()
+        self._pushed.clear()
+        self.close_ring()
+        self._proxy.remove_session(self._name)
         return
 
     def is_connected(self):
@@ -309,8 +801,7 @@ class ServerSession(object):
         assert message
         assert self._connected
 
-        payload = base64.b64encode(message).decode("ascii")
-        request = SessionSendMessage(self._name, payload)
+        request = SessionSendMessage(self._name, message)
         self._proxy.send_request(request)
 
         response = self._proxy.await_response()
@@ -318,55 +809,453 @@ class ServerSession(object):
             raise RuntimeError(response.message)
         return
 
+    def send_async(self, message: bytes) -> PendingResponse:
+        """Send a message, without waiting for the agent to confirm.
+
+        :param message: Byte array of formatted FIX message to send.
+        :returns: PendingResponse; its result() is None once sent."""
+        assert message
+        assert self._connected
+
+        request = SessionSendMessage(self._name, message)
+        return self._proxy.submit(request)
+
+    def send_many(self, messages: list) -> list:
+        """Send several messages to the connected FIX client.
+
+        :param messages: List of byte arrays of formatted FIX messages.
+        :returns: List of per-message boolean results."""
+
+        assert self._connected
+
+        request = SessionSendBatchMessage(self._name, messages)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return response.results
+
     def receive_queue_length(self):
         """Return the number of messages queued from the connected client."""
 
         assert self._connected
 
+        ring_count = 0
+        if self._ring is not None:
+            ring_count = self._ring.count()
+
+        if self._subscribed:
+            self._proxy.poll()
+            return ring_count + len(self._pushed)
+
         request = SessionReceiveCountRequest(self._name)
         self._proxy.send_request(request)
 
         response = self._proxy.await_response()
         if not response.result:
             raise RuntimeError(response.message)
-        return response.count
+        return ring_count + len(self._pushed) + response.count
 
-    def receive(self) -> bytes:
+    def receive(self, timeout: float = 0) -> bytes:
         """Return a message received from the connected client.
 
-        If no messages are queued, returns None."""
+        :param timeout: Maximum time to wait for a message, in seconds.
+
+        If no messages are queued, the agent waits for one to arrive
+        for up to timeout seconds.  If there's still no message, returns
+        None."""
         assert self._connected
 
-        request = SessionGetMessage(self._name)
+        if self._ring is not None:
+            message = self._ring.read()
+            if message is not None:
+                return message
+
+        if self._pushed:
+            return self._pushed.popleft()
+
+        if self._subscribed:
+            return self._proxy.await_pushed(self._pushed, timeout)
+
+        if timeout > 0:
+            request = SessionGetWaitMessage(self._name, timeout)
+        else:
+            request = SessionGetMessage(self._name)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+
+        # The agent doesn't wait if there are messages in the ring.
+        if response.payload is None and self._ring is not None:
+            return self._ring.read()
+        return response.payload
+
+    def receive_async(self, timeout: float = 0) -> PendingResponse:
+        """Request a received message, without waiting for it.
+
+        :param timeout: Maximum time the agent waits for a message.
+        :returns: PendingResponse; its result() is the message, or None.
+
+        This asks the agent directly, so it's not useful for a
+        subscribed session."""
+        assert self._connected
+
+        if timeout > 0:
+            request = SessionGetWaitMessage(self._name, timeout)
+        else:
+            request = SessionGetMessage(self._name)
+        return self._proxy.submit(request, lambda r: r.payload)
+
+    def receive_many(self, max_count: int = 0, max_bytes: int = 0) -> list:
+        """Return several messages received from the connected client.
+
+        :param max_count: Maximum number of messages to return, or zero
+        for no limit.
+        :param max_bytes: Maximum total size of returned messages, or
+        zero for no limit.
+        :returns: List of messages, which is empty if none are queued."""
+        assert self._connected
+
+        if self._ring is not None:
+            messages = self._ring.read_many(max_count, max_bytes)
+            if messages:
+                return messages
+
+        if self._subscribed:
+            self._proxy.poll()
+        if self._pushed:
+            return take_messages(self._pushed, max_count, max_bytes)
+
+        request = SessionGetManyMessage(self._name, max_count, max_bytes)
         self._proxy.send_request(request)
 
         response = self._proxy.await_response()
         if not response.result:
             raise RuntimeError(response.message)
+        return response.payloads
+
+    def wait_for(self, match, timeout: float = 0, skipped: bool = False):
+        """Return the next received message that matches.
+
+        :param match: Rule, or list of rules, all of which the message
+        must match; see fixtool.filter.
+        :param timeout: Maximum time to wait for a matching message, in
+        seconds.
+        :param skipped: If True, return a tuple of the message and the
+        number of messages discarded before it.
+        :returns: Matching message, or None if none arrived in time.
+
+        Messages received from the client before the matching one are
+        discarded.  The agent does the matching, so they aren't sent to
+        this proxy (unless it's subscribed, or reading from a ring)."""
+        assert self._connected
+
+        rules = match_rules(match)
+        local_match = MessageMatch(rules)
+        deadline = time.monotonic() + timeout
+        count = 0
+        while True:
+            if self._ring is not None:
+                message, discarded = take_match(self._ring.read, local_match)
+                count += discarded
+                if message is not None:
+                    break
+
+            message, discarded = take_match(self.take_pushed, local_match)
+            count += discarded
+            if message is not None:
+                break
+
+            remaining = max(deadline - time.monotonic(), 0)
+            if self._subscribed:
+                if remaining <= 0:
+                    break
+                self._proxy.poll(remaining)
+                continue
+
+            request = SessionWaitForMessage(self._name, rules, remaining)
+            self._proxy.send_request(request)
+
+            response = self._proxy.await_response()
+            if not response.result:
+                raise RuntimeError(response.message)
 
-        message = base64.b64decode(response.payload)
+            count += response.skipped
+            message = response.payload
+
+            # The agent doesn't wait if there are messages in the ring.
+            if message is not None or self._ring is None or \
+                    self._ring.is_empty():
+                break
+
+        if skipped:
+            return message, count
         return message
 
+    def take_pushed(self):
+        """(Internal) Return the oldest forwarded message, or None."""
+        if not self._pushed:
+            return None
+        return self._pushed.popleft()
+
+    def subscribe(self):
+        """Have the agent forward received messages as they arrive."""
+        assert self._connected
+
+        request = SessionSubscribeMessage(self._name)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+
+        self._subscribed = True
+        return
+
+    def unsubscribe(self):
+        """Stop forwarding received messages; queue them in the agent."""
+        assert self._connected
+
+        request = SessionUnsubscribeMessage(self._name)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+
+        self._subscribed = False
+        return
+
+    def open_ring(self, size: int = 0):
+        """Read received messages from shared memory.
+
+        :param size: Ring size in bytes, or zero for the agent's default.
+
+        The agent writes received messages into a shared memory ring,
+        which is read directly by receive() and receive_many(), so the
+        messages don't cross the control session.  This requires the
+        agent to be running on the same host.  While a receive() is
+        waiting, or the session is subscribed, messages are still
+        delivered via the control session."""
+        assert self._connected
+
+        if self._ring is not None:
+            return
+
+        request = SessionRingOpenMessage(self._name, size)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+
+        self._ring = RingBuffer(response.path)
+        return
+
+    def set_queue_limit(self, max_count: int = 0, max_bytes: int = 0,
+                        policy: str = QUEUE_PAUSE):
+        """Limit the number and size of messages queued in the agent.
+
+        :param max_count: Maximum number of messages, or zero for no limit.
+        :param max_bytes: Maximum total size of messages, or zero for no
+        limit.
+        :param policy: What to do when the queue is full: QUEUE_PAUSE to
+        stop reading from the client (so TCP flow control applies),
+        QUEUE_DROP_OLDEST or QUEUE_DROP_NEWEST to discard a message, or
+        QUEUE_SPILL to queue further messages on disk."""
+        assert self._connected
+
+        request = SessionSetQueueLimitMessage(self._name, max_count,
+                                              max_bytes, policy)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return
+
+    def set_receive_filter(self, include: list = None,
+                           exclude: list = None):
+        """Have the agent discard unwanted received messages.
+
+        :param include: List of rules, any of which a message must match
+        to be queued.
+        :param exclude: List of rules, none of which a message may match.
+
+        Rules are dictionaries, described in fixtool.filter; for example,
+        exclude=[{"msg_type": "0"}] discards heartbeats.  Discarded
+        messages are counted in stats().  Call with no rules to queue
+        everything again."""
+        assert self._connected
+
+        request = SessionSetReceiveFilterMessage(self._name, include, exclude)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return
+
+    def set_validate_checksum(self, validate: bool = True):
+        """Have the agent check the CheckSum of received messages.
+
+        :param validate: True to check, False to stop checking.
+
+        Messages with a wrong CheckSum value are discarded, and counted
+        as "malformed" in stats(), like those that can't be split from
+        the byte stream.  By default, they're queued like any other, so
+        a test can see exactly what its peer sent."""
+        assert self._connected
+
+        request = SessionSetValidateChecksumMessage(self._name, validate)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return
+
+    def set_session_layer(self, enabled: bool = True,
+                          heartbeat_interval: float = 0,
+                          begin_string: str = None,
+                          sender_comp_id: str = None,
+                          target_comp_id: str = None,
+                          stamp: bool = False):
+        """Have the agent run the FIX session layer for this connection.
+
+        :param enabled: True to enable, False to disable.
+        :param heartbeat_interval: Seconds between Heartbeats, or zero
+        to use the HeartBtInt (108) of a Logon message.
+        :param begin_string: BeginString for Heartbeats, or None to use
+        the peer's.
+        :param sender_comp_id: SenderCompID for Heartbeats, or None to
+        use the TargetCompID of received messages.
+        :param target_comp_id: TargetCompID for Heartbeats, or None to
+        use the SenderCompID of received messages.
+        :param stamp: True to have the agent fill in each sent message's
+        header and trailer; see below.
+
+        While enabled, the agent sends a Heartbeat whenever nothing has
+        been sent for the interval, answers each TestRequest with a
+        Heartbeat, and tracks sequence numbers; see the "session" item
+        in stats().  Received messages are still queued as usual.
+
+        With stamp set, messages passed to send() need only their body,
+        starting with the MsgType (35) field.  The agent adds the
+        BeginString, BodyLength, SenderCompID, TargetCompID, MsgSeqNum
+        and SendingTime, and the CheckSum.  Any of those already present
+        (directly after 8/9/35) are replaced, so fully encoded messages
+        can be sent too."""
+        assert self._connected
+
+        request = SessionSetSessionLayerMessage(
+            self._name, enabled, heartbeat_interval, begin_string,
+            sender_comp_id, target_comp_id, stamp)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return
+
+    def stats(self) -> dict:
+        """Return the agent's receive queue statistics.
+
+        The dictionary has the queue's limits and policy, and counts of
+        messages queued, received, dropped, and spilled to disk."""
+        assert self._connected
+
+        request = SessionStatsRequest(self._name)
+        self._proxy.send_request(request)
+
+        response = self._proxy.await_response()
+        if not response.result:
+            raise RuntimeError(response.message)
+        return response.stats
+
+    def close_ring(self):
+        """(Internal) Unmap the shared memory ring, if open."""
+        if self._ring is not None:
+            self._ring.close()
+            self._ring = None
+        return
+
+    def deliver(self, payloads: list):
+        """(Internal) Queue messages forwarded by the agent."""
+        self._pushed.extend(payloads)
+        return
+
+
+def unix_socket_address(path: str):
+    """Convert a control socket path to a Unix domain socket address.
+
+    :param path: Socket path.  A leading '@' denotes a name in the Linux
+    abstract namespace, which has no file system presence.
+    :returns: Address for socket.bind() or socket.connect()."""
+    if path.startswith('@'):
+        return '\0' + path[1:]
+    return path
+
 
 class FixToolProxy(object):
     """Proxy for communication with remote FIX agent."""
 
-    def __init__(self, host: str, port: int):
+    def __init__(self, host: str, port: int, codec: str = CODEC_BINARY,
+                 path: str = None):
         """Constructor.
 
-        :param host: String host name or IP address for agent."""
+        :param host: String host name or IP address for agent.
+        :param port: Integer TCP port number for agent.
+        :param codec: Preferred control message encoding.  The binary
+        encoding avoids BASE64-encoding FIX messages; if the agent
+        doesn't accept it, JSON is used.
+        :param path: If set, connect to the agent's Unix domain socket
+        at this path; host and port are ignored."""
         self._host = host
         self._port = port
+        self._path = path
+        self._codec = CODEC_JSON
         self._clients = {}
         self._servers = {}
-
-        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._socket.connect((host, port))
+        self._sessions = {}
+
+        if path:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(unix_socket_address(path))
+        else:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._socket.connect((host, port))
         self._socket.setblocking(True)
 
-        self._buffer = b''
+        self._decoder = FrameDecoder()
+        self._next_request_id = 1
+        self._last_request_id = None
+        self._responses = {}
+
+        if codec != CODEC_JSON:
+            self.select_codec(codec)
         return
 
+    def select_codec(self, codec: str):
+        """(Internal) Ask the agent to switch control message encoding.
+
+        :param codec: CODEC_JSON or CODEC_BINARY.
+        :returns: True if the agent switched encoding."""
+        request = CodecSelectMessage(codec)
+        self.send_request(request)
+
+        response = self.await_response()
+        if response is None or not response.result:
+            logging.warning("Agent refused codec '%s'; using %s",
+                            codec, self._codec)
+            return False
+
+        self._codec = codec
+        return True
+
     def shutdown(self):
         """Shutdown the associated agent."""
         message = ShutdownMessage()
@@ -404,95 +1293,142 @@ class FixToolProxy(object):
         self._servers[name] = server
         return server
 
-    def send_request(self, message):
-        """(Internal) Send message to agent."""
-        payload = message.to_json().encode('UTF-8')
-        payload_length = len(payload)
-        header = struct.pack(">L", payload_length)
-        self._socket.sendall(header + payload)
-        return
+    def send_request(self, message) -> int:
+        """(Internal) Send message to agent.
 
-    def await_response(self):
-        """(Internal) Wait for message from agent."""
-        while True:
-            buf = self._socket.recv(65536)
-            if len(buf) == 0:
-                # Disconnected.
-                return None
+        :returns: Identifier of the request, used to match its response."""
+        request_id = self._next_request_id
+        self._next_request_id += 1
+        self._last_request_id = request_id
 
-            self._buffer += buf
-            if len(self._buffer) <= 4:
-                continue
+        payload = encode_message(message, self._codec, request_id)
+        self._socket.sendall(encode_frame(payload))
+        return request_id
 
-            message_length = struct.unpack(">L", self._buffer[:4])[0]
-            self._buffer = self._buffer[4:]
-            if len(self._buffer) < message_length:
-                continue
+    def submit(self, message, convert=None):
+        """Send a request to the agent, without waiting for its response.
+
+        :param message: Control message to send.
+        :param convert: Optional function, applied to a successful
+        response to produce the result.
+        :returns: PendingResponse for the request.
+
+        Any number of requests can be outstanding at once; the agent
+        tags each response with the identifier of its request, and the
+        responses can be collected in any order."""
+        request_id = self.send_request(message)
+        return PendingResponse(self, request_id, convert)
 
-            message_buf = self._buffer[:message_length]
-            self._buffer = self._buffer[message_length:]
+    def await_response(self, request_id: int = None):
+        """(Internal) Wait for the response to a request.
 
-            d = json.loads(message_buf.decode())
-            message = None
-            message_type = d.get("type")
-            if message_type == "client_created":
-                message = ClientCreatedMessage.from_dict(d)
+        :param request_id: Identifier returned by send_request(), or
+        None for the most recently sent request.
 
-            elif message_type == "client_destroyed":
-                message = ClientDestroyedMessage.from_dict(d)
+        Messages forwarded by the agent to subscribed clients and
+        sessions are delivered to them while waiting, and responses to
+        other outstanding requests are kept until they're wanted."""
+        if request_id is None:
+            request_id = self._last_request_id
+
+        while True:
+            if request_id in self._responses:
+                return self._responses.pop(request_id)
+
+            message = self.next_message()
+            if message is None:
+                if not self.read():
+                    # Disconnected.
+                    return None
+                continue
 
-            elif message_type == "client_connected":
-                message = ClientConnectedMessage.from_dict(d)
+            if self.deliver_push(message):
+                continue
 
-            elif message_type == "client_is_connected_response":
-                message = ClientIsConnectedResponse.from_dict(d)
+            # An agent that doesn't support identifiers answers in order.
+            if message.id is None or message.id == request_id:
+                return message
+            self._responses[message.id] = message
 
-            elif message_type == "client_sent":
-                message = ClientSentMessage.from_dict(d)
+    def poll(self, timeout: float = 0):
+        """(Internal) Deliver any messages forwarded by the agent.
 
-            elif message_type == "client_receive_count_response":
-                message = ClientReceiveCountResponse.from_dict(d)
+        :param timeout: Maximum time to wait for data, in seconds."""
+        readable, _, _ = select.select([self._socket], [], [], timeout)
+        if readable:
+            self.read()
 
-            elif message_type == "client_got":
-                message = ClientGotMessage.from_dict(d)
+        message = self.next_message()
+        while message is not None:
+            if not self.deliver_push(message):
+                self._responses[message.id] = message
+            message = self.next_message()
+        return
 
-            elif message_type == "server_created":
-                message = ServerCreatedMessage.from_dict(d)
+    def await_pushed(self, queue: collections.deque, timeout: float):
+        """(Internal) Wait for a forwarded message to arrive on a queue.
+
+        :param queue: Local queue of a subscribed client or session.
+        :param timeout: Maximum time to wait, in seconds.
+        :returns: First message from queue, or None on timeout."""
+        self.poll()
+        deadline = time.monotonic() + timeout
+        while not queue:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self.poll(remaining)
+        return queue.popleft()
 
-            elif message_type == "server_destroyed":
-                message = ServerDestroyedMessage.from_dict(d)
+    def read(self) -> bool:
+        """(Internal) Read available data from agent.
 
-            elif message_type == "server_listened":
-                message = ServerListenedMessage.from_dict(d)
+        :returns: False if the agent disconnected."""
+        buf = self._socket.recv(65536)
+        if len(buf) == 0:
+            return False
 
-            elif message_type == "server_unlistened":
-                message = ServerUnlistenedMessage.from_dict(d)
+        self._decoder.feed(buf)
+        return True
 
-            elif message_type == "server_pending_accept_response":
-                message = ServerPendingAcceptCountResponse.from_dict(d)
+    def next_message(self):
+        """(Internal) Decode the next complete message from the agent.
 
-            elif message_type == "server_accepted":
-                message = ServerAcceptedMessage.from_dict(d)
+        :returns: Decoded message, or None if no complete message is
+        buffered."""
+        while True:
+            payload = self._decoder.next_frame()
+            if payload is None:
+                return None
 
-            elif message_type == "server_is_connected_response":
-                message = ServerIsConnectedResponse.from_dict(d)
+            d = decode_message(payload)
+            message = message_from_dict(d)
+            if message is not None:
+                return message
 
-            elif message_type == "server_disconnected":
-                message = ServerDisconnectedMessage.from_dict(d)
+            logging.critical("Unknown message type: %s", d.get("type"))
 
-            elif message_type == "session_receive_count_response":
-                message = SessionReceiveCountResponse.from_dict(d)
+    def take_response(self, request_id: int):
+        """(Internal) Return an already-received response, or None.
 
-            elif message_type == "session_sent":
-                message = SessionSentMessage.from_dict(d)
+        :param request_id: Identifier returned by send_request()."""
+        return self._responses.pop(request_id, None)
 
-            elif message_type == "session_got":
-                message = SessionGotMessage.from_dict(d)
+    def deliver_push(self, message) -> bool:
+        """(Internal) Deliver a message forwarded by the agent.
 
-            else:
-                logging.critical("Unknown message type: %s" % message_type)
+        :param message: Message from the agent.
+        :returns: True if this was a forwarded message."""
+        if message.type == "client_received":
+            target = self._clients.get(message.name)
+        elif message.type == "session_received":
+            target = self._sessions.get(message.name)
+        else:
+            return False
 
-            return message
+        if target is not None:
+            target.deliver(message.payloads)
+        return True
 
     def remove_client(self, name):
         """(Iinternal) Remove named client from clients table."""
@@ -503,3 +1439,13 @@ class FixToolProxy(object):
         """(Internal) Remove named server from servers table."""
         del self._servers[name]
         return
+
+    def add_session(self, name, session):
+        """(Internal) Add server session to sessions table."""
+        self._sessions[name] = session
+        return
+
+    def remove_session(self, name):
+        """(Internal) Remove named server session from sessions table."""
+        self._sessions.pop(name, None)
+        return
@@ -0,0 +1,369 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""FIX session layer, run by the agent for a connection.
+
+When enabled, the session layer keeps a connection alive without any
+help from the controller: it sends a Heartbeat (35=0) whenever nothing
+has been sent for the heartbeat interval, answers each TestRequest (35=1)
+with a Heartbeat carrying its TestReqID (112), and tracks sequence
+numbers in both directions.
+
+Header values for the messages it sends are learned from the traffic:
+the BeginString and CompIDs from received messages (with Sender and
+Target swapped), the heartbeat interval from a Logon's HeartBtInt
+(108), and the next outgoing MsgSeqNum from messages sent by the
+controller.  Any of them can be set explicitly instead.
+
+It can also stamp the messages sent by the controller, so they need
+only carry a body: the standard header fields and CheckSum are
+spliced around it, using a cached prefix for the fields that don't
+change from message to message."""
+
+import asyncio
+import logging
+import time
+
+import simplefix
+
+from fixtool.splitter import checksum
+from fixtool.view import FixMessageView
+
+
+# Tag of MsgSeqNum, as found in an encoded message.
+SEQNUM_FIELD = b"\x0134="
+
+# Header fields replaced when stamping a message.
+STAMPED_TAGS = (b"8", b"9", b"34", b"35", b"49", b"52", b"56")
+
+
+class FixSession(object):
+    """Session layer for one FIX connection."""
+
+    def __init__(self, name: str, send):
+        """Constructor.
+
+        :param name: Client or session name, for logging.
+        :param send: Function taking an encoded FIX message, which it
+        sends to the peer."""
+        self._name = name
+        self._send = send
+        self._enabled = False
+        self._stamping = False
+        self._connected = False
+        self._timer = None
+
+        self._heartbeat_interval = 0
+        self._configured_interval = 0
+        self._begin_string = None
+        self._sender_comp_id = None
+        self._target_comp_id = None
+        self._comp_ids = None
+        self._second = None
+        self._second_text = b""
+
+        self._next_send_sequence = 1
+        self._last_seen_sequence = 0
+        self._sequence_gaps = 0
+        self._last_sent = time.monotonic()
+
+        self._heartbeats_sent = 0
+        self._test_requests_answered = 0
+        return
+
+    def set_name(self, name: str):
+        """Set the name used when logging.
+
+        :param name: Client or session name."""
+        self._name = name
+        return
+
+    def is_enabled(self) -> bool:
+        """Return True if the session layer is active."""
+        return self._enabled
+
+    def is_stamping(self) -> bool:
+        """Return True if sent messages should be passed to stamp()."""
+        return self._stamping
+
+    def configure(self, enabled: bool, heartbeat_interval: float = 0,
+                  begin_string: str = None, sender_comp_id: str = None,
+                  target_comp_id: str = None, stamp: bool = False):
+        """Enable or disable the session layer, and set header values.
+
+        :param enabled: True to run the session layer.
+        :param heartbeat_interval: Seconds between heartbeats, or zero to
+        use the HeartBtInt from a Logon message.
+        :param begin_string: BeginString for sent messages, or None to
+        use the peer's.
+        :param sender_comp_id: SenderCompID for sent messages, or None to
+        use the TargetCompID of received messages.
+        :param target_comp_id: TargetCompID for sent messages, or None to
+        use the SenderCompID of received messages.
+        :param stamp: True to stamp the header and trailer of sent
+        messages (only while enabled)."""
+        self._enabled = enabled
+        self._stamping = enabled and stamp
+        self._configured_interval = heartbeat_interval
+        if heartbeat_interval:
+            self._heartbeat_interval = heartbeat_interval
+        if begin_string:
+            self._begin_string = begin_string.encode()
+        if sender_comp_id:
+            self._sender_comp_id = sender_comp_id.encode()
+        if target_comp_id:
+            self._target_comp_id = target_comp_id.encode()
+        self._comp_ids = None
+
+        self.schedule()
+        return
+
+    def connected(self):
+        """Start a new connection's session."""
+        self._connected = True
+        self._next_send_sequence = 1
+        self._last_seen_sequence = 0
+        self._last_sent = time.monotonic()
+        self.schedule()
+        return
+
+    def disconnected(self):
+        """Stop the session when the connection closes."""
+        self._connected = False
+        self.schedule()
+        return
+
+    def received(self, message):
+        """Process a received message.
+
+        :param message: Encoded FIX message, as bytes or a memoryview."""
+        if not self._enabled:
+            return
+
+        view = FixMessageView(message)
+        try:
+            sequence = int(view.get(34) or 0)
+        except ValueError:
+            sequence = 0
+        if sequence:
+            if self._last_seen_sequence and \
+                    sequence != self._last_seen_sequence + 1:
+                logging.warning("%s: expected MsgSeqNum %d, got %d",
+                                self._name, self._last_seen_sequence + 1,
+                                sequence)
+                self._sequence_gaps += 1
+            self._last_seen_sequence = sequence
+
+        if self._begin_string is None:
+            self._begin_string = view.get(8)
+        if self._sender_comp_id is None:
+            self._sender_comp_id = view.get(56)
+            self._comp_ids = None
+        if self._target_comp_id is None:
+            self._target_comp_id = view.get(49)
+            self._comp_ids = None
+
+        msg_type = view.get(35)
+        if msg_type == b"A" and not self._configured_interval:
+            try:
+                self._heartbeat_interval = int(view.get(108) or 0)
+            except ValueError:
+                pass
+            self.schedule()
+
+        elif msg_type == b"1":
+            self.send_heartbeat(view.get(112))
+            self._test_requests_answered += 1
+        return
+
+    def sent(self, messages: list):
+        """Note messages sent by the controller.
+
+        :param messages: List of encoded FIX messages.
+
+        The next MsgSeqNum follows on from the last of them."""
+        self._last_sent = time.monotonic()
+        if not self._enabled or self._stamping:
+            return
+
+        field = messages[-1].rfind(SEQNUM_FIELD) if messages else -1
+        if field < 0:
+            return
+
+        start = field + len(SEQNUM_FIELD)
+        end = messages[-1].find(b"\x01", start)
+        try:
+            self._next_send_sequence = int(messages[-1][start:end]) + 1
+        except ValueError:
+            pass
+        return
+
+    def send_heartbeat(self, test_request_id: bytes = None):
+        """Send a Heartbeat message.
+
+        :param test_request_id: TestReqID being answered, if any."""
+        if self._stamping:
+            body = b"35=0\x01"
+            if test_request_id is not None:
+                body += b"112=" + test_request_id + b"\x01"
+            self._heartbeats_sent += 1
+            self._send(body)
+            return
+
+        message = simplefix.FixMessage()
+        message.append_pair(8, self._begin_string or b"FIX.4.4",
+                            header=True)
+        message.append_pair(35, b"0", header=True)
+        if self._sender_comp_id:
+            message.append_pair(49, self._sender_comp_id, header=True)
+        if self._target_comp_id:
+            message.append_pair(56, self._target_comp_id, header=True)
+        message.append_pair(34, self._next_send_sequence, header=True)
+        message.append_utc_timestamp(52, precision=3, header=True)
+        if test_request_id is not None:
+            message.append_pair(112, test_request_id)
+
+        self._next_send_sequence += 1
+        self._heartbeats_sent += 1
+        self._send(message.encode())
+        return
+
+    def stamp(self, messages: list) -> list:
+        """Stamp the header and trailer of messages to be sent.
+
+        :param messages: List of encoded FIX messages, or bodies.
+        :returns: List of complete FIX messages.
+
+        Each message must start with its MsgType (35) field, optionally
+        after other header fields, which are discarded, as is any
+        CheckSum.  The BeginString, BodyLength, CompIDs, MsgSeqNum and
+        SendingTime are added in their place, and a new CheckSum."""
+        if self._comp_ids is None:
+            self._comp_ids = b""
+            if self._sender_comp_id:
+                self._comp_ids += b"49=" + self._sender_comp_id + b"\x01"
+            if self._target_comp_id:
+                self._comp_ids += b"56=" + self._target_comp_id + b"\x01"
+        begin = b"8=" + (self._begin_string or b"FIX.4.4") + b"\x019="
+        sending_time = self.sending_time()
+
+        # Check every header before using any sequence numbers.
+        messages = [bytes(message) for message in messages]
+        headers = [self.skip_header(message) for message in messages]
+
+        stamped = []
+        for message, (msg_type, start) in zip(messages, headers):
+            end = len(message)
+            if message.endswith(b"\x01") and \
+                    message.rfind(b"\x0110=", 0, end - 1) == end - 8:
+                end -= 7
+
+            body = (msg_type + self._comp_ids +
+                    b"34=%d\x01" % self._next_send_sequence +
+                    sending_time + message[start:end])
+            self._next_send_sequence += 1
+
+            encoded = begin + b"%d\x01" % len(body) + body
+            stamped.append(encoded + b"10=%03d\x01" % checksum(encoded))
+        return stamped
+
+    def skip_header(self, message: bytes):
+        """(Internal) Find the end of a message's header fields.
+
+        :param message: Encoded FIX message, or body.
+        :returns: Tuple of the MsgType field, and the offset of the
+        first field after the header.
+
+        Raises ValueError if there's no MsgType in the header."""
+        msg_type = None
+        start = 0
+        while True:
+            equals = message.find(b"=", start)
+            if equals < 0 or message[start:equals] not in STAMPED_TAGS:
+                break
+
+            end = message.find(b"\x01", equals) + 1
+            if end == 0:
+                break
+            if message[start:equals] == b"35":
+                msg_type = message[start:end]
+            start = end
+
+        if msg_type is None:
+            raise ValueError("No MsgType at start of message")
+        return msg_type, start
+
+    def sending_time(self) -> bytes:
+        """(Internal) Return the SendingTime field for now.
+
+        The text up to the second is cached, so it's formatted at most
+        once a second."""
+        now = time.time()
+        second = int(now)
+        if second != self._second:
+            self._second = second
+            self._second_text = time.strftime(
+                "52=%Y%m%d-%H:%M:%S.", time.gmtime(second)).encode()
+        millis = int((now - second) * 1000)
+        return self._second_text + b"%03d\x01" % millis
+
+    def schedule(self):
+        """(Internal) Start, restart or stop the heartbeat timer."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        if self._enabled and self._connected and self._heartbeat_interval:
+            self._timer = asyncio.get_event_loop().call_later(
+                self._heartbeat_interval, self.heartbeat_due)
+        return
+
+    def heartbeat_due(self):
+        """(Internal) Send a Heartbeat if nothing's been sent lately."""
+        self._timer = None
+        idle = time.monotonic() - self._last_sent
+        if idle >= self._heartbeat_interval:
+            try:
+                self.send_heartbeat()
+            except OSError as e:
+                logging.warning("%s: failed to send heartbeat: %s",
+                                self._name, str(e))
+                return
+            idle = 0
+
+        self._timer = asyncio.get_event_loop().call_later(
+            self._heartbeat_interval - idle, self.heartbeat_due)
+        return
+
+    def stats(self) -> dict:
+        """Return the session layer's state and counters."""
+        return {"enabled": self._enabled,
+                "stamping": self._stamping,
+                "heartbeat_interval": self._heartbeat_interval,
+                "next_send_sequence": self._next_send_sequence,
+                "last_seen_sequence": self._last_seen_sequence,
+                "sequence_gaps": self._sequence_gaps,
+                "heartbeats_sent": self._heartbeats_sent,
+                "test_requests_answered": self._test_requests_answered}
@@ -0,0 +1,252 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""Shared memory ring buffer for received FIX messages.
+
+A ring is created by the agent for a client or server session, and
+opened by a proxy running on the same host.  The agent writes each
+received FIX message into the ring, and the proxy reads them directly,
+so they don't cross the control session at all.
+
+The ring is a file, mapped into memory by both processes.  It has a
+single writer (the agent) and a single reader (the proxy).  The file
+starts with a header:
+
+* a 4 byte magic number, and a 4 byte version
+* an 8 byte data area size
+* at offset 64, the 8 byte total number of bytes ever written (head),
+followed by the 8 byte total number of messages ever written
+* at offset 128, the 8 byte total number of bytes ever read (tail),
+followed by the 8 byte total number of messages ever read
+
+Only the writer updates the head and written count, and only the
+reader updates the tail and read count, and each does so after it has
+finished with the data area, so no locking is needed.  The number of
+unread messages is the difference of the counts; the writer updates
+its count after the head, so it never includes a message the reader
+can't see yet.  The data area follows the header, and holds
+records of a 4 byte length followed by the message, wrapping around at
+the end of the area."""
+
+import mmap
+import os
+import struct
+import tempfile
+
+
+MAGIC = b'FXRG'
+VERSION = 2
+
+HEAD_OFFSET = 64
+WRITTEN_OFFSET = 72
+TAIL_OFFSET = 128
+READ_OFFSET = 136
+HEADER_SIZE = 192
+
+DEFAULT_SIZE = 1024 * 1024
+
+_HEADER = struct.Struct("<4sIQ")
+_POSITION = struct.Struct("<Q")
+_LENGTH = struct.Struct("<I")
+
+
+class RingBuffer(object):
+    """Single-producer, single-consumer ring of FIX messages."""
+
+    def __init__(self, path: str, size: int = 0, fd: int = None):
+        """Constructor.
+
+        :param path: File name for the ring.
+        :param size: Data area size in bytes, to create a new ring; or
+        zero to open an existing ring.
+        :param fd: Open descriptor of a new, empty ring file, which is
+        closed once mapped.  By default, a new ring's file is created."""
+        self._path = path
+
+        if size:
+            if fd is None:
+                fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o600)
+            try:
+                os.ftruncate(fd, HEADER_SIZE + size)
+                self._map = mmap.mmap(fd, HEADER_SIZE + size)
+            finally:
+                os.close(fd)
+            _HEADER.pack_into(self._map, 0, MAGIC, VERSION, size)
+
+        else:
+            fd = os.open(path, os.O_RDWR)
+            try:
+                self._map = mmap.mmap(fd, 0)
+            finally:
+                os.close(fd)
+
+            magic, version, size = _HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC or version != VERSION:
+                self._map.close()
+                raise ValueError("Not a fixtool ring: %s" % path)
+
+        self._size = size
+        return
+
+    @staticmethod
+    def create(size: int = DEFAULT_SIZE, directory: str = None):
+        """Create a new ring, with a unique file name.
+
+        :param size: Data area size in bytes.
+        :param directory: Directory for the ring file.  By default,
+        /dev/shm is used if it exists, so the ring is never written
+        to disk."""
+        if directory is None:
+            directory = "/dev/shm" if os.path.isdir("/dev/shm") \
+                else tempfile.gettempdir()
+
+        # The file is used as mkstemp() opened it, so its name can't be
+        # taken by another process in between.
+        fd, path = tempfile.mkstemp(prefix="fixtool-ring-", dir=directory)
+        return RingBuffer(path, size, fd)
+
+    def path(self) -> str:
+        """Return the ring's file name."""
+        return self._path
+
+    def size(self) -> int:
+        """Return the size of the ring's data area, in bytes."""
+        return self._size
+
+    def close(self):
+        """Unmap the ring.  The file is left in place."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        return
+
+    def unlink(self):
+        """Remove the ring's file.
+
+        Processes that have the ring mapped can continue to use it."""
+        try:
+            os.unlink(self._path)
+        except FileNotFoundError:
+            pass
+        return
+
+    def _head(self) -> int:
+        return _POSITION.unpack_from(self._map, HEAD_OFFSET)[0]
+
+    def _tail(self) -> int:
+        return _POSITION.unpack_from(self._map, TAIL_OFFSET)[0]
+
+    def _copy_in(self, position: int, data: bytes):
+        offset = position % self._size
+        first = min(len(data), self._size - offset)
+        start = HEADER_SIZE + offset
+        self._map[start:start + first] = data[:first]
+        if first < len(data):
+            rest = len(data) - first
+            self._map[HEADER_SIZE:HEADER_SIZE + rest] = data[first:]
+        return
+
+    def _copy_out(self, position: int, length: int) -> bytes:
+        offset = position % self._size
+        first = min(length, self._size - offset)
+        start = HEADER_SIZE + offset
+        data = self._map[start:start + first]
+        if first < length:
+            data += self._map[HEADER_SIZE:HEADER_SIZE + length - first]
+        return data
+
+    def is_empty(self) -> bool:
+        """Return True if there are no unread messages."""
+        return self._head() == self._tail()
+
+    def write(self, message: bytes) -> bool:
+        """Append a message to the ring.
+
+        :param message: Byte array of FIX message.
+        :returns: False if there isn't enough free space."""
+        head = self._head()
+        needed = _LENGTH.size + len(message)
+        if needed > self._size - (head - self._tail()):
+            return False
+
+        self._copy_in(head, _LENGTH.pack(len(message)))
+        self._copy_in(head + _LENGTH.size, message)
+        _POSITION.pack_into(self._map, HEAD_OFFSET, head + needed)
+
+        written = _POSITION.unpack_from(self._map, WRITTEN_OFFSET)[0]
+        _POSITION.pack_into(self._map, WRITTEN_OFFSET, written + 1)
+        return True
+
+    def read(self):
+        """Remove and return the oldest message.
+
+        :returns: Byte array of FIX message, or None if the ring is
+        empty."""
+        messages = self.read_many(1)
+        if not messages:
+            return None
+        return messages[0]
+
+    def read_many(self, max_count: int = 0, max_bytes: int = 0) -> list:
+        """Remove and return the oldest messages.
+
+        :param max_count: Maximum number of messages, or zero for no limit.
+        :param max_bytes: Maximum total size of the messages, or zero for
+        no limit.  The first message is always returned, even if it is
+        larger than this.
+        :returns: List of messages, which is empty if the ring is."""
+        head = self._head()
+        tail = self._tail()
+
+        messages = []
+        total = 0
+        while tail < head:
+            if max_count and len(messages) >= max_count:
+                break
+
+            length = _LENGTH.unpack(self._copy_out(tail, _LENGTH.size))[0]
+            total += length
+            if max_bytes and messages and total > max_bytes:
+                break
+
+            messages.append(self._copy_out(tail + _LENGTH.size, length))
+            tail += _LENGTH.size + length
+
+        _POSITION.pack_into(self._map, TAIL_OFFSET, tail)
+
+        read = _POSITION.unpack_from(self._map, READ_OFFSET)[0]
+        _POSITION.pack_into(self._map, READ_OFFSET, read + len(messages))
+        return messages
+
+    def count(self) -> int:
+        """Return the number of unread messages.
+
+        This should only be used by the reader.  It doesn't look at the
+        messages, so it's cheap however many there are."""
+        written = _POSITION.unpack_from(self._map, WRITTEN_OFFSET)[0]
+        read = _POSITION.unpack_from(self._map, READ_OFFSET)[0]
+
+        # A message being written may be readable before it's counted.
+        return max(written - read, 0)
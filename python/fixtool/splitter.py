@@ -0,0 +1,236 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""Split a FIX byte stream into messages, without parsing them.
+
+Each message starts with the BeginString (8) and BodyLength (9) fields,
+and ends with the CheckSum (10) field.  BodyLength gives the position
+of the CheckSum field, so the message boundaries can be found without
+looking at any other field.  The messages are returned exactly as they
+were received.
+
+The BodyLength is validated by checking that the CheckSum field is
+where it says, and that it's not implausibly large; anything else is
+skipped up to the next BeginString.
+
+Checking the CheckSum value itself means summing every byte, so it's
+optional."""
+
+import logging
+import zlib
+
+
+# Field separator.
+SOH = b"\x01"
+
+# Start of a message, searched for when resynchronising.
+MESSAGE_START = b"8=FIX"
+
+# Longest BeginString or BodyLength field accepted, including the tag.
+MAX_HEADER_FIELD = 32
+
+# Largest BodyLength accepted by default.  A corrupt length would
+# otherwise have the splitter buffer data indefinitely.
+MAX_BODY_LENGTH = 1 << 20
+
+# Bytes summed per call to zlib.adler32().  Its low 16 bits are the sum
+# of the bytes modulo 65521, which is exact for up to 256 bytes.
+SUM_CHUNK = 256
+
+
+def checksum(data) -> int:
+    """Calculate a FIX CheckSum value.
+
+    :param data: Message bytes, up to but not including the CheckSum
+    field.
+    :returns: Sum of the bytes, modulo 256."""
+    total = 0
+    for i in range(0, len(data), SUM_CHUNK):
+        total += zlib.adler32(data[i:i + SUM_CHUNK], 0) & 0xffff
+    return total % 256
+
+
+def checksum_ok(message) -> bool:
+    """Check a complete message's CheckSum value.
+
+    :param message: Message bytes, ending with its CheckSum field.
+    :returns: True if the value matches the sum of the preceding bytes."""
+    try:
+        expected = int(message[-4:-1])
+    except ValueError:
+        return False
+
+    return checksum(message[:-7]) == expected
+
+
+class FixSplitter(object):
+    """Find FIX message boundaries in a byte stream.
+
+    Complete messages are returned as memoryview slices of the buffer
+    passed to feed(), so they're not copied; they keep that buffer
+    alive for as long as they're referenced.  Only a partial message
+    left at the end of a buffer is copied, to be joined with the next
+    one."""
+
+    def __init__(self, validate_checksum: bool = False,
+                 max_body_length: int = MAX_BODY_LENGTH):
+        """Constructor.
+
+        :param validate_checksum: If True, discard messages whose CheckSum
+        value is wrong.  Otherwise, they're returned like any other, so
+        that a test can see exactly what its peer sent.
+        :param max_body_length: Largest BodyLength accepted; messages
+        claiming to be longer are treated as malformed."""
+        self._validate_checksum = validate_checksum
+        self._max_body_length = max_body_length
+        self._partial = bytearray()
+        self._errors = 0
+        return
+
+    def set_validate_checksum(self, validate_checksum: bool):
+        """Enable or disable checking of CheckSum values.
+
+        :param validate_checksum: If True, discard messages whose CheckSum
+        value is wrong."""
+        self._validate_checksum = validate_checksum
+        return
+
+    def feed(self, data: bytes) -> list:
+        """Add received bytes, and return the complete messages.
+
+        :param data: Bytes read from the connection.
+        :returns: List of memoryview slices, one per message."""
+        if self._partial:
+            self._partial += data
+            data = self._partial
+
+        view = memoryview(data)
+        messages = []
+        start = 0
+        end = len(data)
+        while start < end:
+            length = self.message_length(data, start)
+            if length is None:
+                break
+
+            if length < 0:
+                # Not a message start: skip to the next BeginString.
+                # Keep what might be a BeginString split across reads.
+                skip = data.find(MESSAGE_START, start + 1)
+                if skip < 0:
+                    skip = end - self.start_prefix_length(data, start + 1)
+                logging.warning("Discarding %d bytes of malformed FIX",
+                                skip - start)
+                self._errors += 1
+                start = skip
+                continue
+
+            message = view[start:start + length]
+            start += length
+
+            if self._validate_checksum and not checksum_ok(message):
+                logging.warning("Discarding FIX message with bad CheckSum")
+                self._errors += 1
+                continue
+
+            messages.append(message)
+
+        # A partial message that's still incomplete stays where it is.
+        # Otherwise, the remainder is copied, leaving the returned
+        # messages' buffer untouched.
+        if start == 0 and data is self._partial:
+            view.release()
+        elif start < end:
+            self._partial = bytearray(view[start:])
+        else:
+            self._partial = bytearray()
+        return messages
+
+    def error_count(self) -> int:
+        """Return the number of malformed messages discarded."""
+        return self._errors
+
+    def pending(self) -> int:
+        """Return the number of bytes held in a partial message."""
+        return len(self._partial)
+
+    def reset(self):
+        """Discard any partial message."""
+        self._partial = bytearray()
+        return
+
+    @staticmethod
+    def start_prefix_length(data: bytes, start: int) -> int:
+        """(Internal) Find a partial BeginString at the end of the data.
+
+        :param data: Received bytes.
+        :param start: Offset from which to look.
+        :returns: Length of the longest suffix of the data that is a
+        prefix of MESSAGE_START, or zero."""
+        for length in range(min(len(MESSAGE_START) - 1,
+                                len(data) - start), 0, -1):
+            if data.endswith(MESSAGE_START[:length]):
+                return length
+        return 0
+
+    def message_length(self, data: bytes, start: int):
+        """(Internal) Find the length of the message at an offset.
+
+        :param data: Received bytes.
+        :param start: Offset of the message's BeginString field.
+        :returns: The message's length in bytes, None if it's incomplete,
+        or -1 if the data at the offset isn't the start of a message."""
+        if data[start:start + 2] != b"8="[:len(data) - start]:
+            return -1
+
+        # BodyLength must be the second field.
+        begin_end = data.find(SOH, start, start + MAX_HEADER_FIELD)
+        if begin_end < 0:
+            return None if len(data) - start < MAX_HEADER_FIELD else -1
+        if data[begin_end + 1:begin_end + 3] != \
+                b"9="[:len(data) - begin_end - 1]:
+            return -1
+
+        limit = begin_end + 1 + MAX_HEADER_FIELD
+        length_end = data.find(SOH, begin_end + 3, limit)
+        if length_end < 0:
+            return None if len(data) < limit else -1
+
+        try:
+            body_length = int(data[begin_end + 3:length_end])
+        except ValueError:
+            return -1
+        if not 0 <= body_length <= self._max_body_length:
+            return -1
+
+        # CheckSum is always three digits: "10=nnn<SOH>".
+        checksum = length_end + 1 + body_length
+        if len(data) < checksum + 7:
+            return None
+        if data[checksum:checksum + 3] != b"10=" or \
+                data[checksum + 6:checksum + 7] != SOH:
+            return -1
+
+        return checksum + 7 - start
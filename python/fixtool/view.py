@@ -0,0 +1,208 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+"""Read-only view of a FIX message's fields.
+
+The agent queues received messages as raw bytes, and most are never
+looked at.  A view wraps those bytes, and finds the fields only when
+one is first asked for, so a message that isn't inspected costs
+nothing more than the view object itself."""
+
+from simplefix.parser import RAW_DATA_TAGS, RAW_LEN_TAGS
+
+
+# Data fields whose value can contain SOH, by the tag of the field
+# giving their length.
+RAW_DATA = dict(zip(RAW_LEN_TAGS, RAW_DATA_TAGS))
+
+
+class FixMessageView(object):
+    """Lazily indexed FIX message.
+
+    Tags are integers, and values are returned as bytes, exactly as
+    they appear in the message.  Repeated tags are numbered from 1, as
+    in simplefix.FixMessage.get()."""
+
+    __slots__ = ("_buffer", "_data", "_fields", "_index", "_first",
+                 "_last")
+
+    def __init__(self, buffer):
+        """Constructor.
+
+        :param buffer: Encoded FIX message, as bytes or a memoryview.
+        It's not copied until a field is read."""
+        self._buffer = buffer
+        self._data = None
+        self._fields = None
+        self._index = None
+        self._first = 0
+        self._last = None
+        return
+
+    def __bytes__(self):
+        return bytes(self._buffer)
+
+    def __len__(self):
+        self.build_index()
+        return self._last - self._first
+
+    def __contains__(self, tag):
+        self.build_index()
+        return int(tag) in self._index
+
+    def __iter__(self):
+        """Yield each field, as a (tag, value) tuple."""
+        self.build_index()
+        data = self._data
+        for tag, start, end in self._fields[self._first:self._last]:
+            yield tag, data[start:end]
+
+    def get(self, tag, nth: int = 1):
+        """Return the value of a field.
+
+        :param tag: FIX field tag number.
+        :param nth: Occurrence of the tag, if it's repeated; the first
+        is 1.
+        :returns: Value as bytes, or None if there's no such field."""
+        self.build_index()
+        positions = self._index.get(int(tag))
+        if positions is None or nth > len(positions) or nth < 1:
+            return None
+
+        _, start, end = self._fields[positions[nth - 1]]
+        return self._data[start:end]
+
+    def count(self, tag) -> int:
+        """Return the number of occurrences of a tag.
+
+        :param tag: FIX field tag number."""
+        self.build_index()
+        return len(self._index.get(int(tag), ()))
+
+    def group(self, count_tag, member_tags) -> list:
+        """Return the instances of a repeating group.
+
+        :param count_tag: Tag of the field giving the number of instances.
+        :param member_tags: Tags of the group's fields, starting with the
+        delimiter field that begins each instance.  Include the fields
+        of any nested groups.
+        :returns: List of views, one per instance.  Each view contains
+        only that instance's fields, and can be used to find nested
+        groups.
+
+        Without a data dictionary, the end of the last instance is found
+        as the first field that isn't a member of the group."""
+        self.build_index()
+        positions = self._index.get(int(count_tag))
+        if not positions:
+            return []
+
+        fields = self._fields
+        position = positions[0]
+        try:
+            count = int(self._data[fields[position][1]:fields[position][2]])
+        except ValueError:
+            return []
+
+        member_tags = [int(tag) for tag in member_tags]
+        delimiter = member_tags[0]
+        members = set(member_tags)
+
+        instances = []
+        i = position + 1
+        while len(instances) < count and i < self._last and \
+                fields[i][0] == delimiter:
+            first = i
+            i += 1
+            while i < self._last and fields[i][0] in members and \
+                    fields[i][0] != delimiter:
+                i += 1
+            instances.append(self.instance(first, i))
+        return instances
+
+    def instance(self, first: int, last: int):
+        """(Internal) Return a view of a range of this view's fields.
+
+        :param first: Position of the first field.
+        :param last: Position after the last field."""
+        view = FixMessageView(self._buffer)
+        view._data = self._data
+        view._fields = self._fields
+        view._first = first
+        view._last = last
+
+        index = {}
+        for position in range(first, last):
+            index.setdefault(self._fields[position][0], []).append(position)
+        view._index = index
+        return view
+
+    def build_index(self):
+        """(Internal) Find the fields, if not already done."""
+        if self._index is not None:
+            return
+
+        data = bytes(self._buffer)
+        fields = []
+        index = {}
+
+        end = len(data)
+        position = 0
+        raw_length = None
+        while position < end:
+            equals = data.find(b"=", position)
+            if equals < 0:
+                break
+            try:
+                tag = int(data[position:equals])
+            except ValueError:
+                # Malformed: index the fields before it.
+                break
+
+            if raw_length is not None and tag == raw_length[0]:
+                # Data field: its value can contain SOH.
+                value_end = min(equals + 1 + raw_length[1], end)
+            else:
+                value_end = data.find(b"\x01", equals + 1)
+                if value_end < 0:
+                    value_end = end
+            raw_length = None
+
+            data_tag = RAW_DATA.get(tag)
+            if data_tag is not None:
+                try:
+                    raw_length = (data_tag, int(data[equals + 1:value_end]))
+                except ValueError:
+                    pass
+
+            index.setdefault(tag, []).append(len(fields))
+            fields.append((tag, equals + 1, value_end))
+            position = value_end + 1
+
+        self._data = data
+        self._fields = fields
+        self._index = index
+        self._last = len(fields)
+        return
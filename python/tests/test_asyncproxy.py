@@ -0,0 +1,149 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+import asyncio
+
+import fixtool
+import pytest
+import simplefix
+
+
+def run(coroutine):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def make_heartbeat(seq: int):
+    fix_msg = simplefix.FixMessage()
+    fix_msg.append_pair(8, "FIX.4.2")
+    fix_msg.append_pair(35, 0)
+    fix_msg.append_pair(34, seq)
+    return fix_msg.encode()
+
+
+def test_async_send_receive():
+    async def scenario():
+        proxy = await fixtool.spawn_agent_async()
+        assert proxy is not None
+
+        s1 = await proxy.create_server("s1")
+        port = await s1.listen(0)
+
+        clients = []
+        sessions = []
+        for i in range(10):
+            client = await proxy.create_client("c%d" % i)
+            await client.connect('localhost', port)
+            clients.append(client)
+            sessions.append(await s1.accept("cs%d" % i))
+
+        # Wait on every session concurrently, then send.
+        waits = [asyncio.ensure_future(session.receive(timeout=10))
+                 for session in sessions]
+        await asyncio.gather(*(client.send(make_heartbeat(i))
+                               for i, client in enumerate(clients)))
+        received = await asyncio.gather(*waits)
+        assert received == [make_heartbeat(i) for i in range(10)]
+
+        await sessions[0].subscribe()
+        await clients[0].send_many([make_heartbeat(1), make_heartbeat(2)])
+        assert await sessions[0].receive(timeout=10) == make_heartbeat(1)
+        assert await sessions[0].receive(timeout=10) == make_heartbeat(2)
+        assert await sessions[0].receive(timeout=0.1) is None
+
+        for client in clients:
+            await client.destroy()
+        await s1.destroy()
+        await proxy.shutdown()
+        return
+
+    run(scenario())
+    return
+
+
+def test_async_wait_for():
+    async def scenario():
+        proxy = await fixtool.spawn_agent_async()
+        s1 = await proxy.create_server("s1")
+        port = await s1.listen(0)
+        c1 = await proxy.create_client("c1")
+        await c1.connect('localhost', port)
+        cs1 = await s1.accept("cs1")
+
+        test_request = simplefix.FixMessage()
+        test_request.append_pair(8, "FIX.4.2")
+        test_request.append_pair(35, 1)
+        test_request.append_pair(112, "ping")
+
+        # The agent parks the request, and discards the heartbeats.
+        wait = asyncio.ensure_future(
+            cs1.wait_for({"msg_type": "1"}, timeout=10, skipped=True))
+        await asyncio.sleep(0.1)
+        await c1.send_many([make_heartbeat(1), make_heartbeat(2),
+                            test_request.encode()])
+        assert await wait == (test_request.encode(), 2)
+        assert await cs1.wait_for({"msg_type": "1"}, timeout=0.1) is None
+
+        await c1.destroy()
+        await s1.destroy()
+        await proxy.shutdown()
+        return
+
+    run(scenario())
+    return
+
+
+def test_async_read_failure():
+    async def scenario():
+        proxy = await fixtool.spawn_agent_async()
+        s1 = await proxy.create_server("s1")
+        port = await s1.listen(0)
+        c1 = await proxy.create_client("c1")
+        await c1.connect('localhost', port)
+        cs1 = await s1.accept("cs1")
+
+        # One waits in the agent, the other for a forwarded message.
+        await cs1.subscribe()
+        parked = asyncio.ensure_future(c1.receive(timeout=10))
+        pushed = asyncio.ensure_future(cs1.receive(timeout=10))
+        await asyncio.sleep(0.1)
+
+        # An undecodable frame from the agent ends the read loop.
+        proxy._reader.feed_data(b"\x00\x00\x00\x01}")
+        for waiting in (parked, pushed):
+            with pytest.raises(ConnectionError):
+                await asyncio.wait_for(waiting, 5)
+
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(proxy.create_client("c2"), 5)
+
+        await proxy.shutdown()
+        return
+
+    run(scenario())
+    return
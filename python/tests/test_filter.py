@@ -0,0 +1,71 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+import pytest
+import simplefix
+
+from fixtool.filter import MessageFilter
+
+
+def make_message(msg_type: str, text: str = None) -> bytes:
+    message = simplefix.FixMessage()
+    message.append_pair(8, "FIX.4.4")
+    message.append_pair(35, msg_type)
+    message.append_pair(55, "MSFT")
+    if text is not None:
+        message.append_pair(58, text)
+    return message.encode()
+
+
+def test_include_exclude():
+    heartbeat = make_message("0")
+    order = make_message("D")
+    reject = make_message("3", "Reject: bad tag")
+
+    only_orders = MessageFilter(include=[{"msg_type": "D"}])
+    assert only_orders.accepts(order)
+    assert not only_orders.accepts(heartbeat)
+
+    quiet = MessageFilter(exclude=[{"msg_type": 0}])
+    assert not quiet.accepts(heartbeat)
+    assert quiet.accepts(memoryview(reject))
+
+    rejects = MessageFilter(include=[{"tag": 58, "regex": "^Reject"},
+                                     {"tag": 35, "value": "D"}],
+                            exclude=[{"tag": 55, "value": "IBM"}])
+    assert rejects.accepts(reject)
+    assert rejects.accepts(order)
+    assert not rejects.accepts(heartbeat)
+
+    assert MessageFilter().is_empty()
+    return
+
+
+def test_bad_rules():
+    for rule in ({}, {"tag": "x", "value": 1}, {"tag": 58},
+                 {"tag": 58, "regex": "("}, "35=0"):
+        with pytest.raises(ValueError):
+            MessageFilter(include=[rule])
+    return
@@ -0,0 +1,55 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+from fixtool.framing import FrameDecoder, encode_frame
+
+
+def test_split_frames():
+    payloads = [b'{"type": "reset"}', b'', b'x' * 70000, b'abc']
+    stream = b''.join(encode_frame(p) for p in payloads)
+
+    # Feed the stream in awkward pieces, including mid-header.
+    decoder = FrameDecoder()
+    received = []
+    for i in range(0, len(stream), 3001):
+        decoder.feed(stream[i:i + 3001])
+        received.extend(decoder.frames())
+
+    assert received == payloads
+    assert decoder.pending() == 0
+    return
+
+
+def test_many_frames_per_read():
+    decoder = FrameDecoder()
+    decoder.feed(encode_frame(b'one') + encode_frame(b'two') + b'\0\0')
+    assert decoder.frames() == [b'one', b'two']
+    assert decoder.next_frame() is None
+    assert decoder.pending() == 2
+
+    decoder.feed(b'\0\5three')
+    assert decoder.next_frame() == b'three'
+    assert decoder.next_frame() is None
+    return
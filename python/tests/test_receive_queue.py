@@ -0,0 +1,126 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+import pytest
+
+from fixtool.agent import ReceiveQueue
+from fixtool.message import *
+
+
+class Peer(object):
+    def __init__(self):
+        self.paused = False
+        return
+
+    def pause_receiving(self):
+        self.paused = True
+        return
+
+    def resume_receiving(self):
+        self.paused = False
+        return
+
+
+def fill(queue: ReceiveQueue, count: int) -> list:
+    messages = [b"message %d" % i for i in range(count)]
+    for message in messages:
+        queue.append(message)
+    return messages
+
+
+def test_drop_policies():
+    queue = ReceiveQueue(Peer())
+    queue.set_limit(3, 0, QUEUE_DROP_OLDEST)
+    messages = fill(queue, 5)
+    assert queue.take() == messages[2:]
+    assert queue.stats()["dropped"] == 2
+
+    queue = ReceiveQueue(Peer())
+    queue.set_limit(0, len(b"message 0") * 3, QUEUE_DROP_NEWEST)
+    messages = fill(queue, 5)
+    assert queue.take() == messages[:3]
+    assert queue.stats()["received"] == 5
+    return
+
+
+def test_byte_limit():
+    # The limit is never exceeded, even by the message that reaches it.
+    limit = len(b"message 0") * 3 - 1
+    for policy in (QUEUE_DROP_OLDEST, QUEUE_DROP_NEWEST, QUEUE_SPILL):
+        queue = ReceiveQueue(Peer())
+        queue.set_limit(0, limit, policy)
+        messages = fill(queue, 5)
+        assert queue._bytes <= limit
+        assert len(queue._messages) == 2
+
+        if policy == QUEUE_DROP_OLDEST:
+            assert queue.take() == messages[3:]
+        elif policy == QUEUE_DROP_NEWEST:
+            assert queue.take() == messages[:2]
+        else:
+            assert queue.take() == messages
+    return
+
+
+def test_spill():
+    queue = ReceiveQueue(Peer())
+    queue.set_limit(10, 0, QUEUE_SPILL)
+    messages = fill(queue, 100)
+    assert len(queue) == 100
+    assert queue.stats()["on_disk"] == 90
+
+    assert queue.popleft() == messages[0]
+    messages += fill(queue, 5)
+    assert queue.take(max_count=50) == messages[1:51]
+    assert queue.take() == messages[51:]
+    assert queue.stats()["on_disk"] == 0
+
+    queue.append(b"again")
+    assert queue.take() == [b"again"]
+    return
+
+
+def test_pause():
+    peer = Peer()
+    queue = ReceiveQueue(peer)
+    queue.set_limit(4, 0, QUEUE_PAUSE)
+    messages = fill(queue, 6)
+    assert peer.paused
+    assert queue.is_paused()
+
+    # Messages already read are kept, and reading resumes below the limit.
+    assert queue.take(max_count=2) == messages[:2]
+    assert peer.paused
+    assert queue.popleft() == messages[2]
+    assert not peer.paused
+
+    queue.set_limit(2, 0, QUEUE_PAUSE)
+    assert peer.paused
+    queue.clear()
+    assert not peer.paused
+
+    with pytest.raises(ValueError):
+        queue.set_limit(1, 0, "explode")
+    return
@@ -0,0 +1,104 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+import pytest
+import simplefix
+
+from fixtool.session import FixSession
+
+
+def stamping_session():
+    sent = []
+    session = FixSession("test", sent.append)
+    session.configure(True, begin_string="FIX.4.2", sender_comp_id="ME",
+                      target_comp_id="YOU", stamp=True)
+    return session, sent
+
+
+def parse(buf: bytes):
+    parser = simplefix.FixParser()
+    parser.append_buffer(buf)
+    message = parser.get_message()
+    assert message is not None
+    return message
+
+
+def test_stamp_body():
+    session, _ = stamping_session()
+    stamped = session.stamp([b"35=D\x0111=order1\x01",
+                             b"35=D\x0111=order2\x01"])
+    assert len(stamped) == 2
+
+    for sequence, buf in enumerate(stamped, 1):
+        assert buf.startswith(b"8=FIX.4.2\x019=")
+        body = buf[buf.index(b"35="):buf.rindex(b"10=")]
+        message = parse(buf)
+        assert int(message.get(9)) == len(body)
+        assert int(message.get(10)) == sum(buf[:-7]) % 256
+        assert message.get(49) == b"ME"
+        assert message.get(56) == b"YOU"
+        assert int(message.get(34)) == sequence
+        assert len(message.get(52)) == 21
+        assert message.get(11) == b"order%d" % sequence
+    return
+
+
+def test_stamp_replaces_header():
+    session, _ = stamping_session()
+    original = simplefix.FixMessage()
+    original.append_pair(8, "FIX.4.4")
+    original.append_pair(35, "8", header=True)
+    original.append_pair(49, "OTHER", header=True)
+    original.append_pair(34, 99, header=True)
+    original.append_pair(17, "exec1")
+
+    buf = session.stamp([original.encode()])[0]
+    assert buf.count(b"\x0110=") == 1
+    message = parse(buf)
+    assert message.get(8) == b"FIX.4.2"
+    assert message.get(35) == b"8"
+    assert message.get(49) == b"ME"
+    assert b"OTHER" not in buf
+    assert message.get(34) == b"1"
+    assert message.get(17) == b"exec1"
+    return
+
+
+def test_stamp_needs_msg_type():
+    session, _ = stamping_session()
+    with pytest.raises(ValueError):
+        session.stamp([b"35=D\x01", b"11=order1\x01"])
+
+    # Nothing was used up by the failed batch.
+    assert parse(session.stamp([b"35=0\x01"])[0]).get(34) == b"1"
+    return
+
+
+def test_stamped_heartbeat():
+    session, sent = stamping_session()
+    session.send_heartbeat(b"ping")
+    assert sent == [b"35=0\x01112=ping\x01"]
+    assert session.stats()["heartbeats_sent"] == 1
+    return
@@ -0,0 +1,71 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+import os
+
+from fixtool.shmring import RingBuffer
+
+
+def test_ring_wraps(tmp_path):
+    writer = RingBuffer(str(tmp_path / "ring"), 64)
+    reader = RingBuffer(writer.path())
+    assert reader.size() == 64
+
+    # Records are 4 + 20 bytes, so the third one wraps around.
+    for i in range(10):
+        message = (b'%02d' % i) * 10
+        assert writer.write(message)
+        assert writer.write(message)
+        assert reader.count() == 2
+        assert reader.read_many() == [message, message]
+        assert reader.read() is None
+
+    writer.close()
+    reader.close()
+    return
+
+
+def test_ring_full(tmp_path):
+    writer = RingBuffer.create(64, str(tmp_path))
+    reader = RingBuffer(writer.path())
+
+    assert os.stat(writer.path()).st_mode & 0o777 == 0o600
+
+    assert writer.write(b'x' * 28)
+    assert writer.write(b'y' * 28)
+    assert not writer.write(b'z')
+    assert reader.count() == 2
+    assert reader.read_many(max_bytes=1) == [b'x' * 28]
+    assert reader.count() == 1
+    assert writer.write(b'z')
+    assert reader.count() == 2
+    assert reader.read_many() == [b'y' * 28, b'z']
+    assert reader.is_empty()
+
+    writer.unlink()
+    assert not os.path.exists(writer.path())
+    writer.close()
+    reader.close()
+    return
@@ -0,0 +1,111 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+from fixtool.splitter import FixSplitter, checksum
+
+
+def make_message(body: bytes) -> bytes:
+    head = b"8=FIX.4.4\x019=%d\x01" % len(body)
+    checksum = sum(head + body) % 256
+    return head + body + b"10=%03d\x01" % checksum
+
+
+def test_split_stream():
+    messages = [make_message(b"35=0\x0134=%d\x01" % i) for i in range(50)]
+    stream = b''.join(messages)
+
+    splitter = FixSplitter()
+    received = []
+    for i in range(0, len(stream), 7):
+        received.extend(bytes(m) for m in splitter.feed(stream[i:i + 7]))
+
+    assert received == messages
+    assert splitter.pending() == 0
+    return
+
+
+def test_exact_bytes():
+    # Leading zeros and repeated tags would be normalised by a parser.
+    message = make_message(b"35=D\x0134=0007\x0158=a\x0158=b\x01")
+    data = message + message[:10]
+
+    splitter = FixSplitter()
+    received = splitter.feed(data)
+    assert len(received) == 1
+    assert received[0] == message
+    assert received[0].obj is data
+    assert splitter.pending() == 10
+    return
+
+
+def test_resync():
+    message = make_message(b"35=0\x01")
+    splitter = FixSplitter()
+    received = splitter.feed(b"garbage" + message + b"8=FIX\x01x" + message)
+    assert [bytes(m) for m in received] == [message, message]
+    return
+
+
+def test_validate_checksum():
+    good = make_message(b"35=0\x01" + b"58=" + b"x" * 1000 + b"\x01")
+    bad = good[:-4] + b"%03d\x01" % ((int(good[-4:-1]) + 1) % 256)
+
+    splitter = FixSplitter()
+    assert len(splitter.feed(bad)) == 1
+
+    splitter = FixSplitter(validate_checksum=True)
+    assert [bytes(m) for m in splitter.feed(bad + good)] == [good]
+    assert splitter.error_count() == 1
+    return
+
+
+def test_resync_split_begin_string():
+    message = make_message(b"35=0\x01")
+    for split in range(1, 6):
+        splitter = FixSplitter()
+        assert splitter.feed(b"junk" + message[:split]) == []
+        assert [bytes(m) for m in splitter.feed(message[split:])] == \
+            [message]
+        assert splitter.error_count() == 1
+    return
+
+
+def test_body_length_limit():
+    message = make_message(b"35=0\x01")
+    splitter = FixSplitter(max_body_length=1000)
+    received = splitter.feed(b"8=FIX.4.4\x019=999999999\x0135=0\x01")
+    assert received == []
+    assert splitter.error_count() == 1
+    assert splitter.pending() == 0
+
+    assert [bytes(m) for m in splitter.feed(message)] == [message]
+    return
+
+
+def test_checksum():
+    for size in (0, 1, 255, 256, 257, 10000):
+        data = bytes(range(256)) * (size // 256) + b"\xff" * (size % 256)
+        assert checksum(data) == sum(data) % 256
+    return
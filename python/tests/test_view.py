@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+##################################################################
+# fixtool
+# Copyright (C) 2017-2018, David Arnold.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a
+# copy of this software and associated documentation files (the "Software"),
+# to deal in the Software without restriction, including without limitation
+# the rights to use, copy, modify, merge, publish, distribute, sublicense,
+# and/or sell copies of the Software, and to permit persons to whom the
+# Software is furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING
+# FROM, OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER
+# DEALINGS IN THE SOFTWARE.
+#
+##################################################################
+
+import simplefix
+
+from fixtool.view import FixMessageView
+
+
+def make_snapshot() -> bytes:
+    message = simplefix.FixMessage()
+    message.append_pair(8, "FIX.4.4")
+    message.append_pair(35, "W")
+    message.append_pair(55, "MSFT")
+    message.append_pair(268, 2)
+    for side, price in ((0, "100.25"), (1, "100.50")):
+        message.append_pair(269, side)
+        message.append_pair(270, price)
+        message.append_pair(453, 1)
+        message.append_pair(448, "BROKER%d" % side)
+        message.append_pair(447, "D")
+    message.append_pair(95, 5)
+    message.append_pair(96, b"a\x01b=c")
+    message.append_pair(58, "done")
+    return message.encode()
+
+
+def test_fields():
+    data = make_snapshot()
+    view = FixMessageView(memoryview(data))
+    assert view.get(35) == b"W"
+    assert view.get("55") == b"MSFT"
+    assert view.get(270, 2) == b"100.50"
+    assert view.get(270, 3) is None
+    assert view.get(1) is None
+    assert view.count(269) == 2
+    assert 58 in view
+    assert view.get(96) == b"a\x01b=c"
+    assert view.get(58) == b"done"
+    assert bytes(view) == data
+    assert list(view)[0] == (8, b"FIX.4.4")
+    return
+
+
+def test_groups():
+    view = FixMessageView(make_snapshot())
+    entries = view.group(268, [269, 270, 453, 448, 447])
+    assert [e.get(270) for e in entries] == [b"100.25", b"100.50"]
+    assert len(entries[0]) == 5
+    assert entries[0].get(58) is None
+
+    parties = entries[1].group(453, [448, 447])
+    assert len(parties) == 1
+    assert parties[0].get(448) == b"BROKER1"
+
+    assert view.group(999, [1]) == []
+    return
+
+
+def test_lazy():
+    data = make_snapshot()
+    view = FixMessageView(data)
+    assert view._index is None
+    assert bytes(view) == data
+    assert view._index is None
+
+    assert view.get(35) == b"W"
+    assert view._index is not None
+
+    view = FixMessageView(b"not FIX at all")
+    assert bytes(view) == b"not FIX at all"
+    assert len(view) == 0
+    return
@@ -50,6 +50,7 @@ setup(name="fixtool",
       license="MIT",
       keywords="fix testing",
       install_requires=["simplefix>=1.0.8"],
+      extras_require={"fast": ["orjson"]},
       package_dir= {"": "python"},
       packages=["fixtool"],
       entry_points={